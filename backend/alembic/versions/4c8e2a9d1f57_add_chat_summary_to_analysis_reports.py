@@ -0,0 +1,30 @@
+"""add_chat_summary_to_analysis_reports
+
+Revision ID: 4c8e2a9d1f57
+Revises: b91f4c3a7d82
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8e2a9d1f57'
+down_revision: Union[str, Sequence[str], None] = 'b91f4c3a7d82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add rolling chat summary columns for the bounded AI context window."""
+    op.add_column('analysis_reports', sa.Column('chat_summary', sa.Text(), nullable=True))
+    op.add_column('analysis_reports', sa.Column('chat_summary_upto_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove rolling chat summary columns."""
+    op.drop_column('analysis_reports', 'chat_summary_upto_id')
+    op.drop_column('analysis_reports', 'chat_summary')
@@ -0,0 +1,45 @@
+"""add_hot_path_indexes
+
+Revision ID: 7a3d5e1c9b24
+Revises: 4c8e2a9d1f57
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3d5e1c9b24'
+down_revision: Union[str, Sequence[str], None] = '4c8e2a9d1f57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_CASES = sa.text("review_status IN ('pending', 'accepted')")
+
+
+def upgrade() -> None:
+    """Add composite and partial indexes for the hot query paths."""
+    op.create_index('ix_analysis_reports_image_id_created_at', 'analysis_reports', ['image_id', 'created_at'], unique=False)
+    op.create_index('ix_analysis_reports_patient_id_created_at', 'analysis_reports', ['patient_id', 'created_at'], unique=False)
+    op.create_index(
+        'ix_analysis_reports_active_cases', 'analysis_reports', ['patient_id', 'review_status'], unique=False,
+        postgresql_where=ACTIVE_CASES, sqlite_where=ACTIVE_CASES,
+    )
+    op.create_index('ix_chat_messages_report_id_created_at', 'chat_messages', ['report_id', 'created_at'], unique=False)
+    op.create_index('ix_patient_doctor_links_patient_id', 'patient_doctor_links', ['patient_id'], unique=False)
+    op.create_index('ix_patient_doctor_links_doctor_id_patient_id', 'patient_doctor_links', ['doctor_id', 'patient_id'], unique=False)
+    op.create_index('ix_doctor_profiles_user_id', 'doctor_profiles', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove hot-path indexes."""
+    op.drop_index('ix_doctor_profiles_user_id', table_name='doctor_profiles')
+    op.drop_index('ix_patient_doctor_links_doctor_id_patient_id', table_name='patient_doctor_links')
+    op.drop_index('ix_patient_doctor_links_patient_id', table_name='patient_doctor_links')
+    op.drop_index('ix_chat_messages_report_id_created_at', table_name='chat_messages')
+    op.drop_index('ix_analysis_reports_active_cases', table_name='analysis_reports')
+    op.drop_index('ix_analysis_reports_patient_id_created_at', table_name='analysis_reports')
+    op.drop_index('ix_analysis_reports_image_id_created_at', table_name='analysis_reports')
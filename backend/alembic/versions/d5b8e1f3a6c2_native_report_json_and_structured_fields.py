@@ -0,0 +1,120 @@
+"""native_report_json_and_structured_fields
+
+Revision ID: d5b8e1f3a6c2
+Revises: 7a3d5e1c9b24
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+import json
+from typing import Any, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b8e1f3a6c2'
+down_revision: Union[str, Sequence[str], None] = '7a3d5e1c9b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# report_json is read untyped so string-encoded payloads come back as-is
+reports = sa.table(
+    'analysis_reports',
+    sa.column('id', sa.Integer),
+    sa.column('report_json'),
+    sa.column('condition', sa.String),
+    sa.column('confidence', sa.Float),
+    sa.column('recommendation', sa.Text),
+    sa.column('raw_output', sa.Text),
+)
+
+
+def _as_object(value: Any) -> Any:
+    """Unwrap a payload that was stored as a JSON string (possibly encoded twice)."""
+    for _ in range(2):
+        if not isinstance(value, str):
+            break
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def _confidence(value: Any) -> Any:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _backfill(bind) -> None:
+    """Rewrite report_json as a native object and fill the typed columns, BATCH_SIZE rows at a time."""
+    update = (
+        reports.update()
+        .where(reports.c.id == sa.bindparam('row_id'))
+        .values(
+            report_json=sa.bindparam('payload', type_=sa.JSON(none_as_null=True)),
+            condition=sa.bindparam('new_condition'),
+            confidence=sa.bindparam('new_confidence'),
+            recommendation=sa.bindparam('new_recommendation'),
+            raw_output=sa.bindparam('new_raw_output'),
+        )
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(reports)
+            .where(reports.c.id > last_id)
+            .order_by(reports.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        params = []
+        for row in rows:
+            payload = _as_object(row.report_json)
+            data = payload or {}
+            # Keep unparseable payloads in raw_output rather than dropping them
+            raw_output = row.raw_output
+            if payload is None and isinstance(row.report_json, str) and raw_output is None:
+                raw_output = row.report_json
+            params.append({
+                'row_id': row.id,
+                'payload': payload,
+                'new_condition': row.condition if row.condition is not None else data.get('condition'),
+                'new_confidence': row.confidence if row.confidence is not None else _confidence(data.get('confidence')),
+                'new_recommendation': row.recommendation if row.recommendation is not None else data.get('recommendation'),
+                'new_raw_output': raw_output,
+            })
+        bind.execute(update, params)
+
+
+def upgrade() -> None:
+    """Store report_json natively (JSONB on PostgreSQL) and backfill condition/confidence/recommendation."""
+    bind = op.get_bind()
+    _backfill(bind)
+    if bind.dialect.name == 'postgresql':
+        op.alter_column(
+            'analysis_reports', 'report_json',
+            type_=postgresql.JSONB(), existing_type=sa.JSON(), existing_nullable=True,
+            postgresql_using='report_json::jsonb',
+        )
+    op.create_index('ix_analysis_reports_condition', 'analysis_reports', ['condition'], unique=False)
+
+
+def downgrade() -> None:
+    """Revert report_json to plain JSON; backfilled values are kept."""
+    op.drop_index('ix_analysis_reports_condition', table_name='analysis_reports')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column(
+            'analysis_reports', 'report_json',
+            type_=sa.JSON(), existing_type=postgresql.JSONB(), existing_nullable=True,
+            postgresql_using='report_json::json',
+        )
@@ -0,0 +1,27 @@
+"""index_images_image_url
+
+Revision ID: e3a9c4b7f120
+Revises: d5b8e1f3a6c2
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a9c4b7f120'
+down_revision: Union[str, Sequence[str], None] = 'd5b8e1f3a6c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index image_url so shared media blobs can be reference counted."""
+    op.create_index('ix_images_image_url', 'images', ['image_url'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove the image_url index."""
+    op.drop_index('ix_images_image_url', table_name='images')
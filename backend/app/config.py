@@ -20,13 +20,90 @@ MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", DEFAULT_MEDIA_ROOT))
 MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
 MEDIA_URL = "/media"
 MEDIA_URL_TTL_SECONDS = int(os.getenv("MEDIA_URL_TTL_SECONDS", "300"))
+MEDIA_SIGN_BATCH_MAX = int(os.getenv("MEDIA_SIGN_BATCH_MAX", "100"))  # Image ids per POST /images/signed-urls
+MEDIA_TOKEN_CACHE_SIZE = int(os.getenv("MEDIA_TOKEN_CACHE_SIZE", "1024"))  # Verified tokens kept (0 = off)
+# Still accept the older JWT media tokens; safe to disable once MEDIA_URL_TTL_SECONDS has passed since upgrading
+MEDIA_TOKEN_ACCEPT_JWT = os.getenv("MEDIA_TOKEN_ACCEPT_JWT", "true").lower() == "true"
+# Display sizes served by GET /media/{path}?size=<name> (longest edge in px, needs Pillow)
+MEDIA_RENDITION_SIZES = {"thumb": 160, "small": 480, "medium": 1024}
+MEDIA_RENDITION_FORMAT = os.getenv("MEDIA_RENDITION_FORMAT", "webp").lower()
+MEDIA_RENDITION_QUALITY = int(os.getenv("MEDIA_RENDITION_QUALITY", "80"))
 
 # Resilience Settings
 MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "5"))
 ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp"]
 AI_TIMEOUT_SECONDS = int(os.getenv("AI_TIMEOUT_SECONDS", "30"))
 
+# AI Image Preprocessing (needs Pillow; 0 max edge = send originals untouched)
+AI_IMAGE_MAX_EDGE = int(os.getenv("AI_IMAGE_MAX_EDGE", "1536"))
+AI_IMAGE_FORMAT = os.getenv("AI_IMAGE_FORMAT", "webp").lower()
+AI_IMAGE_QUALITY = int(os.getenv("AI_IMAGE_QUALITY", "85"))
+
 # Data Retention Settings (days, 0 = no auto-cleanup)
 MEDIA_RETENTION_DAYS = int(os.getenv("MEDIA_RETENTION_DAYS", "365"))
 CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "365"))
 ANALYSIS_RETENTION_DAYS = int(os.getenv("ANALYSIS_RETENTION_DAYS", "730"))  # 2 years
+
+# AI Analysis Cache Settings (0 entries = cache disabled)
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "512"))
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+ANALYSIS_CACHE_DISK_ENABLED = os.getenv("ANALYSIS_CACHE_DISK_ENABLED", "false").lower() == "true"
+ANALYSIS_CACHE_DISK_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_DISK_MAX_ENTRIES", "10000"))  # Oldest files removed beyond this
+
+# Background Analysis Queue Settings
+ANALYSIS_QUEUE_WORKERS = int(os.getenv("ANALYSIS_QUEUE_WORKERS", "4"))
+ANALYSIS_QUEUE_MAX_DEPTH = int(os.getenv("ANALYSIS_QUEUE_MAX_DEPTH", "100"))
+ANALYSIS_QUEUE_MAX_PER_PATIENT = int(os.getenv("ANALYSIS_QUEUE_MAX_PER_PATIENT", "3"))
+
+# AI Admission Control (rate 0 = no pacing, only the concurrency cap)
+AI_ANALYSIS_MAX_CONCURRENCY = int(os.getenv("AI_ANALYSIS_MAX_CONCURRENCY", "8"))
+AI_CHAT_MAX_CONCURRENCY = int(os.getenv("AI_CHAT_MAX_CONCURRENCY", "16"))
+AI_ANALYSIS_RATE_PER_SECOND = float(os.getenv("AI_ANALYSIS_RATE_PER_SECOND", "0"))
+AI_CHAT_RATE_PER_SECOND = float(os.getenv("AI_CHAT_RATE_PER_SECOND", "0"))
+AI_ADMISSION_TIMEOUT_SECONDS = float(os.getenv("AI_ADMISSION_TIMEOUT_SECONDS", "10"))
+
+# AI Circuit Breaker (errors or calls slower than the threshold count as failures)
+AI_BREAKER_FAILURE_RATE = float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5"))
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20"))
+AI_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("AI_BREAKER_SLOW_CALL_SECONDS", str(AI_TIMEOUT_SECONDS * 0.8)))
+AI_BREAKER_OPEN_SECONDS = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "30"))
+
+# Chat Context Window (older messages are folded into a rolling summary)
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "10"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+
+# Database Connection Pool (sizing applies to server databases, not SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = no limit (PostgreSQL only)
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "0"))  # Connections opened at startup (e.g. DB_POOL_SIZE)
+
+# List Pagination (compat mode: requests without limit/cursor get the full legacy list)
+LIST_PAGINATION_COMPAT = os.getenv("LIST_PAGINATION_COMPAT", "true").lower() == "true"
+LIST_PAGE_SIZE_DEFAULT = int(os.getenv("LIST_PAGE_SIZE_DEFAULT", "50"))
+LIST_PAGE_SIZE_MAX = int(os.getenv("LIST_PAGE_SIZE_MAX", "200"))
+
+# Anonymous Public Sessions (backend: memory, sqlite or redis; sqlite/redis are shared across workers)
+PUBLIC_SESSION_BACKEND = os.getenv("PUBLIC_SESSION_BACKEND", "memory").lower()
+PUBLIC_SESSION_TTL_MINUTES = int(os.getenv("PUBLIC_SESSION_TTL_MINUTES", "20"))
+PUBLIC_SESSION_MAX_MESSAGES = int(os.getenv("PUBLIC_SESSION_MAX_MESSAGES", "40"))  # Stored per session; older ones are dropped into the summary
+PUBLIC_SESSION_SQLITE_PATH = os.getenv("PUBLIC_SESSION_SQLITE_PATH", str(BASE_DIR / "public_sessions.db"))
+PUBLIC_SESSION_REDIS_URL = os.getenv("PUBLIC_SESSION_REDIS_URL", "redis://localhost:6379/0")
+PUBLIC_SESSION_MAX_SESSIONS = int(os.getenv("PUBLIC_SESSION_MAX_SESSIONS", "10000"))  # Least recently used are evicted beyond this
+PUBLIC_SESSION_REAP_INTERVAL_SECONDS = float(os.getenv("PUBLIC_SESSION_REAP_INTERVAL_SECONDS", "30"))  # 0 = no background reaper
+
+# WebSocket fan-out between workers: memory (single worker), unix (one host) or redis
+WS_PUBSUB_BACKEND = os.getenv("WS_PUBSUB_BACKEND", "memory").lower()
+WS_PUBSUB_SOCKET_DIR = os.getenv("WS_PUBSUB_SOCKET_DIR", "/tmp/dermaai-ws")
+WS_PUBSUB_REDIS_URL = os.getenv("WS_PUBSUB_REDIS_URL", PUBLIC_SESSION_REDIS_URL)
+WS_PUBSUB_PUBLISH_QUEUE = int(os.getenv("WS_PUBSUB_PUBLISH_QUEUE", "1024"))  # Redis publishes waiting to be sent; newer ones dropped beyond this
+
+# Per-connection WebSocket send queue; when it is full the slow-consumer policy applies:
+# drop (discard the new frame), coalesce (merge AI stream deltas, else disconnect) or disconnect
+WS_OUTBOX_MAX_FRAMES = int(os.getenv("WS_OUTBOX_MAX_FRAMES", "256"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "coalesce").lower()
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))  # A send stuck longer disconnects the client
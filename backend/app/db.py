@@ -1,8 +1,111 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import DATABASE_URL
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, TypeVar
 
-engine = create_engine(DATABASE_URL)
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+from app.config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+
+logger = logging.getLogger("app.db")
+
+T = TypeVar("T")
+
+
+class PoolMetrics:
+    """Checkout latency and timeout counters for the connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record_checkout(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def reset(self) -> None:
+        """Utility for tests to reset state."""
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self, pool) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "pool": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_checkout_ms": round(self.total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+            "max_checkout_ms": round(self.max_wait * 1000, 2),
+        }
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            payload.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+                idle=pool.checkedin(),
+                saturation=round(pool.checkedout() / capacity, 3) if capacity else 0.0,
+            )
+        return payload
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - start)
+        return conn
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """Build create_engine keyword arguments from the DB_* settings."""
+    options: Dict[str, Any] = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+    }
+    if url.startswith("sqlite"):
+        # SQLite picks its own pool class; sizing options don't apply
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+    )
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -12,3 +115,43 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def run_db(db: Session, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run fn(db, *args, **kwargs) in the threadpool so blocking Session I/O
+    never stalls the event loop. A Session is not thread-safe, so calls
+    made for the same session are serialised.
+    """
+    lock = db.info.setdefault("run_db_lock", threading.Lock())
+
+    def call() -> T:
+        with lock:
+            return fn(db, *args, **kwargs)
+
+    return await run_in_threadpool(call)
+
+
+def warm_up_pool(connections: int, bind: Engine = engine) -> int:
+    """
+    Open up to `connections` pooled connections at once and return them to
+    the pool, so the first requests after a deploy skip connection setup.
+    Returns how many connections were opened. A no-op for SQLite's own
+    pools (StaticPool and friends), where there is no setup to skip.
+    """
+    if not isinstance(bind.pool, InstrumentedQueuePool):
+        return 0
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = bind.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        logger.exception("db.pool_warmup_failed", extra={"opened": len(opened), "requested": connections})
+    finally:
+        for conn in opened:
+            conn.close()
+    if opened:
+        logger.info("db.pool_warmed", extra={"connections": len(opened)})
+    return len(opened)
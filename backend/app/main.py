@@ -1,6 +1,12 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from app.config import DB_POOL_WARMUP, PUBLIC_SESSION_REAP_INTERVAL_SECONDS
+from app.db import warm_up_pool
 from app.observability import configure_logging, request_id_middleware
+from app.services.public_session_store import public_session_store
 from app.routes import (
     auth,
     doctors,
@@ -17,10 +23,26 @@ from app.routes import (
     admin,
 )  # Registered routers
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-open pooled DB connections before serving traffic
+    if DB_POOL_WARMUP > 0:
+        await run_in_threadpool(warm_up_pool, DB_POOL_WARMUP)
+    # Expired anonymous sessions and their images are removed off the request path
+    if PUBLIC_SESSION_REAP_INTERVAL_SECONDS > 0:
+        public_session_store.start_reaper(PUBLIC_SESSION_REAP_INTERVAL_SECONDS)
+    # Chat broadcasts from other workers arrive through the pub/sub backend
+    await websocket.manager.start()
+    yield
+    await websocket.manager.stop()
+    await public_session_store.stop_reaper()
+
+
 app = FastAPI(
     title="DermaAI API",
     description="AI-Powered Dermatologist Assistant",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 configure_logging()
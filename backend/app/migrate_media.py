@@ -0,0 +1,123 @@
+"""
+Rehome existing media files into content-addressed storage.
+
+Images uploaded before media was content-addressed live at
+uploads/<uuid>.<ext>. This copies each file to blobs/<aa>/<bb>/<sha256><ext>
+(identical files collapse into one blob), points the Image rows at it and
+removes the old file once no row references it any more. Safe to re-run:
+rows already under blobs/ are skipped.
+
+Run manually:
+    python -m app.migrate_media [--dry-run] [--batch-size N]
+"""
+
+import argparse
+import logging
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.config import MEDIA_ROOT
+from app.db import SessionLocal
+from app.models import Image
+from app.services.data_lifecycle_service import media_reference_count, safe_delete_file
+from app.services.image_service import MEDIA_BLOB_DIR, store_existing_file
+from app.services.media_service import normalize_media_path
+
+logger = logging.getLogger("app.migrate_media")
+
+
+def migrate_media(
+    db: Optional[Session] = None,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    Move legacy media into blob storage, batch_size rows per commit.
+
+    Returns counts of rows rewritten, files copied, files that duplicated an
+    existing blob, and rows whose file is missing (left untouched).
+    """
+    session = db or SessionLocal()
+    close_session = db is None
+    result = {"rows": 0, "files": 0, "deduped": 0, "missing": 0}
+    new_paths: Dict[str, Optional[str]] = {}  # old image_url -> blob path (None if missing)
+    blobs = set()
+    last_id = 0
+
+    try:
+        while True:
+            images = (
+                session.query(Image)
+                .filter(Image.id > last_id, ~Image.image_url.like(f"{MEDIA_BLOB_DIR}/%"))
+                .order_by(Image.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not images:
+                break
+            last_id = images[-1].id
+
+            moved = {}  # old image_url -> normalized path, removed after commit
+            for image in images:
+                old_url = image.image_url
+                if old_url not in new_paths:
+                    new_paths[old_url] = _rehome(old_url, dry_run, result, blobs)
+                new_path = new_paths[old_url]
+                if new_path is None:
+                    continue
+                result["rows"] += 1
+                if not dry_run:
+                    image.image_url = new_path
+                    moved[old_url] = normalize_media_path(old_url)
+
+            if dry_run:
+                continue
+            session.commit()
+            # Old files go only once no unmigrated row (e.g. in a later batch) points at them
+            for old_url, old_path in moved.items():
+                if not media_reference_count(session, old_url):
+                    safe_delete_file(old_path)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if close_session:
+            session.close()
+
+    logger.info("media.migrated", extra={**result, "dry_run": dry_run})
+    return result
+
+
+def _rehome(old_url: str, dry_run: bool, result: Dict[str, int], blobs: set) -> Optional[str]:
+    """Copy one legacy file into blob storage and return its new path, or None if missing."""
+    try:
+        source = MEDIA_ROOT / normalize_media_path(old_url)
+    except HTTPException:
+        source = None
+    if source is None or not source.is_file():
+        result["missing"] += 1
+        logger.warning("media.migrate_missing", extra={"path": old_url})
+        return None
+
+    result["files"] += 1
+    if dry_run:
+        return old_url
+    new_path = store_existing_file(source)
+    if new_path in blobs:
+        result["deduped"] += 1
+    blobs.add(new_path)
+    return new_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move media files into content-addressed storage.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without changing anything")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    counts = migrate_media(batch_size=args.batch_size, dry_run=args.dry_run)
+    print(
+        f"Rows {'to rewrite' if args.dry_run else 'rewritten'}: {counts['rows']}, "
+        f"files: {counts['files']}, deduplicated: {counts['deduped']}, missing: {counts['missing']}"
+    )
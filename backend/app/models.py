@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, JSON, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, JSON, Boolean, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from sqlalchemy.sql import func
@@ -21,6 +22,9 @@ class User(Base):
 
 class DoctorProfile(Base):
     __tablename__ = "doctor_profiles"
+    __table_args__ = (
+        Index("ix_doctor_profiles_user_id", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -31,6 +35,11 @@ class DoctorProfile(Base):
 
 class PatientDoctorLink(Base):
     __tablename__ = "patient_doctor_links"
+    __table_args__ = (
+        Index("ix_patient_doctor_links_patient_id", "patient_id"),
+        # Doctor-side lookups join on to patient_id
+        Index("ix_patient_doctor_links_doctor_id_patient_id", "doctor_id", "patient_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -39,6 +48,10 @@ class PatientDoctorLink(Base):
 
 class Image(Base):
     __tablename__ = "images"
+    __table_args__ = (
+        # Reference counting for shared content-addressed blobs
+        Index("ix_images_image_url", "image_url"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -48,8 +61,32 @@ class Image(Base):
     
     analysis_reports = relationship("AnalysisReport", back_populates="image")
 
+# Native JSON everywhere, binary JSONB on PostgreSQL
+ReportJSON = JSON().with_variant(JSONB(), "postgresql")
+
+# Review statuses that make up a patient's open case
+ACTIVE_CASE_STATUSES = ("pending", "accepted")
+_active_case_clause = text("review_status IN ('pending', 'accepted')")
+
+
 class AnalysisReport(Base):
     __tablename__ = "analysis_reports"
+    __table_args__ = (
+        # Latest report for an image
+        Index("ix_analysis_reports_image_id_created_at", "image_id", "created_at"),
+        # A patient's reports, newest first
+        Index("ix_analysis_reports_patient_id_created_at", "patient_id", "created_at"),
+        # Open cases only: the pending queue and the one-active-case check
+        Index(
+            "ix_analysis_reports_active_cases",
+            "patient_id",
+            "review_status",
+            postgresql_where=_active_case_clause,
+            sqlite_where=_active_case_clause,
+        ),
+        # Case analytics filtered by detected condition
+        Index("ix_analysis_reports_condition", "condition"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     image_id = Column(Integer, ForeignKey("images.id"), nullable=False)
@@ -67,23 +104,30 @@ class AnalysisReport(Base):
     patient_rating = Column(Integer, nullable=True)
     patient_feedback = Column(Text, nullable=True)
     
-    # Structured fields 
+    # Structured fields, populated from report_json at write time
     condition = Column(String, nullable=True)  # Primary detected condition
     confidence = Column(Float, nullable=True)   # Confidence score (0-1)
     recommendation = Column(Text, nullable=True) # Clinical recommendation
     
     # JSON field for complete analysis
-    report_json = Column(JSON, nullable=True)  # Full structured output
+    report_json = Column(ReportJSON, nullable=True)  # Full structured output, stored as a JSON object
     
     # Keep raw output if needed
     raw_output = Column(Text, nullable=True)   # Original model response
     
+    # Rolling summary of chat messages older than the AI context window
+    chat_summary = Column(Text, nullable=True)
+    chat_summary_upto_id = Column(Integer, nullable=True)  # Last ChatMessage.id folded into chat_summary
+    
     # Relationships
     image = relationship("Image", back_populates="analysis_reports")
     chat_messages = relationship("ChatMessage", back_populates="report", cascade="all, delete-orphan")
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_report_id_created_at", "report_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     report_id = Column(Integer, ForeignKey("analysis_reports.id"), nullable=False)
@@ -1,31 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from typing import Dict, Any, List
-import json
+from types import SimpleNamespace
+from typing import Dict, Any, Literal, Optional, Tuple
+import asyncio
+import copy
 import logging
-from app.services.media_service import resolve_media_path
-from app.db import get_db
-from app.models import Image, User, AnalysisReport, ChatMessage, DoctorProfile
+from app.db import SessionLocal, get_db, run_db
+from app.models import Image, User, AnalysisReport, ChatMessage
+from app.routes.websocket import manager as ws_manager
+from app.services.analysis_jobs import AnalysisJob, QueueFullError, analysis_job_queue
+from app.services.analysis_service import (
+    analyze_and_store,
+    create_processing_report,
+    discard_processing_report,
+    store_analysis_failure,
+)
+from app.services.chat_context import load_chat_context
 from app.services.gemini_service import get_gemini_service
+from app.services.single_flight import SingleFlight
+from app.services.pagination import PageParams, page_response, paginate
+from app.services.sse import event_stream_response, sse_event, wants_event_stream
 from app.auth_helpers import get_current_user, get_current_patient, get_current_doctor
 from app.schemas import ChatRequest, ChatResponse
 from app.services.report_service import (
     ensure_image_access,
     ensure_report_access,
     get_image_or_404,
+    get_latest_report_with_doctor,
     get_report_or_404,
+    get_report_with_doctor_or_404,
+    load_doctor_profiles,
+    parse_report_json,
+    serialize_doctor,
+    serialize_report,
 )
 
 router = APIRouter(prefix="/api/analysis", tags=["AI Analysis"])
 
 logger = logging.getLogger("app.analysis")
 
+# In-flight analyses keyed by image_id
+_inflight_analyses = SingleFlight()
+
+# Async-mode enqueues in progress, keyed by image_id; resolves to the queued job
+_pending_enqueues: Dict[int, "asyncio.Future[Optional[AnalysisJob]]"] = {}
+
 
 
 @router.post("/{image_id}")
 async def analyze_image(
     image_id: int,
+    mode: Literal["sync", "async"] = Query("sync"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_patient)
 ) -> Dict[str, Any]:
@@ -34,12 +61,39 @@ async def analyze_image(
     
     Args:
         image_id: ID of the uploaded image to analyze
+        mode: "sync" waits for the result; "async" queues a job and returns 202
         db: Database session
         current_user: Authenticated patient user
         
     Returns:
-        AI analysis results
+        AI analysis results (or the queued job for async mode)
     """
+    image = await run_db(db, _get_owned_image, image_id, current_user.id)
+    ai_service = get_gemini_service()
+
+    if mode == "async":
+        return await _enqueue_analysis(db, image, current_user.id, ai_service)
+
+    # Double-clicks/retries for the same image join the analysis already
+    # running, so they get the same result and report instead of a duplicate.
+    # The shared task outlives the first request, so it uses its own session.
+    image_id, patient_id = image.id, current_user.id
+    result = await _inflight_analyses.do(
+        image_id, lambda: _analyze_in_own_session(image_id, patient_id, ai_service)
+    )
+    return copy.deepcopy(result)
+
+
+async def _analyze_in_own_session(image_id: int, patient_id: int, ai_service) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        image = await run_db(db, get_image_or_404, image_id)
+        return await analyze_and_store(db, image, patient_id, ai_service)
+    finally:
+        db.close()
+
+
+def _get_owned_image(db: Session, image_id: int, patient_id: int) -> Image:
     # Fetch the image from database
     image = db.query(Image).filter(Image.id == image_id).first()
     
@@ -50,112 +104,131 @@ async def analyze_image(
         )
     
     # Verify user owns this image
-    if image.patient_id != current_user.id:
+    if image.patient_id != patient_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to analyze this image"
         )
-    
-    # Resolve image path on disk
-    image_path = str(resolve_media_path(image.image_url))
-    
-    # Perform AI analysis
-    analysis_result = await get_gemini_service().analyze_skin_lesion(image_path)
-    
-    if analysis_result["status"] == "error":
-        error_code = analysis_result.get('error', 'Unknown error')
-        error_msg = analysis_result.get('message', 'Failed to analyze the image.')
-        logger.warning(
-            "analysis.gemini_error",
-            extra={"error_code": error_code, "error_msg": error_msg},
-        )
-        
-        # Create descriptive fallback based on error code
-        recommendation = "The AI service is currently unavailable. Please escalate this case to a human physician for review."
-        explanation = f"Service Error: {error_msg}. Please try again later or consult a doctor directly."
-        
-        if error_code == "TIMEOUT":
-            explanation = "The AI analysis took too long to respond. This can happen with very high-resolution images or high server load."
-        elif error_code == "API_KEY_MISSING":
-            explanation = "The AI service is not properly configured. Please contact the administrator."
-
-        # Create fallback result so user flow isn't blocked
-        fallback_result = {
-            "status": "error",
-            "error_code": error_code,
-            "condition": "Analysis Unavailable",
-            "severity": "Unknown",
-            "confidence": 0,
-            "recommendation": recommendation,
-            "explanation": explanation,
-            "precautions": ["Consult a doctor"],
-            "is_fallback": True
-        }
-        
-        # We continue to save this as a valid (but error-state) report
-        # This allows the user to still use the chat and escalate features
-        report = AnalysisReport(
-            image_id=image.id,
-            report_json=fallback_result, # SQLAlchemy handles dict to JSON if configured, or use json.dumps
-            patient_id=current_user.id
-        )
-        # Note: AnalysisReport.report_json is Text in models.py, so we should dumps it if not handled by SQLAlchemy
-        if isinstance(report.report_json, dict):
-            report.report_json = json.dumps(report.report_json)
+    return image
 
-        db.add(report)
-        db.commit()
-        db.refresh(report)
-        
-        # Add a system message to the chat explaining the situation
-        system_msg = ChatMessage(
-            report_id=report.id,
-            sender_role="system",
-            message=f"⚠️ Analysis Unavailable: {explanation}\n\nYou can still discuss this with our team or escalate it for human review."
-        )
-        db.add(system_msg)
-        db.commit()
-        
-        # Add return fields
-        fallback_result["report_id"] = report.id
-        fallback_result["image_id"] = image.id
-        fallback_result["review_status"] = report.review_status
-        fallback_result["doctor_active"] = report.doctor_active
-        
-        return fallback_result
-    
-    # Save analysis results to database
-    report = AnalysisReport(
-        image_id=image.id,
-        report_json=json.dumps(analysis_result),
-        patient_id=current_user.id
+
+def _queue_full(exc: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(exc),
+        headers={"Retry-After": "5"},
     )
-    db.add(report)
-    db.commit()
-    db.refresh(report)
-    
-    # Add report ID and tracking to response
-    analysis_result["report_id"] = report.id
-    analysis_result["image_id"] = image.id
-    analysis_result["review_status"] = report.review_status
-    analysis_result["doctor_active"] = report.doctor_active
-    
-    # --- PHASE 4: Seed initial AI message ---
-    msg_text = f"Hello! I've analyzed your image. Based on the scan, I detect signs of {analysis_result.get('condition', 'Unknown')}. My confidence is {int(analysis_result.get('confidence', 0)) or 0}%. {analysis_result.get('recommendation', '')}"
-    
-    first_msg = ChatMessage(
-        report_id=report.id,
-        sender_role="ai",
-        message=msg_text
+
+
+async def _enqueue_analysis(db: Session, image: Image, patient_id: int, ai_service) -> JSONResponse:
+    """
+    Queue the analysis on the background workers and answer 202 right away.
+    The result is available from the job status endpoint and is pushed to
+    /ws/chat/{report_id} when it completes.
+    """
+    key = ("image", image.id)
+    image_id = image.id
+    # A request already creating the report and job for this image: share its job
+    while image_id in _pending_enqueues:
+        job = await asyncio.shield(_pending_enqueues[image_id])
+        if job is not None:
+            break
+    else:
+        job = analysis_job_queue.active_job(key)
+        if job is None:
+            job = await _submit_analysis_job(db, key, image, patient_id, ai_service)
+
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            **job.to_dict(),
+            "status_url": f"{router.prefix}/jobs/{job.id}",
+        },
     )
-    db.add(first_msg)
-    db.commit()
-    
-    return analysis_result
+
+
+async def _submit_analysis_job(
+    db: Session, key: Tuple[str, int], image: Image, patient_id: int, ai_service
+) -> AnalysisJob:
+    """
+    Create the "processing" report and queue its job. Concurrent requests for
+    the same image wait on the marker instead of creating their own.
+    """
+    try:
+        analysis_job_queue.check_capacity(patient_id)
+    except QueueFullError as exc:
+        raise _queue_full(exc) from exc
+
+    image_id = image.id
+    marker = asyncio.get_running_loop().create_future()
+    _pending_enqueues[image_id] = marker
+    job = None
+    try:
+        report = await run_db(db, create_processing_report, image, patient_id)
+        report_id = report.id
+        try:
+            job = analysis_job_queue.submit(
+                patient_id,
+                lambda: _run_analysis_job(report_id, image_id, patient_id, ai_service),
+                key=key,
+                report_id=report_id,
+                image_id=image_id,
+            )
+        except QueueFullError as exc:
+            await run_db(db, discard_processing_report, report_id)
+            raise _queue_full(exc) from exc
+    finally:
+        # Waiters get None on failure and try again themselves
+        del _pending_enqueues[image_id]
+        marker.set_result(job)
+    return job
+
+
+async def _run_analysis_job(report_id: int, image_id: int, patient_id: int, ai_service) -> Dict[str, Any]:
+    """Worker body: run the analysis in its own DB session and push the result."""
+    db = SessionLocal()
+    try:
+        image = await run_db(db, get_image_or_404, image_id)
+        report = await run_db(db, get_report_or_404, report_id)
+        result = await analyze_and_store(db, image, patient_id, ai_service, report=report)
+    except Exception:
+        # Don't leave the report "processing" forever: store and push the fallback, then fail the job
+        fallback = await run_db(db, store_analysis_failure, report_id, image_id, patient_id)
+        if fallback is not None:
+            await ws_manager.broadcast_to_report(
+                report_id,
+                {"type": "analysis_complete", "report_id": report_id, "analysis": fallback},
+            )
+        raise
+    finally:
+        db.close()
+
+    await ws_manager.broadcast_to_report(
+        report_id,
+        {"type": "analysis_complete", "report_id": report_id, "analysis": result},
+    )
+    return result
+
+
+@router.get("/jobs/{job_id}")
+async def get_analysis_job(
+    job_id: str,
+    current_user: User = Depends(get_current_patient),
+) -> Dict[str, Any]:
+    """
+    Poll the status of a queued analysis job.
+    """
+    job = analysis_job_queue.get(job_id)
+    if not job or job.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis job not found"
+        )
+    return job.to_dict()
 
 
 @router.get("/report/{report_id}")
-async def get_analysis_by_report_id(
+def get_analysis_by_report_id(
     report_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -163,37 +236,21 @@ async def get_analysis_by_report_id(
     """
     Retrieve existing analysis by report ID
     """
-    report = get_report_or_404(db, report_id)
-    image = get_image_or_404(db, report.image_id)
+    report, doctor_profile = get_report_with_doctor_or_404(db, report_id)
+    get_image_or_404(db, report.image_id)
     ensure_report_access(db, report, current_user)
     
-    analysis_data = report.report_json
-    if isinstance(analysis_data, str):
-        analysis_data = json.loads(analysis_data)
-    
-    analysis_data["report_id"] = report.id
-    analysis_data["image_id"] = report.image_id
-    analysis_data["review_status"] = report.review_status
-    analysis_data["doctor_active"] = report.doctor_active
-    analysis_data["patient_rating"] = report.patient_rating
-    analysis_data["patient_feedback"] = report.patient_feedback
-    analysis_data["created_at"] = report.created_at.isoformat()
+    analysis_data = serialize_report(report)
     
     # Include doctor details if assigned
-    if report.doctor_id:
-        doctor_profile = db.query(DoctorProfile).filter(DoctorProfile.user_id == report.doctor_id).first()
-        if doctor_profile:
-            analysis_data["doctor"] = {
-                "full_name": doctor_profile.full_name,
-                "avatar_url": doctor_profile.avatar_url,
-                "clinic_name": doctor_profile.clinic_name
-            }
+    if doctor_profile:
+        analysis_data["doctor"] = serialize_doctor(doctor_profile)
 
     return analysis_data
 
 
 @router.get("/image/{image_id}")
-async def get_analysis_by_image_id(
+def get_analysis_by_image_id(
     image_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -204,7 +261,7 @@ async def get_analysis_by_image_id(
     image = get_image_or_404(db, image_id)
     ensure_image_access(db, image, current_user)
     
-    report = db.query(AnalysisReport).filter(AnalysisReport.image_id == image_id).order_by(desc(AnalysisReport.created_at)).first()
+    report, doctor_profile = get_latest_report_with_doctor(db, image_id)
     
     if not report:
         raise HTTPException(
@@ -212,39 +269,25 @@ async def get_analysis_by_image_id(
             detail="No analysis found for this image"
         )
     
-    analysis_data = report.report_json
-    if isinstance(analysis_data, str):
-        analysis_data = json.loads(analysis_data)
-        
-    analysis_data["report_id"] = report.id
-    analysis_data["image_id"] = image.id
-    analysis_data["review_status"] = report.review_status
-    analysis_data["doctor_active"] = report.doctor_active
-    analysis_data["patient_rating"] = report.patient_rating
-    analysis_data["patient_feedback"] = report.patient_feedback
-    analysis_data["created_at"] = report.created_at.isoformat()
+    analysis_data = serialize_report(report)
 
     # Include doctor details if assigned
-    if report.doctor_id:
-        doctor_profile = db.query(DoctorProfile).filter(DoctorProfile.user_id == report.doctor_id).first()
-        if doctor_profile:
-            analysis_data["doctor"] = {
-                "full_name": doctor_profile.full_name,
-                "avatar_url": doctor_profile.avatar_url,
-                "clinic_name": doctor_profile.clinic_name
-            }
+    if doctor_profile:
+        analysis_data["doctor"] = serialize_doctor(doctor_profile)
     
     return analysis_data
 
 
 @router.get("/{image_id}/chat")
-async def get_chat_history(
+def get_chat_history(
     image_id: int,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Get chat history for a specific analysis (Patient or Doctor).
+    Get chat history for a specific analysis (Patient or Doctor), oldest first.
+    Paginated with limit/cursor; see app.services.pagination.
     """
     report = db.query(AnalysisReport).filter(AnalysisReport.image_id == image_id).order_by(desc(AnalysisReport.created_at)).first()
     
@@ -258,9 +301,12 @@ async def get_chat_history(
     if not (is_patient or is_doctor):
         raise HTTPException(status_code=403, detail="Forbidden")
         
-    messages = db.query(ChatMessage).filter(ChatMessage.report_id == report.id).order_by(ChatMessage.created_at.asc()).all()
+    messages, next_cursor = paginate(
+        db.query(ChatMessage).filter(ChatMessage.report_id == report.id),
+        page, ChatMessage.created_at, ChatMessage.id,
+    )
     
-    return [
+    return page_response([
         {
             "id": m.id,
             "sender_role": m.sender_role,
@@ -268,18 +314,59 @@ async def get_chat_history(
             "message": m.message,
             "created_at": m.created_at.isoformat()
         } for m in messages
-    ]
+    ], next_cursor, page)
 
 @router.post("/{image_id}/chat", response_model=ChatResponse)
 async def chat_about_lesion_endpoint(
     image_id: int,
     chat_request: ChatRequest,
+    request: Request,
+    stream: bool = Query(False),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Unified chat endpoint. Handles Patient -> AI, Patient -> Doctor, and Doctor -> Patient.
     AI responds only if doctor_active is False.
+    
+    With ?stream=true (or Accept: text/event-stream) the reply is sent as
+    Server-Sent Events: "delta" events with partial AI text, then a final
+    "done" event carrying the usual ChatResponse fields.
+    """
+    report_id, ai_context, response_message = await run_db(
+        db, _record_chat_message, image_id, chat_request.message, current_user
+    )
+
+    if wants_event_stream(request.headers.get("accept"), stream):
+        return _stream_chat_reply(db, report_id, image_id, chat_request.message, ai_context, response_message)
+
+    ai_reply = None
+    if ai_context is not None:
+        ai_reply = await get_gemini_service().chat_about_lesion(
+            ai_context["analysis"],
+            chat_request.message,
+            history=ai_context["history"],
+            summary=ai_context["summary"],
+        )
+        await run_db(db, _save_ai_message, report_id, ai_reply)
+
+    return ChatResponse(
+        image_id=image_id,
+        user_message=chat_request.message,
+        ai_response=ai_reply or response_message,
+        context_used=True if ai_reply else False
+    )
+
+
+def _record_chat_message(
+    db: Session, image_id: int, message: str, current_user: User
+) -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Save an incoming chat message and work out who answers it.
+
+    Returns (report_id, ai_context, response_message). ai_context holds the
+    analysis, rolling summary and recent history when the AI should reply;
+    otherwise it is None and response_message confirms who was messaged.
     """
     # Fetch Analysis Report by image_id
     report = db.query(AnalysisReport).filter(AnalysisReport.image_id == image_id).order_by(desc(AnalysisReport.created_at)).first()
@@ -299,106 +386,125 @@ async def chat_about_lesion_endpoint(
         report_id=report.id,
         sender_id=current_user.id,
         sender_role=current_user.role,
-        message=chat_request.message
+        message=message
     )
     db.add(new_msg)
-    
-    ai_reply = None
-    # AI responds ONLY to patient and ONLY if doctor is not active
-    if is_patient and not report.doctor_active:
-        # Get history for context
-        history = db.query(ChatMessage).filter(ChatMessage.report_id == report.id).all()
-        
-        # Call AI
-        analysis_data = report.report_json
-        if isinstance(analysis_data, str):
-            analysis_data = json.loads(analysis_data)
-        ai_reply = await get_gemini_service().chat_about_lesion(analysis_data, chat_request.message, history=history)
-        
-        # Save AI message
-        ai_msg = ChatMessage(
-            report_id=report.id,
-            sender_role="ai",
-            message=ai_reply
-        )
-        db.add(ai_msg)
-
-    db.commit()
 
-    # Determine response message:
-    # - If AI replied, use that response
-    # - If patient sent to active doctor, confirm message was sent to doctor
-    # - Otherwise (doctor sending), confirm message was sent to patient
-    if ai_reply:
-        response_message = ai_reply
-    elif is_patient and report.doctor_active:
+    # AI responds ONLY to patient and ONLY if doctor is not active.
+    # Otherwise confirm who the message was sent to.
+    ai_context = None
+    response_message = None
+    if is_patient and not report.doctor_active:
+        analysis_data = parse_report_json(report.report_json)
+        # Get bounded history (rolling summary + recent messages) for context
+        summary, recent = load_chat_context(db, report)
+        ai_context = {
+            "analysis": analysis_data,
+            "summary": summary,
+            # Snapshot history now; ORM rows expire on commit
+            "history": [SimpleNamespace(sender_role=m.sender_role, message=m.message) for m in recent],
+        }
+    elif is_patient:
         response_message = "Message sent to doctor."
     else:
         response_message = "Message sent to patient."
 
-    return ChatResponse(
-        image_id=image_id,
-        user_message=chat_request.message,
-        ai_response=response_message,
-        context_used=True if ai_reply else False
-    )
+    report_id = report.id
+    db.commit()
+    return report_id, ai_context, response_message
+
+
+def _save_ai_message(db: Session, report_id: int, message: str) -> int:
+    ai_msg = ChatMessage(report_id=report_id, sender_role="ai", message=message)
+    db.add(ai_msg)
+    db.commit()
+    return ai_msg.id
+
+
+def _stream_chat_reply(
+    db: Session,
+    report_id: int,
+    image_id: int,
+    user_message: str,
+    ai_context: Optional[Dict[str, Any]],
+    response_message: Optional[str],
+) -> StreamingResponse:
+    """
+    SSE variant of the chat reply. The incoming message is already committed;
+    the AI message is persisted once the stream completes.
+    """
+    async def events():
+        if ai_context is None:
+            result = ChatResponse(
+                image_id=image_id,
+                user_message=user_message,
+                ai_response=response_message,
+                context_used=False,
+            )
+            yield sse_event("done", result.model_dump())
+            return
+
+        chunks = []
+        async for delta in get_gemini_service().stream_chat_about_lesion(
+            ai_context["analysis"], user_message, history=ai_context["history"], summary=ai_context["summary"]
+        ):
+            chunks.append(delta)
+            yield sse_event("delta", {"delta": delta})
+
+        ai_reply = "".join(chunks)
+        # get_db's session stays open until the response body has been sent
+        message_id = await run_db(db, _save_ai_message, report_id, ai_reply)
+
+        result = ChatResponse(
+            image_id=image_id,
+            user_message=user_message,
+            ai_response=ai_reply,
+            context_used=True,
+        )
+        yield sse_event("done", {**result.model_dump(), "message_id": message_id})
+
+    return event_stream_response(events())
 
 
 @router.get("/patient/reports")
-async def get_patient_reports(
+def get_patient_reports(
     current_patient: User = Depends(get_current_patient),
+    page: PageParams = Depends(),
     db: Session = Depends(get_db)
-) -> List[Dict[str, Any]]:
+) -> Any:
     """
-    List all analysis reports for the current patient.
+    List analysis reports for the current patient, newest first.
+    Paginated with limit/cursor; see app.services.pagination.
     """
-    reports = db.query(AnalysisReport).filter(
-        AnalysisReport.patient_id == current_patient.id
-    ).order_by(AnalysisReport.created_at.desc()).all()
+    reports, next_cursor = paginate(
+        db.query(AnalysisReport).filter(AnalysisReport.patient_id == current_patient.id),
+        page, AnalysisReport.created_at, AnalysisReport.id, descending=True,
+    )
+    
+    # One batched lookup for every assigned doctor (for historical display - S2-4)
+    profiles = load_doctor_profiles(db, (report.doctor_id for report in reports))
     
     results = []
     for report in reports:
-        data = report.report_json
-        if isinstance(data, str):
-            try:
-                data = json.loads(data)
-            except json.JSONDecodeError:
-                data = {}
-        
-        if not isinstance(data, dict):
-            data = {}
-
-        data["report_id"] = report.id
-        data["image_id"] = report.image_id
-        data["review_status"] = report.review_status
-        data["doctor_active"] = report.doctor_active
-        data["patient_rating"] = report.patient_rating
-        data["patient_feedback"] = report.patient_feedback
-        data["created_at"] = report.created_at.isoformat()
+        data = serialize_report(report)
         data["doctor_id"] = report.doctor_id
-        
-        # Fetch doctor name if doctor_id exists (for historical display - S2-4)
-        if report.doctor_id:
-            profile = db.query(DoctorProfile).filter(
-                DoctorProfile.user_id == report.doctor_id
-            ).first()
-            data["doctor_name"] = profile.full_name if profile else None
-        else:
-            data["doctor_name"] = None
-            
+        profile = profiles.get(report.doctor_id)
+        data["doctor_name"] = profile.full_name if profile else None
         results.append(data)
         
-    return results
+    return page_response(results, next_cursor, page)
 
 
 @router.get("/doctor/patients/{patient_id}/reports")
-async def get_doctor_patient_reports(
+def get_doctor_patient_reports(
     patient_id: int,
     current_doctor: User = Depends(get_current_doctor),
+    page: PageParams = Depends(),
     db: Session = Depends(get_db)
-) -> List[Dict[str, Any]]:
+) -> Any:
     """
-    List all analysis reports for a specific patient (Doctor only).
+    List analysis reports for a specific patient (Doctor only), newest first.
+    Paginated with limit/cursor; see app.services.pagination.
     """
     # Verify patient exists
     patient = db.query(User).filter(User.id == patient_id, User.role == "patient").first()
@@ -408,29 +514,10 @@ async def get_doctor_patient_reports(
             detail="Patient not found"
         )
         
-    reports = db.query(AnalysisReport).filter(
-        AnalysisReport.patient_id == patient_id
-    ).order_by(AnalysisReport.created_at.desc()).all()
+    reports, next_cursor = paginate(
+        db.query(AnalysisReport).filter(AnalysisReport.patient_id == patient_id),
+        page, AnalysisReport.created_at, AnalysisReport.id, descending=True,
+    )
     
-    results = []
-    for report in reports:
-        data = report.report_json
-        if isinstance(data, str):
-            try:
-                data = json.loads(data)
-            except json.JSONDecodeError:
-                data = {}
-        
-        if not isinstance(data, dict):
-            data = {}
-
-        data["report_id"] = report.id
-        data["image_id"] = report.image_id
-        data["review_status"] = report.review_status
-        data["doctor_active"] = report.doctor_active
-        data["patient_rating"] = report.patient_rating
-        data["patient_feedback"] = report.patient_feedback
-        data["created_at"] = report.created_at.isoformat()
-        results.append(data)
-        
-    return results
+    return page_response([serialize_report(report) for report in reports], next_cursor, page)
+
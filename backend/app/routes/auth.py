@@ -12,8 +12,9 @@ from app.auth_helpers import get_current_user
 from app.services.public_session_store import public_session_store
 from app.config import MEDIA_ROOT
 from app.models import Image, AnalysisReport, ChatMessage
+from app.services.image_service import store_existing_file
+from app.services.media_service import safe_remove_media_file
 import os
-import shutil
 from pathlib import Path
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -74,11 +75,8 @@ def signup(user_data: UserSignup, db: Session = Depends(get_db)):
                     if not src_path.is_absolute():
                         src_path = MEDIA_ROOT / src_path
                     if src_path.exists():
-                        target_dir = MEDIA_ROOT / "uploads"
-                        target_dir.mkdir(parents=True, exist_ok=True)
-                        target_path = target_dir / src_path.name
-                        shutil.move(str(src_path), str(target_path))
-                        final_image_path = (Path("uploads") / src_path.name).as_posix()
+                        final_image_path = store_existing_file(src_path)
+                        safe_remove_media_file(session["image_path"])
 
                         # 3. Create Image Record
                         new_image = Image(
@@ -1,37 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 
-from app.db import get_db
-from app.models import AnalysisReport, User, PatientDoctorLink, ChatMessage
-from app.auth_helpers import get_current_user, get_current_patient, get_current_doctor
+from app.db import get_db, run_db
+from app.models import ACTIVE_CASE_STATUSES, AnalysisReport, User, PatientDoctorLink, ChatMessage
+from app.auth_helpers import get_current_patient, get_current_doctor
 from app.routes.websocket import manager as ws_manager
 from app.schemas import CaseRatingRequest
+from app.services.pagination import PageParams, page_response, paginate
 from app.services.report_service import submit_patient_rating
 
 router = APIRouter(prefix="/cases", tags=["Cases/Escalation"])
 
 @router.get("/pending")
-async def get_pending_cases(
+def get_pending_cases(
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     current_doctor: User = Depends(get_current_doctor)
 ) -> Any:
     """
-    List all pending review requests for patients linked to this doctor.
+    List pending review requests for patients linked to this doctor, oldest first.
+    Paginated with limit/cursor; see app.services.pagination.
     """
     # Join with PatientDoctorLink to ensure we only see our own patients' pending requests
-    pending = (
+    pending, next_cursor = paginate(
         db.query(AnalysisReport, User.email)
         .join(User, AnalysisReport.patient_id == User.id)
         .join(PatientDoctorLink, PatientDoctorLink.patient_id == User.id)
         .filter(
             PatientDoctorLink.doctor_id == current_doctor.id,
             AnalysisReport.review_status == "pending"
-        )
-        .all()
+        ),
+        page, AnalysisReport.created_at, AnalysisReport.id,
+        key=lambda row: row[0],
     )
 
-    return [
+    return page_response([
         {
             "report_id": report.id,
             "patient_id": report.patient_id,
@@ -41,10 +45,10 @@ async def get_pending_cases(
             "review_status": report.review_status
         }
         for report, email in pending
-    ]
+    ], next_cursor, page)
 
 @router.post("/{report_id}/request-review")
-async def request_doctor_review(
+def request_doctor_review(
     report_id: int,
     db: Session = Depends(get_db),
     current_patient: User = Depends(get_current_patient)
@@ -66,7 +70,7 @@ async def request_doctor_review(
     # Constraint: Only one active case (pending or accepted) per patient
     active_case = db.query(AnalysisReport).filter(
         AnalysisReport.patient_id == current_patient.id,
-        AnalysisReport.review_status.in_(["pending", "accepted"])
+        AnalysisReport.review_status.in_(ACTIVE_CASE_STATUSES)
     ).first()
 
     if active_case:
@@ -91,6 +95,23 @@ async def request_doctor_review(
         "review_status": report.review_status
     }
 
+async def _broadcast_case_update(report: AnalysisReport, system_msg: ChatMessage) -> None:
+    """Send the system message, then a status_update so clients refresh the case."""
+    await ws_manager.broadcast_to_report(report.id, {
+        "type": "new_message",
+        "id": system_msg.id,
+        "sender_role": "system",
+        "sender_id": None,
+        "message": system_msg.message,
+        "created_at": system_msg.created_at.isoformat()
+    })
+    await ws_manager.broadcast_to_report(report.id, {
+        "type": "status_update",
+        "status": report.review_status,
+        "report_id": report.id
+    })
+
+
 @router.post("/{report_id}/accept")
 async def accept_case(
     report_id: int,
@@ -100,6 +121,20 @@ async def accept_case(
     """
     Doctor accepts a pending review request.
     """
+    report, system_msg = await run_db(db, _accept_case, report_id, current_doctor.id)
+    
+    # Broadcast to connected WebSocket clients on every worker
+    print(f"[Cases] ACCEPT: {len(ws_manager.connections.get(report.id, {}))} local connections for report {report.id}")
+    await _broadcast_case_update(report, system_msg)
+
+    return {
+        "message": "Case accepted",
+        "report_id": report.id,
+        "review_status": report.review_status,
+        "doctor_active": report.doctor_active
+    }
+
+def _accept_case(db: Session, report_id: int, doctor_id: int) -> Tuple[AnalysisReport, ChatMessage]:
     report = db.query(AnalysisReport).filter(AnalysisReport.id == report_id).first()
 
     if not report:
@@ -113,7 +148,7 @@ async def accept_case(
 
     # In a real app, we'd also check if the doctor is linked to the patient
     # For now, let's assign the current doctor
-    report.doctor_id = current_doctor.id
+    report.doctor_id = doctor_id
     report.review_status = "accepted"
     report.doctor_active = True
     
@@ -128,50 +163,8 @@ async def accept_case(
     db.commit()
     db.refresh(report)
     db.refresh(system_msg)
-    
-    # Broadcast to connected WebSocket clients
-    conns = ws_manager.connections.get(report.id, {})
-    print(f"[Cases] ACCEPT: Found {len(conns)} active connections for report {report.id}")
-    
-    broadcast_data = {
-        "type": "new_message",
-        "id": system_msg.id,
-        "sender_role": "system",
-        "sender_id": None,
-        "message": system_msg.message,
-        "created_at": system_msg.created_at.isoformat()
-    }
-    
-    # Broadcast asynchronously to all connected users for this report
-    import asyncio
-    for user_id, ws in conns.items():
-        try:
-            print(f"[Cases] Broadcasting to user {user_id}")
-            asyncio.create_task(ws.send_json(broadcast_data))
-        except Exception as e:
-            print(f"[Cases] Error broadcasting to {user_id}: {e}")
+    return report, system_msg
 
-    # Explicitly broadcast status update to trigger frontend refresh
-    status_update_msg = {
-        "type": "status_update",
-        "status": report.review_status,
-        "report_id": report.id
-    }
-    print(f"[Cases] ACCEPT: sending status_update to {len(conns)} lists")
-    for user_id, ws in conns.items():
-        try:
-            print(f"[Cases] Sending status_update to user {user_id}")
-            asyncio.create_task(ws.send_json(status_update_msg))
-        except Exception as e:
-            print(f"[Cases] Error sending status_update to {user_id}: {e}")
-            pass
-
-    return {
-        "message": "Case accepted",
-        "report_id": report.id,
-        "review_status": report.review_status,
-        "doctor_active": report.doctor_active
-    }
 
 @router.post("/{report_id}/complete")
 async def complete_case(
@@ -182,9 +175,24 @@ async def complete_case(
     """
     Doctor marks a case as reviewed/complete.
     """
+    report, system_msg = await run_db(db, _complete_case, report_id, current_doctor.id)
+    
+    # Broadcast to connected WebSocket clients on every worker
+    print(f"[Cases] COMPLETE: {len(ws_manager.connections.get(report.id, {}))} local connections for report {report.id}")
+    await _broadcast_case_update(report, system_msg)
+
+    return {
+        "message": "Case review completed",
+        "report_id": report.id,
+        "review_status": report.review_status,
+        "doctor_active": report.doctor_active
+    }
+
+
+def _complete_case(db: Session, report_id: int, doctor_id: int) -> Tuple[AnalysisReport, ChatMessage]:
     report = db.query(AnalysisReport).filter(
         AnalysisReport.id == report_id,
-        AnalysisReport.doctor_id == current_doctor.id
+        AnalysisReport.doctor_id == doctor_id
     ).first()
 
     if not report:
@@ -207,53 +215,11 @@ async def complete_case(
     db.commit()
     db.refresh(report)
     db.refresh(system_msg)
-    
-    # Broadcast to connected WebSocket clients
-    conns = ws_manager.connections.get(report.id, {})
-    print(f"[Cases] COMPLETE: Found {len(conns)} active connections for report {report.id}")
-
-    broadcast_data = {
-        "type": "new_message",
-        "id": system_msg.id,
-        "sender_role": "system",
-        "sender_id": None,
-        "message": system_msg.message,
-        "created_at": system_msg.created_at.isoformat()
-    }
-    
-    import asyncio
-    for user_id, ws in conns.items():
-        try:
-            print(f"[Cases] Broadcasting to user {user_id}")
-            asyncio.create_task(ws.send_json(broadcast_data))
-        except Exception as e:
-             print(f"[Cases] Error broadcasting to {user_id}: {e}")
-
-    # Explicitly broadcast status update to trigger frontend refresh
-    status_update_msg = {
-        "type": "status_update",
-        "status": report.review_status,
-        "report_id": report.id
-    }
-    print(f"[Cases] COMPLETE: sending status_update to {len(conns)} clients")
-    for user_id, ws in conns.items():
-        try:
-            print(f"[Cases] Sending status_update to user {user_id}")
-            asyncio.create_task(ws.send_json(status_update_msg))
-        except Exception as e:
-            print(f"[Cases] Error sending status_update to {user_id}: {e}")
-            pass
-
-    return {
-        "message": "Case review completed",
-        "report_id": report.id,
-        "review_status": report.review_status,
-        "doctor_active": report.doctor_active
-    }
+    return report, system_msg
 
 
 @router.post("/{report_id}/rating")
-async def submit_case_rating(
+def submit_case_rating(
     report_id: int,
     payload: CaseRatingRequest,
     db: Session = Depends(get_db),
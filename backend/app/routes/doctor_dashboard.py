@@ -1,21 +1,24 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import Any
 
 from app.db import get_db
 from app.auth_helpers import get_current_doctor
 from app.models import User
 from app.services.doctor_service import get_doctor_patients
+from app.services.pagination import PageParams, page_response
 
 router = APIRouter(prefix="/doctor", tags=["Doctor Dashboard"])
 
 
 @router.get("/patients")
 def get_my_patients(
+    page: PageParams = Depends(),
     current_doctor: User = Depends(get_current_doctor),
     db: Session = Depends(get_db),
-) -> List[Dict[str, Any]]:
+) -> Any:
     """
-    List all patients linked to the current doctor.
+    List patients linked to the current doctor. Paginated with limit/cursor.
     """
-    return get_doctor_patients(db=db, doctor_id=current_doctor.id)
+    patients, next_cursor = get_doctor_patients(db=db, doctor_id=current_doctor.id, page=page)
+    return page_response(patients, next_cursor, page)
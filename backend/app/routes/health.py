@@ -12,7 +12,7 @@ router = APIRouter(tags=["health"])
 
 
 @router.get("/health")
-async def health(db: Session = Depends(get_db)):
+def health(db: Session = Depends(get_db)):
     """
     Health check endpoint (includes DB + env validation).
     """
@@ -21,7 +21,7 @@ async def health(db: Session = Depends(get_db)):
 
 
 @router.get("/ready")
-async def ready(db: Session = Depends(get_db)):
+def ready(db: Session = Depends(get_db)):
     """
     Readiness endpoint (same checks as /health).
     """
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Depends, File, UploadFile, status
 from sqlalchemy.orm import Session
 
-from app.auth_helpers import get_current_patient
-from app.db import get_db
+from app.auth_helpers import get_current_patient, get_current_user
+from app.db import get_db, run_db
 from app.models import User
-from app.services.image_service import save_patient_image
-from app.services.media_service import create_signed_media_url
-from app.config import MAX_UPLOAD_SIZE_MB, ALLOWED_IMAGE_TYPES
-from fastapi import HTTPException
+from app.schemas import SignedMediaUrlsRequest, SignedMediaUrlsResponse
+from app.services.image_service import save_patient_image, stage_upload
+from app.services.media_service import create_signed_media_url, sign_media_paths
+from app.services.report_service import accessible_images
 
 router = APIRouter(prefix="/images", tags=["Images"])
 
@@ -21,31 +21,40 @@ async def upload_image(
     """
     Upload an image for the authenticated patient and link it to their doctor.
     """
-    # 1. Validate File Type
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid file type: {file.content_type}. Allowed types: {', '.join(ALLOWED_IMAGE_TYPES)}"
+    # Streams to a staging file; rejects bad types and oversized uploads early
+    upload = await stage_upload(file)
+    try:
+        image = await run_db(
+            db,
+            save_patient_image,
+            patient_id=current_patient.id,
+            upload=upload,
         )
+    finally:
+        upload.discard()
 
-    # 2. Validate File Size
-    # Read a chunk to check size without loading entire file into memory if it's huge
-    # But for 5MB, reading it is fine. 
-    file_bytes = await file.read()
-    
-    size_mb = len(file_bytes) / (1024 * 1024)
-    if size_mb > MAX_UPLOAD_SIZE_MB:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large: {size_mb:.2f}MB. Maximum allowed is {MAX_UPLOAD_SIZE_MB}MB."
-        )
-
-    await file.close()
+    return {
+        "image_id": image.id,
+        "image_url": create_signed_media_url(image.image_url),
+        "thumbnail_url": create_signed_media_url(image.image_url, size="thumb"),
+    }
 
-    image = save_patient_image(
-        db=db,
-        patient_id=current_patient.id,
-        file_bytes=file_bytes,
-    )
 
-    return {"image_id": image.id, "image_url": create_signed_media_url(image.image_url)}
+@router.post("/signed-urls", response_model=SignedMediaUrlsResponse)
+async def issue_signed_urls(
+    payload: SignedMediaUrlsRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Signed media URLs for many images in one round trip. Access is checked
+    for all ids in one query; ids the user cannot view are listed in denied.
+    """
+    images = await run_db(db, accessible_images, payload.image_ids, current_user)
+    urls, expires_at = sign_media_paths((image.image_url for image in images), size=payload.size)
+    granted = {image.id: urls[image.image_url] for image in images}
+    return {
+        "urls": granted,
+        "expires_at": expires_at,
+        "denied": sorted(set(payload.image_ids) - granted.keys()),
+    }
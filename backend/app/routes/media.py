@@ -1,22 +1,41 @@
 import mimetypes
 import logging
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Query, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
 from fastapi.responses import FileResponse
 
 from app.config import MEDIA_URL_TTL_SECONDS
-from app.services.media_service import resolve_media_path, verify_media_token
+from app.services.image_preprocessing import media_rendition
+from app.services.media_service import (
+    http_date,
+    is_not_modified,
+    media_etag,
+    media_file_path,
+    validate_media_size,
+    verified_media_path,
+)
 
 router = APIRouter(prefix="/media", tags=["Media"])
 logger = logging.getLogger("app.media")
 
 
 @router.get("/{media_path:path}")
-def get_media_file(media_path: str, token: str = Query(default=None)) -> FileResponse:
+def get_media_file(
+    request: Request,
+    media_path: str,
+    token: str = Query(default=None),
+    size: Optional[str] = Query(default=None),
+) -> Response:
     """
     Serve protected media files using a short-lived signed token.
+    ?size=thumb|small|medium serves a downscaled rendition, created on first request.
+
+    Responses carry a content-derived ETag that does not depend on the token,
+    answer If-None-Match/If-Modified-Since with 304 and support Range (206).
     """
-    if not token or not verify_media_token(token, media_path):
+    relative = verified_media_path(token, media_path)
+    if relative is None:
         logger.warning(
             "media.token_invalid",
             extra={"path": media_path, "has_token": bool(token)},
@@ -26,11 +45,28 @@ def get_media_file(media_path: str, token: str = Query(default=None)) -> FileRes
             detail="Invalid or missing media token",
         )
 
-    file_path = resolve_media_path(media_path)
+    file_path = media_file_path(relative)
+    if validate_media_size(size):
+        file_path = media_rendition(file_path, size)
+    stat_result = file_path.stat()
+    headers = {
+        "Cache-Control": f"private, max-age={MEDIA_URL_TTL_SECONDS}",
+        "ETag": media_etag(file_path, stat_result),
+        "Last-Modified": http_date(stat_result.st_mtime),
+    }
+    if is_not_modified(
+        headers["ETag"],
+        stat_result.st_mtime,
+        request.headers.get("if-none-match"),
+        request.headers.get("if-modified-since"),
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
     media_type, _ = mimetypes.guess_type(str(file_path))
-    headers = {"Cache-Control": f"private, max-age={MEDIA_URL_TTL_SECONDS}"}
+    # FileResponse handles Range/If-Range against the ETag above
     return FileResponse(
         path=file_path,
         media_type=media_type or "application/octet-stream",
         headers=headers,
+        stat_result=stat_result,
     )
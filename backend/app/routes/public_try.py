@@ -1,12 +1,14 @@
-import tempfile
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile, status
 
+from app.config import MEDIA_ROOT
 from app.schemas import PublicChatRequest, PublicChatResponse
 from app.services.gemini_service import get_gemini_service
+from app.services.image_service import save_anonymous_image, stage_upload
 from app.services.public_session_store import public_session_store
+from app.services.sse import event_stream_response, sse_event, wants_event_stream
 
 router = APIRouter(prefix="/public", tags=["Public/Anonymous"])
 
@@ -50,32 +52,18 @@ def _normalize_analysis(raw_result: Dict[str, Any]) -> Dict[str, Any]:
 @router.post("/try/analyze")
 async def analyze_anonymously(file: UploadFile = File(...)) -> Dict[str, Any]:
     """Allow anonymous users to upload and receive a one-off AI analysis without auth."""
-    from app.config import MEDIA_ROOT
-    import uuid
-    import shutil
-
-    file_bytes = await file.read()
-    # await file.close() # Don't close yet if we want to write it again, but we read bytes so it's fine.
-
-    if not file_bytes:
+    # Same type/size limits as authenticated uploads, streamed to disk
+    upload = await stage_upload(file)
+    if not upload.size:
+        upload.discard()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Uploaded file cannot be empty",
         )
 
-    # Setup anonymous storage
-    anon_dir = MEDIA_ROOT / "anonymous"
-    anon_dir.mkdir(parents=True, exist_ok=True)
-
-    suffix = Path(file.filename or "upload.png").suffix or ".png"
-    filename = f"{uuid.uuid4().hex}{suffix}"
-    relative_path = Path("anonymous") / filename
+    relative_path = Path(save_anonymous_image(upload))
     file_path = MEDIA_ROOT / relative_path
 
-    # Save file persistently (until cleanup)
-    with open(file_path, "wb") as f:
-        f.write(file_bytes)
-
     try:
         raw_result = await get_gemini_service().analyze_skin_lesion(str(file_path))
     except Exception as exc:  # noqa: BLE001 - surface graceful error
@@ -87,27 +75,38 @@ async def analyze_anonymously(file: UploadFile = File(...)) -> Dict[str, Any]:
     
     # Store session with image path relative to media root or absolute?
     # Storing absolute path for simplicity in backend usage.
-    session_id = public_session_store.create_session(
-        analysis,
-        image_path=relative_path.as_posix(),
+    session_id = await public_session_store.run(
+        public_session_store.create_session, analysis, relative_path.as_posix()
     )
 
     return {"session_id": session_id, **analysis}
 
 
 @router.post("/try/chat", response_model=PublicChatResponse)
-async def chat_preview(payload: PublicChatRequest) -> PublicChatResponse:
+async def chat_preview(
+    payload: PublicChatRequest,
+    request: Request,
+    stream: bool = Query(False),
+):
     """
     Minimal chat preview for anonymous sessions. Does not use websockets or auth.
-    Conversations stay in memory and expire with the session.
+    Conversations live in the public session store and expire with the session.
+
+    With ?stream=true (or Accept: text/event-stream) the reply is streamed as
+    Server-Sent Events ending with a "done" event shaped like PublicChatResponse.
     """
-    session = public_session_store.get_session(payload.session_id)
+    store = public_session_store
+    session = await store.run(store.get_session, payload.session_id)
 
-    public_session_store.append_message(payload.session_id, "patient", payload.message)
+    await store.run(store.append_message, payload.session_id, "patient", payload.message)
+    summary, history = await store.run(store.chat_context, payload.session_id)
+
+    if wants_event_stream(request.headers.get("accept"), stream):
+        return event_stream_response(_stream_preview_reply(payload, session, history, summary))
 
     try:
         reply_text = await get_gemini_service().chat_about_lesion(
-            session["analysis"], payload.message, history=session["messages"]
+            session["analysis"], payload.message, history=history, summary=summary
         )
     except Exception as exc:  # noqa: BLE001 - user-facing fallback
         reply_text = (
@@ -115,10 +114,46 @@ async def chat_preview(payload: PublicChatRequest) -> PublicChatResponse:
             f"(Details: {exc})"
         )
 
-    public_session_store.append_message(payload.session_id, "ai", reply_text)
+    await store.run(store.append_message, payload.session_id, "ai", reply_text)
 
     return PublicChatResponse(
         session_id=payload.session_id,
         reply=reply_text,
         analysis=session["analysis"],
     )
+
+
+async def _stream_preview_reply(
+    payload: PublicChatRequest,
+    session: Dict[str, Any],
+    history: List[Any],
+    summary: Optional[str],
+):
+    chunks = []
+    try:
+        async for delta in get_gemini_service().stream_chat_about_lesion(
+            session["analysis"], payload.message, history=history, summary=summary
+        ):
+            chunks.append(delta)
+            yield sse_event("delta", {"delta": delta})
+    except Exception as exc:  # noqa: BLE001 - user-facing fallback
+        fallback = (
+            "I'm having trouble answering right now, but your preview analysis recommends speaking with a clinician. "
+            f"(Details: {exc})"
+        )
+        chunks.append(fallback)
+        yield sse_event("delta", {"delta": fallback})
+
+    reply_text = "".join(chunks)
+    try:
+        await public_session_store.run(public_session_store.append_message, payload.session_id, "ai", reply_text)
+    except HTTPException:
+        # Session expired mid-stream; the reply was still delivered
+        pass
+
+    result = PublicChatResponse(
+        session_id=payload.session_id,
+        reply=reply_text,
+        analysis=session["analysis"],
+    )
+    yield sse_event("done", result.model_dump())
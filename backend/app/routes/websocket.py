@@ -1,50 +1,193 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from typing import Dict, Set
-import json
+from typing import Dict, List, Optional, Tuple
+from types import SimpleNamespace
+from uuid import uuid4
+import logging
+import time
 
-from app.db import get_db
+from app.config import WS_PUBSUB_BACKEND, WS_PUBSUB_REDIS_URL, WS_PUBSUB_SOCKET_DIR
+from app.db import get_db, run_db
 from app.models import AnalysisReport, ChatMessage
 from app.services.auth import verify_token
+from app.services.chat_context import load_chat_context
+from app.services.report_service import parse_report_json
+from app.services.ws_outbox import Frame, Outbox
+from app.services.ws_pubsub import InProcessPubSub, PubSub, build_pubsub
 
 router = APIRouter(tags=["WebSocket Chat"])
 
+logger = logging.getLogger("app.websocket")
+
 # Store active connections by report_id
 # { report_id: { user_id: websocket } }
 active_connections: Dict[int, Dict[int, WebSocket]] = {}
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.connections: Dict[int, Dict[int, WebSocket]] = {}
+    """
+    Sockets connected to this worker, by report and user. Broadcasts go to
+    local sockets directly and to other workers through the pub/sub backend
+    (see app.services.ws_pubsub), so chat works across uvicorn workers.
+
+    Each socket has its own Outbox (see app.services.ws_outbox): a broadcast
+    is serialized once and queued for every recipient without waiting on
+    any of them.
+    """
+
+    def __init__(self, pubsub: Optional[PubSub] = None):
+        self.connections: Dict[int, Dict[int, Outbox]] = {}
+        self.pubsub = pubsub or InProcessPubSub()
+        self.worker_id = uuid4().hex
+
+    async def start(self) -> None:
+        await self.pubsub.start(self._deliver_remote)
+
+    async def stop(self) -> None:
+        await self.pubsub.stop()
     
-    async def connect(self, websocket: WebSocket, report_id: int, user_id: int):
-        await websocket.accept()
+    def register(self, report_id: int, user_id: int, websocket: WebSocket) -> Outbox:
         if report_id not in self.connections:
             self.connections[report_id] = {}
-        self.connections[report_id][user_id] = websocket
+            self.pubsub.subscribe(report_id)
+        outbox = Outbox(
+            websocket,
+            on_close=lambda closed: self._discard(report_id, user_id, closed),
+            label={"report_id": report_id, "user_id": user_id},
+        )
+        previous = self.connections[report_id].get(user_id)
+        self.connections[report_id][user_id] = outbox
+        if previous is not None:
+            previous.close()  # Same user reconnected; the old socket gets nothing more
         print(f"[WS] User {user_id} connected to report {report_id}")
+        return outbox
     
-    def disconnect(self, report_id: int, user_id: int):
-        if report_id in self.connections:
-            if user_id in self.connections[report_id]:
-                del self.connections[report_id][user_id]
-                print(f"[WS] User {user_id} disconnected from report {report_id}")
-            if not self.connections[report_id]:
-                del self.connections[report_id]
+    def disconnect(self, report_id: int, user_id: int, websocket: Optional[WebSocket] = None):
+        """Forget a socket; with websocket given, only if it has not been replaced by a reconnect."""
+        outbox = self.connections.get(report_id, {}).get(user_id)
+        if outbox is not None and (websocket is None or outbox.websocket is websocket):
+            self._discard(report_id, user_id, outbox)
+
+    def _discard(self, report_id: int, user_id: int, outbox: Outbox) -> None:
+        sockets = self.connections.get(report_id)
+        if sockets is None or sockets.get(user_id) is not outbox:
+            return
+        del sockets[user_id]
+        print(f"[WS] User {user_id} disconnected from report {report_id}")
+        if not sockets:
+            del self.connections[report_id]
+            self.pubsub.unsubscribe(report_id)
+        outbox.close()  # Its on_close calls back here and finds nothing left to do
+
+    def send_local(self, report_id: int, message: dict, exclude_user: Optional[int] = None) -> int:
+        """Queue message for the users connected to a report on this worker; returns how many accepted it"""
+        frame = Frame.of(message)
+        return sum(
+            outbox.offer(frame)
+            for user_id, outbox in list(self.connections.get(report_id, {}).items())
+            if user_id != exclude_user
+        )
     
     async def broadcast_to_report(self, report_id: int, message: dict, exclude_user: int = None):
-        """Send message to all users connected to a report"""
-        if report_id in self.connections:
-            for user_id, websocket in self.connections[report_id].items():
-                if user_id != exclude_user:
-                    try:
-                        await websocket.send_json(message)
-                    except Exception as e:
-                        print(f"[WS] Error sending to user {user_id}: {e}")
+        """Send message to all users connected to a report, on every worker"""
+        self.send_local(report_id, message, exclude_user)
+        envelope = {"origin": self.worker_id, "message": message, "exclude_user": exclude_user}
+        try:
+            await self.pubsub.publish(report_id, envelope)
+        except Exception:  # noqa: BLE001 - local delivery already happened
+            logger.warning("ws.publish_failed", extra={"report_id": report_id}, exc_info=True)
+
+    async def _deliver_remote(self, report_id: int, envelope: dict) -> None:
+        if envelope.get("origin") == self.worker_id:
+            return
+        self.send_local(report_id, envelope["message"], envelope.get("exclude_user"))
+
 
+manager = ConnectionManager(build_pubsub(WS_PUBSUB_BACKEND, WS_PUBSUB_SOCKET_DIR, WS_PUBSUB_REDIS_URL))
 
-manager = ConnectionManager()
+
+async def stream_ai_reply(
+    ai_service,
+    report_id: int,
+    analysis_data: dict,
+    user_message: str,
+    history: list,
+    summary: Optional[str] = None,
+) -> Tuple[str, str]:
+    """
+    Stream an AI chat reply to every connection on the report as ai_delta
+    frames and return (stream_id, full_reply) once the stream ends.
+    """
+    stream_id = uuid4().hex
+    started = time.perf_counter()
+    first_token_ms = None
+    chunks: List[str] = []
+
+    async for delta in ai_service.stream_chat_about_lesion(
+        analysis_data, user_message, history=history, summary=summary
+    ):
+        if first_token_ms is None:
+            first_token_ms = round((time.perf_counter() - started) * 1000, 2)
+        chunks.append(delta)
+        await manager.broadcast_to_report(
+            report_id,
+            {"type": "ai_delta", "stream_id": stream_id, "delta": delta},
+        )
+
+    logger.info(
+        "ws.ai_stream_complete",
+        extra={
+            "report_id": report_id,
+            "time_to_first_token_ms": first_token_ms,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "chunks": len(chunks),
+        },
+    )
+    return stream_id, "".join(chunks)
+
+
+def _serialize_message(m: ChatMessage) -> dict:
+    return {
+        "id": m.id,
+        "sender_role": m.sender_role,
+        "sender_id": m.sender_id,
+        "message": m.message,
+        "created_at": m.created_at.isoformat()
+    }
+
+
+def _get_report(db: Session, report_id: int) -> Optional[AnalysisReport]:
+    return db.query(AnalysisReport).filter(AnalysisReport.id == report_id).first()
+
+
+def _list_messages(db: Session, report_id: int) -> List[dict]:
+    messages = db.query(ChatMessage).filter(ChatMessage.report_id == report_id).order_by(ChatMessage.created_at.asc()).all()
+    return [_serialize_message(m) for m in messages]
+
+
+def _save_message(db: Session, report_id: int, sender_id: Optional[int], sender_role: str, message: str) -> dict:
+    msg = ChatMessage(
+        report_id=report_id,
+        sender_id=sender_id,
+        sender_role=sender_role,
+        message=message
+    )
+    db.add(msg)
+    db.commit()
+    db.refresh(msg)
+    return _serialize_message(msg)
+
+
+def _load_ai_context(db: Session, report: AnalysisReport) -> Optional[Tuple[dict, Optional[str], list]]:
+    """Return (analysis, summary, history) for an AI reply, or None while a doctor is active."""
+    if report.doctor_active:
+        return None
+    # Get bounded history (rolling summary + recent messages) for context
+    summary, recent = load_chat_context(db, report)
+    db.commit()
+    analysis_data = parse_report_json(report.report_json)
+    history = [SimpleNamespace(sender_role=m.sender_role, message=m.message) for m in recent]
+    return analysis_data, summary, history
 
 
 @router.websocket("/ws/chat/{report_id}")
@@ -87,7 +230,7 @@ async def websocket_chat(
         print(f"[WS] User {user_id} ({user_role}) attempting to access report {report_id}")
         
         # Verify access to this report
-        report = db.query(AnalysisReport).filter(AnalysisReport.id == report_id).first()
+        report = await run_db(db, _get_report, report_id)
         if not report:
             print(f"[WS] Report {report_id} not found")
             await websocket.send_json({"error": "Report not found"})
@@ -114,29 +257,19 @@ async def websocket_chat(
         
         print(f"[WS] Access granted, registering connection")
         
-        # Register connection
-        if report_id not in manager.connections:
-            manager.connections[report_id] = {}
-        manager.connections[report_id][user_id] = websocket
+        # Register connection; from here on everything is sent through its outbox
+        outbox = manager.register(report_id, user_id, websocket)
         
         # Send connection success and existing messages
-        messages = db.query(ChatMessage).filter(ChatMessage.report_id == report_id).order_by(ChatMessage.created_at.asc()).all()
+        messages = await run_db(db, _list_messages, report_id)
         print(f"[WS] Sending {len(messages)} existing messages")
-        await websocket.send_json({
+        outbox.offer(Frame.of({
             "type": "connected",
             "user_id": user_id,
             "role": user_role,
-            "messages": [
-                {
-                    "id": m.id,
-                    "sender_role": m.sender_role,
-                    "sender_id": m.sender_id,
-                    "message": m.message,
-                    "created_at": m.created_at.isoformat()
-                } for m in messages
-            ]
-        })
-        print(f"[WS] Connected message sent successfully, entering message loop")
+            "messages": messages
+        }))
+        print(f"[WS] Connected message queued, entering message loop")
         
         # Listen for messages
         while True:
@@ -147,76 +280,38 @@ async def websocket_chat(
                 print(f"[WS] Received message from user {user_id}: {message_text[:50]}...")
                 if message_text:
                     # Save to database
-                    new_msg = ChatMessage(
-                        report_id=report_id,
-                        sender_id=user_id,
-                        sender_role=user_role,
-                        message=message_text
-                    )
-                    db.add(new_msg)
-                    db.commit()
-                    db.refresh(new_msg)
+                    new_msg = await run_db(db, _save_message, report_id, user_id, user_role, message_text)
                     
                     # Broadcast to all connected users
-                    broadcast_msg = {
-                        "type": "new_message",
-                        "id": new_msg.id,
-                        "sender_role": user_role,
-                        "sender_id": user_id,
-                        "message": message_text,
-                        "created_at": new_msg.created_at.isoformat()
-                    }
+                    broadcast_msg = {"type": "new_message", **new_msg}
                     
-                    print(f"[WS] Report {report_id}: Broadcasting message {new_msg.id} to {len(manager.connections.get(report_id, {}))} users")
-                    for uid, ws in manager.connections.get(report_id, {}).items():
-                        try:
-                            await ws.send_json(broadcast_msg)
-                        except Exception as e:
-                            print(f"[WS] Error broadcasting to user {uid}: {e}")
-                            pass
+                    print(f"[WS] Report {report_id}: Broadcasting message {new_msg['id']} to {len(manager.connections.get(report_id, {}))} local users")
+                    await manager.broadcast_to_report(report_id, broadcast_msg)
                     
                     # If patient sent message and doctor is not active, trigger AI response
-                    if user_role == "patient" and not report.doctor_active:
+                    ai_context = None
+                    if user_role == "patient":
+                        ai_context = await run_db(db, _load_ai_context, report)
+                    if ai_context is not None:
                         # Import here to avoid circular imports
                         from app.services.gemini_service import get_gemini_service
                         
-                        # Get history for context
-                        history = db.query(ChatMessage).filter(ChatMessage.report_id == report_id).all()
-                        analysis_data = report.report_json
-                        if isinstance(analysis_data, str):
-                            analysis_data = json.loads(analysis_data)
-                        
-                        # Get AI response
-                        ai_reply = await get_gemini_service().chat_about_lesion(analysis_data, message_text, history=history)
+                        analysis_data, summary, history = ai_context
                         
-                        # Save AI message
-                        ai_msg = ChatMessage(
-                            report_id=report_id,
-                            sender_role="ai",
-                            message=ai_reply
+                        # Stream the AI response to everyone as it is generated
+                        stream_id, ai_reply = await stream_ai_reply(
+                            get_gemini_service(), report_id, analysis_data, message_text, history, summary
                         )
-                        db.add(ai_msg)
-                        db.commit()
-                        db.refresh(ai_msg)
                         
-                        # Broadcast AI response
-                        ai_broadcast = {
-                            "type": "new_message",
-                            "id": ai_msg.id,
-                            "sender_role": "ai",
-                            "sender_id": None,
-                            "message": ai_reply,
-                            "created_at": ai_msg.created_at.isoformat()
-                        }
+                        # Save AI message once the stream has finished
+                        ai_msg = await run_db(db, _save_message, report_id, None, "ai", ai_reply)
                         
-                        for uid, ws in manager.connections.get(report_id, {}).items():
-                            try:
-                                await ws.send_json(ai_broadcast)
-                            except:
-                                pass
+                        # Broadcast the final AI message (replaces the streamed draft)
+                        ai_broadcast = {"type": "new_message", "stream_id": stream_id, **ai_msg}
+                        await manager.broadcast_to_report(report_id, ai_broadcast)
     
     except WebSocketDisconnect:
-        manager.disconnect(report_id, user_id if 'user_id' in dir() else 0)
+        pass
     except Exception as e:
         print(f"[WS] Error: {e}")
         try:
@@ -224,4 +319,6 @@ async def websocket_chat(
         except:
             pass
     finally:
+        if user_id is not None:
+            manager.disconnect(report_id, user_id, websocket)
         db.close()
@@ -13,6 +13,8 @@ from pydantic import BaseModel, EmailStr, Field, field_validator, ConfigDict
 from typing import Literal, Optional, List, Dict, Any
 from datetime import datetime
 
+from app.config import MEDIA_SIGN_BATCH_MAX
+
 
 class UserSignup(BaseModel):
     """
@@ -182,3 +184,16 @@ class CaseRatingRequest(BaseModel):
     """Request body for patient rating submission."""
     rating: int = Field(..., ge=1, le=5, description="Rating from 1 to 5")
     feedback: Optional[str] = Field(None, max_length=1000, description="Optional patient feedback")
+
+
+class SignedMediaUrlsRequest(BaseModel):
+    """Request body for batch signed-URL issuance."""
+    image_ids: List[int] = Field(..., min_length=1, max_length=MEDIA_SIGN_BATCH_MAX)
+    size: Optional[str] = Field(None, description="Rendition name, e.g. 'thumb'")
+
+
+class SignedMediaUrlsResponse(BaseModel):
+    """Signed URLs keyed by image id, all expiring together."""
+    urls: Dict[int, str]
+    expires_at: int = Field(..., description="Unix timestamp when every URL expires")
+    denied: List[int] = Field(default_factory=list, description="Ids not found or not accessible")
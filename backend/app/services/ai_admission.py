@@ -0,0 +1,139 @@
+"""
+Admission control for upstream AI calls.
+
+Each controller caps concurrent in-flight calls with a semaphore and can
+additionally pace call starts with a token bucket, so a traffic spike queues
+briefly instead of tripping upstream rate limits for everyone. Callers that
+wait longer than the queue timeout get AdmissionTimeout and take the normal
+TIMEOUT fallback path.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.config import (
+    AI_ADMISSION_TIMEOUT_SECONDS,
+    AI_ANALYSIS_MAX_CONCURRENCY,
+    AI_ANALYSIS_RATE_PER_SECOND,
+    AI_CHAT_MAX_CONCURRENCY,
+    AI_CHAT_RATE_PER_SECOND,
+)
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a call waited too long for an admission slot."""
+
+
+class AdmissionController:
+    """Semaphore + optional token bucket with queue depth and wait-time gauges."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        rate_per_second: float = 0,
+        burst: Optional[int] = None,
+        queue_timeout: float = 10,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.rate_per_second = rate_per_second
+        self.burst = burst or max(1, max_concurrent)
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    async def _take_token(self) -> None:
+        if self.rate_per_second <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second
+            )
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+    async def _acquire(self, semaphore: asyncio.Semaphore) -> None:
+        await semaphore.acquire()
+        try:
+            await self._take_token()
+        except BaseException:
+            semaphore.release()
+            raise
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold an admission slot for the duration of one upstream call."""
+        semaphore = self._get_semaphore()
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._acquire(semaphore), timeout=self.queue_timeout)
+        except asyncio.TimeoutError as exc:
+            self.rejected += 1
+            raise AdmissionTimeout(
+                f"Timed out after {self.queue_timeout} seconds waiting for an AI {self.name} slot."
+            ) from exc
+        finally:
+            self.waiting -= 1
+
+        wait = time.monotonic() - start
+        self.admitted += 1
+        self._total_wait += wait
+        self._last_wait = wait
+        self._max_wait = max(self._max_wait, wait)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "rate_per_second": self.rate_per_second,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "last_wait_ms": round(self._last_wait * 1000, 2),
+            "max_wait_ms": round(self._max_wait * 1000, 2),
+        }
+
+
+analysis_admission = AdmissionController(
+    "analysis",
+    max_concurrent=AI_ANALYSIS_MAX_CONCURRENCY,
+    rate_per_second=AI_ANALYSIS_RATE_PER_SECOND,
+    queue_timeout=AI_ADMISSION_TIMEOUT_SECONDS,
+)
+
+chat_admission = AdmissionController(
+    "chat",
+    max_concurrent=AI_CHAT_MAX_CONCURRENCY,
+    rate_per_second=AI_CHAT_RATE_PER_SECOND,
+    queue_timeout=AI_ADMISSION_TIMEOUT_SECONDS,
+)
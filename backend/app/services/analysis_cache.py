@@ -0,0 +1,216 @@
+"""
+Content-addressed cache for AI analysis results.
+
+Entries are keyed by a SHA-256 digest of the image bytes together with the
+model name and prompt text, so re-uploads of the same photo skip the model
+call while prompt or model changes naturally invalidate old results.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import (
+    ANALYSIS_CACHE_DISK_ENABLED,
+    ANALYSIS_CACHE_DISK_MAX_ENTRIES,
+    ANALYSIS_CACHE_MAX_ENTRIES,
+    ANALYSIS_CACHE_TTL_SECONDS,
+    MEDIA_ROOT,
+)
+
+logger = logging.getLogger("app.analysis_cache")
+
+
+def analysis_digest(image_bytes: bytes, model_name: str, prompt: str) -> str:
+    """Return the cache key for an image analysed with a given model and prompt."""
+    hasher = hashlib.sha256()
+    hasher.update(model_name.encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update(prompt.encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update(image_bytes)
+    return hasher.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Bounded in-memory LRU cache with TTL and an optional on-disk tier.
+
+    Values are stored as JSON strings so every hit hands back a fresh dict that
+    callers are free to mutate (routes add report_id etc. to the result).
+
+    A disk entry expires ttl_seconds after it was written (its mtime). The
+    disk tier holds at most about disk_max_entries files: once a write goes
+    over, the oldest files are removed down to 90% of the limit, so the
+    directory scan is paid once per many writes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: int = 86400,
+        disk_dir: Optional[Path] = None,
+        disk_max_entries: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_entries = max(1, disk_max_entries)
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_count: Optional[int] = None  # Files on disk as of the last scan, plus our writes since
+        self.disk_evictions = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def _disk_path(self, digest: str) -> Path:
+        return self.disk_dir / digest[:2] / f"{digest}.json"
+
+    def _read_disk(self, digest: str) -> Optional[Tuple[float, str]]:
+        """(seconds left to live, payload) of a disk entry, or None."""
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(digest)
+        try:
+            remaining = path.stat().st_mtime + self.ttl_seconds - time.time()
+            if remaining <= 0:
+                path.unlink(missing_ok=True)
+                return None
+            return remaining, path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def _write_disk(self, digest: str, payload: str) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(digest)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(payload, encoding="utf-8")
+            tmp_path.replace(path)
+        except OSError:
+            logger.warning("analysis_cache.disk_write_failed", extra={"digest": digest})
+            return
+
+        with self._disk_lock:
+            if self._disk_count is not None:
+                self._disk_count += 1
+            if self._disk_count is None or self._disk_count > self.disk_max_entries:
+                self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Remove expired files, then the oldest until under the limit. Caller holds _disk_lock."""
+        files = []
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        files.sort()
+
+        cutoff = time.time() - self.ttl_seconds
+        keep = len(files)
+        if keep > self.disk_max_entries:
+            keep = self.disk_max_entries * 9 // 10
+        removed = 0
+        for mtime, path in files:
+            if mtime >= cutoff and len(files) - removed <= keep:
+                break
+            path.unlink(missing_ok=True)
+            removed += 1
+
+        self._disk_count = len(files) - removed
+        if removed:
+            self.disk_evictions += removed
+            logger.info(
+                "analysis_cache.disk_pruned",
+                extra={"removed": removed, "remaining": self._disk_count},
+            )
+
+    def _store(self, digest: str, payload: str, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[digest] = (time.monotonic() + ttl, payload)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for digest, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return json.loads(payload)
+                del self._entries[digest]
+
+        disk_entry = self._read_disk(digest)
+        if disk_entry is not None:
+            # Keep the disk entry's expiry rather than starting a fresh TTL
+            remaining, payload = disk_entry
+            self._store(digest, payload, ttl_seconds=remaining)
+            with self._lock:
+                self.hits += 1
+                self.disk_hits += 1
+            return json.loads(payload)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, digest: str, result: Dict[str, Any]) -> None:
+        """Cache a successful analysis result."""
+        if not self.enabled:
+            return
+        payload = json.dumps(result)
+        self._store(digest, payload)
+        self._write_disk(digest, payload)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    def clear(self) -> None:
+        """Utility for tests to reset state. Leaves the disk tier untouched."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.disk_evictions = 0
+
+
+analysis_cache = AnalysisCache(
+    max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+    disk_dir=MEDIA_ROOT / "analysis_cache" if ANALYSIS_CACHE_DISK_ENABLED else None,
+    disk_max_entries=ANALYSIS_CACHE_DISK_MAX_ENTRIES,
+)
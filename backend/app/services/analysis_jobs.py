@@ -0,0 +1,201 @@
+"""
+Background job queue for AI analysis.
+
+Lets the analyze endpoint return 202 Accepted immediately while a bounded pool
+of asyncio workers runs the slow model calls. Jobs are dequeued round-robin
+across patients so one patient uploading a batch can't starve everyone else.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+from uuid import uuid4
+
+from app.config import (
+    ANALYSIS_QUEUE_MAX_DEPTH,
+    ANALYSIS_QUEUE_MAX_PER_PATIENT,
+    ANALYSIS_QUEUE_WORKERS,
+)
+
+logger = logging.getLogger("app.analysis_jobs")
+
+# Finished jobs kept around for status polling
+JOB_HISTORY_LIMIT = 1000
+
+
+class QueueFullError(Exception):
+    """Raised when a job can't be accepted because the queue is at capacity."""
+
+
+class AnalysisJob:
+    """A single queued unit of work and its outcome."""
+
+    def __init__(self, owner_id: int, fn: Callable[[], Awaitable[Any]], key: Hashable = None, **info: Any):
+        self.id = uuid4().hex
+        self.owner_id = owner_id
+        self.key = key
+        self.fn = fn
+        self.info = info
+        self.status = "queued"  # queued, running, completed, failed
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            **self.info,
+        }
+
+
+class AnalysisJobQueue:
+    """Bounded, per-owner fair job queue drained by a pool of asyncio workers."""
+
+    def __init__(self, workers: int = 4, max_depth: int = 100, max_per_owner: int = 3):
+        self.worker_count = workers
+        self.max_depth = max_depth
+        self.max_per_owner = max_per_owner
+        self.jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._pending: Dict[int, Deque[AnalysisJob]] = {}
+        self._rotation: Deque[int] = deque()
+        self._depth = 0
+        self._running = 0
+        self._available: Optional[asyncio.Semaphore] = None
+        self._workers: list = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _ensure_workers(self) -> None:
+        """Start workers on the running loop (restarting them if the loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._available = asyncio.Semaphore(self._depth)
+        self._workers = [
+            loop.create_task(self._worker(index)) for index in range(self.worker_count)
+        ]
+
+    def active_job(self, key: Hashable) -> Optional[AnalysisJob]:
+        """Return a queued/running job with this key, if any."""
+        for job in reversed(self.jobs.values()):
+            if job.key == key and job.is_active:
+                return job
+        return None
+
+    def check_capacity(self, owner_id: int) -> None:
+        """Raise QueueFullError if a new job for owner_id would be rejected."""
+        if self._depth >= self.max_depth:
+            self.rejected += 1
+            raise QueueFullError("Analysis queue is full. Please try again shortly.")
+        queued_for_owner = len(self._pending.get(owner_id, ()))
+        if queued_for_owner >= self.max_per_owner:
+            self.rejected += 1
+            raise QueueFullError("You already have several analyses queued. Please wait for them to finish.")
+
+    def submit(self, owner_id: int, fn: Callable[[], Awaitable[Any]], key: Hashable = None, **info: Any) -> AnalysisJob:
+        """Enqueue fn() to run on a worker and return the job handle."""
+        self.check_capacity(owner_id)
+        self._ensure_workers()
+
+        job = AnalysisJob(owner_id, fn, key=key, **info)
+        self.jobs[job.id] = job
+        self._trim_history()
+
+        if owner_id not in self._pending:
+            self._pending[owner_id] = deque()
+            self._rotation.append(owner_id)
+        self._pending[owner_id].append(job)
+        self._depth += 1
+        self.submitted += 1
+        self._available.release()
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self.jobs.get(job_id)
+
+    def _next_job(self) -> AnalysisJob:
+        owner_id = self._rotation.popleft()
+        pending = self._pending[owner_id]
+        job = pending.popleft()
+        if pending:
+            self._rotation.append(owner_id)
+        else:
+            del self._pending[owner_id]
+        self._depth -= 1
+        return job
+
+    def _trim_history(self) -> None:
+        while len(self.jobs) > JOB_HISTORY_LIMIT:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if oldest.is_active:
+                break
+            del self.jobs[oldest_id]
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            await self._available.acquire()
+            job = self._next_job()
+            job.status = "running"
+            job.started_at = time.monotonic()
+            wait = job.started_at - job.enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._running += 1
+            try:
+                job.result = await job.fn()
+                job.status = "completed"
+                self.completed += 1
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "cancelled"
+                raise
+            except Exception as exc:  # noqa: BLE001 - recorded on the job
+                logger.exception(
+                    "analysis_jobs.job_failed",
+                    extra={"job_id": job.id, "worker": index, "error_type": type(exc).__name__},
+                )
+                job.status = "failed"
+                job.error = str(exc)
+                self.failed += 1
+            finally:
+                job.fn = None
+                job.finished_at = time.monotonic()
+                self._running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        started = self.completed + self.failed + self._running
+        return {
+            "workers": self.worker_count,
+            "queued": self._depth,
+            "running": self._running,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 2),
+        }
+
+
+analysis_job_queue = AnalysisJobQueue(
+    workers=ANALYSIS_QUEUE_WORKERS,
+    max_depth=ANALYSIS_QUEUE_MAX_DEPTH,
+    max_per_owner=ANALYSIS_QUEUE_MAX_PER_PATIENT,
+)
@@ -0,0 +1,198 @@
+"""
+Analysis service: runs AI analysis for an uploaded image and persists the report.
+
+Shared by the synchronous analyze endpoint and the background job workers.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db import run_db
+from app.models import AnalysisReport, ChatMessage, Image
+from app.services.media_service import resolve_media_path
+from app.services.report_service import apply_analysis_result
+
+logger = logging.getLogger("app.analysis")
+
+PROCESSING_REPORT_JSON = {"status": "processing", "condition": "Analysis in progress"}
+
+
+def build_fallback_result(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the "Analysis Unavailable" payload for a failed AI call so the
+    user can still chat and escalate.
+    """
+    error_code = analysis_result.get('error', 'Unknown error')
+    error_msg = analysis_result.get('message', 'Failed to analyze the image.')
+
+    # Create descriptive fallback based on error code
+    recommendation = "The AI service is currently unavailable. Please escalate this case to a human physician for review."
+    explanation = f"Service Error: {error_msg}. Please try again later or consult a doctor directly."
+
+    if error_code == "TIMEOUT":
+        explanation = "The AI analysis took too long to respond. This can happen with very high-resolution images or high server load."
+    elif error_code == "CIRCUIT_OPEN":
+        explanation = "The AI service is experiencing problems right now, so we skipped the analysis rather than keep you waiting."
+    elif error_code == "API_KEY_MISSING":
+        explanation = "The AI service is not properly configured. Please contact the administrator."
+
+    return {
+        "status": "error",
+        "error_code": error_code,
+        "condition": "Analysis Unavailable",
+        "severity": "Unknown",
+        "confidence": 0,
+        "recommendation": recommendation,
+        "explanation": explanation,
+        "precautions": ["Consult a doctor"],
+        "is_fallback": True
+    }
+
+
+def create_processing_report(db: Session, image: Image, patient_id: int) -> AnalysisReport:
+    """
+    Create a placeholder report for a queued analysis so clients get a
+    report_id (and WebSocket channel) before the AI result is ready.
+    """
+    report = AnalysisReport(
+        image_id=image.id,
+        report_json=dict(PROCESSING_REPORT_JSON),
+        patient_id=patient_id
+    )
+    db.add(report)
+    db.commit()
+    db.refresh(report)
+    return report
+
+
+def discard_processing_report(db: Session, report_id: int) -> None:
+    """Delete a placeholder report that lost the race to queue its analysis."""
+    report = db.get(AnalysisReport, report_id)
+    if report is not None:
+        db.delete(report)
+        db.commit()
+
+
+def store_analysis_failure(db: Session, report_id: int, image_id: int, patient_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Fill a placeholder report with the "Analysis Unavailable" fallback after
+    its job failed unexpectedly. Returns the fallback, or None if the report
+    no longer exists.
+    """
+    db.rollback()
+    report = db.get(AnalysisReport, report_id)
+    if report is None:
+        return None
+    return store_analysis_result(
+        db,
+        image_id,
+        patient_id,
+        {"status": "error", "error": "ANALYSIS_FAILED", "message": "Failed to analyze the image."},
+        report,
+    )
+
+
+async def analyze_and_store(
+    db: Session,
+    image: Image,
+    patient_id: int,
+    ai_service,
+    report: Optional[AnalysisReport] = None,
+) -> Dict[str, Any]:
+    """
+    Run AI analysis for an image and persist the resulting report and seed chat message.
+
+    Args:
+        db: Database session
+        image: Image to analyze
+        patient_id: Owner of the report
+        ai_service: GeminiService (or mock) used for the analysis
+        report: Existing placeholder report to fill in, if any
+
+    Returns:
+        Analysis result (or fallback) including report tracking fields
+    """
+    # Resolve image path on disk
+    image_path = str(resolve_media_path(image.image_url))
+    image_id = image.id
+
+    # Perform AI analysis
+    analysis_result = await ai_service.analyze_skin_lesion(image_path)
+
+    return await run_db(db, store_analysis_result, image_id, patient_id, analysis_result, report)
+
+
+def store_analysis_result(
+    db: Session,
+    image_id: int,
+    patient_id: int,
+    analysis_result: Dict[str, Any],
+    report: Optional[AnalysisReport] = None,
+) -> Dict[str, Any]:
+    """
+    Persist an analysis result (or its fallback) and the seed chat message.
+    Blocking; async callers go through analyze_and_store.
+    """
+    if report is None:
+        report = AnalysisReport(image_id=image_id, patient_id=patient_id)
+        db.add(report)
+
+    if analysis_result["status"] == "error":
+        logger.warning(
+            "analysis.gemini_error",
+            extra={
+                "error_code": analysis_result.get('error', 'Unknown error'),
+                "error_msg": analysis_result.get('message', 'Failed to analyze the image.'),
+            },
+        )
+
+        # Create fallback result so user flow isn't blocked
+        fallback_result = build_fallback_result(analysis_result)
+
+        # We continue to save this as a valid (but error-state) report
+        # This allows the user to still use the chat and escalate features
+        apply_analysis_result(report, fallback_result)
+        db.commit()
+        db.refresh(report)
+
+        # Add a system message to the chat explaining the situation
+        system_msg = ChatMessage(
+            report_id=report.id,
+            sender_role="system",
+            message=f"⚠️ Analysis Unavailable: {fallback_result['explanation']}\n\nYou can still discuss this with our team or escalate it for human review."
+        )
+        db.add(system_msg)
+        db.commit()
+
+        # Add return fields
+        fallback_result["report_id"] = report.id
+        fallback_result["image_id"] = image_id
+        fallback_result["review_status"] = report.review_status
+        fallback_result["doctor_active"] = report.doctor_active
+
+        return fallback_result
+
+    # Save analysis results to database
+    apply_analysis_result(report, analysis_result)
+    db.commit()
+    db.refresh(report)
+
+    # Add report ID and tracking to response
+    analysis_result["report_id"] = report.id
+    analysis_result["image_id"] = image_id
+    analysis_result["review_status"] = report.review_status
+    analysis_result["doctor_active"] = report.doctor_active
+
+    # --- PHASE 4: Seed initial AI message ---
+    msg_text = f"Hello! I've analyzed your image. Based on the scan, I detect signs of {analysis_result.get('condition', 'Unknown')}. My confidence is {int(analysis_result.get('confidence', 0)) or 0}%. {analysis_result.get('recommendation', '')}"
+
+    first_msg = ChatMessage(
+        report_id=report.id,
+        sender_role="ai",
+        message=msg_text
+    )
+    db.add(first_msg)
+    db.commit()
+
+    return analysis_result
@@ -0,0 +1,98 @@
+"""
+Bounded chat context for AI replies.
+
+Only the most recent CHAT_HISTORY_MAX_TURNS messages are sent to the model
+verbatim. Older messages are folded into a rolling summary that is stored on
+the report (chat_summary / chat_summary_upto_id), so each turn only reads and
+folds messages added since the previous turn instead of the whole conversation.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import CHAT_HISTORY_MAX_TURNS, CHAT_HISTORY_TOKEN_BUDGET
+from app.models import AnalysisReport, ChatMessage
+
+# Longest excerpt of a single message kept in the summary
+SUMMARY_LINE_CHARS = 160
+
+
+def role_label(sender_role: str) -> str:
+    """Map sender roles to clear labels for the AI."""
+    if sender_role == "patient":
+        return "Patient"
+    if sender_role == "doctor":
+        return "Doctor (Human)"
+    return "AI Assistant"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def summarize_message(msg) -> str:
+    """Condense one message into a single summary line (first sentence, truncated)."""
+    text = " ".join(msg.message.split())
+    first_sentence = text.split(". ", 1)[0]
+    if len(first_sentence) > SUMMARY_LINE_CHARS:
+        first_sentence = first_sentence[:SUMMARY_LINE_CHARS - 3].rstrip() + "..."
+    return f"{role_label(msg.sender_role)}: {first_sentence}"
+
+
+def fold_history(
+    summary: Optional[str],
+    messages: Sequence,
+    max_turns: int = CHAT_HISTORY_MAX_TURNS,
+    token_budget: int = CHAT_HISTORY_TOKEN_BUDGET,
+) -> Tuple[Optional[str], List, int]:
+    """
+    Split messages into a rolling summary and a verbatim recent window.
+
+    Messages beyond the last max_turns (or that would push summary + window
+    over token_budget) are appended to the summary. The summary itself is
+    capped at a quarter of the budget by dropping its oldest lines.
+
+    Returns:
+        (summary, recent messages, number of leading messages folded)
+    """
+    lines = summary.splitlines() if summary else []
+    recent = list(messages)
+    summary_budget = token_budget // 4
+
+    def tokens(items) -> int:
+        return sum(estimate_tokens(item) for item in items)
+
+    def fold(count: int) -> None:
+        lines.extend(summarize_message(m) for m in recent[:count])
+        del recent[:count]
+        while lines and tokens(lines) > summary_budget:
+            lines.pop(0)
+
+    fold(max(0, len(recent) - max_turns))
+    while len(recent) > 1 and tokens(lines) + tokens(m.message for m in recent) > token_budget:
+        fold(1)
+
+    folded = len(messages) - len(recent)
+    return ("\n".join(lines) or None), recent, folded
+
+
+def load_chat_context(db: Session, report: AnalysisReport) -> Tuple[Optional[str], List[ChatMessage]]:
+    """
+    Load the AI context for a report: its rolling summary and recent messages.
+
+    Only messages newer than the stored summary cursor are read. Newly folded
+    messages update report.chat_summary in the session; the caller commits.
+    """
+    query = db.query(ChatMessage).filter(ChatMessage.report_id == report.id)
+    if report.chat_summary_upto_id is not None:
+        query = query.filter(ChatMessage.id > report.chat_summary_upto_id)
+    messages = query.order_by(ChatMessage.id).all()
+
+    summary, recent, folded = fold_history(
+        report.chat_summary, messages, CHAT_HISTORY_MAX_TURNS, CHAT_HISTORY_TOKEN_BUDGET
+    )
+    if folded:
+        report.chat_summary = summary
+        report.chat_summary_upto_id = messages[folded - 1].id
+    return summary, recent
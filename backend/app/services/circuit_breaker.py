@@ -0,0 +1,193 @@
+"""
+Circuit breaker for the upstream AI provider.
+
+When too many recent calls fail or are slow, the breaker opens and callers
+fail fast with CircuitOpenError instead of each waiting out the full
+AI_TIMEOUT_SECONDS. After a cool-down it lets a probe call through
+(half-open) and closes again once the provider answers normally.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple, Type
+
+from app.config import (
+    AI_BREAKER_FAILURE_RATE,
+    AI_BREAKER_MIN_CALLS,
+    AI_BREAKER_OPEN_SECONDS,
+    AI_BREAKER_SLOW_CALL_SECONDS,
+    AI_BREAKER_WINDOW,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+
+class BreakerCall:
+    """Handle yielded by CircuitBreaker.guard for timing the upstream call."""
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        self._breaker = breaker
+        self.started = time.monotonic()
+        self.settled = False
+
+    def start_clock(self) -> None:
+        """Measure latency from now, e.g. once a local admission slot is held."""
+        self.started = time.monotonic()
+
+    def responded(self) -> None:
+        """
+        Record success at the first response (time to first chunk), so a
+        long but healthy stream is not counted as a slow call. Later
+        errors in the same call are not counted.
+        """
+        if not self.settled:
+            self.settled = True
+            self._breaker.record_success(time.monotonic() - self.started)
+
+
+class CircuitBreaker:
+    """Rolling-window breaker counting errors and slow calls as failures."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 5,
+        window_size: int = 20,
+        slow_call_seconds: float = 20,
+        open_seconds: float = 30,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)  # True = failed/slow
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+        self.times_opened += 1
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._opened_at = None
+        self._half_open_calls = 0
+        self._outcomes.clear()
+
+    def allow_request(self) -> bool:
+        """Return True if a call may proceed, reserving a probe slot when half-open."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._half_open_calls = 0
+
+        if self.state == HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                return False
+            self._half_open_calls += 1
+
+        return True
+
+    def record_success(self, duration: float) -> None:
+        if duration >= self.slow_call_seconds:
+            self.record_failure()
+            return
+        if self.state == HALF_OPEN:
+            self._close()
+            return
+        self._outcomes.append(False)
+
+    def record_failure(self) -> None:
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(True)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and self._failure_rate() >= self.failure_rate_threshold
+        ):
+            self._open()
+
+    def release(self) -> None:
+        """Give back a probe slot for a call that never reached the provider."""
+        if self.state == HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    @asynccontextmanager
+    async def guard(self, ignore: Tuple[Type[BaseException], ...] = ()) -> AsyncIterator[BreakerCall]:
+        """
+        Run one upstream call under the breaker. Raises CircuitOpenError
+        immediately while open; exceptions listed in ignore are not counted.
+        The slow-call clock starts on entry, or at call.start_clock(); a
+        stream calls call.responded() when its first chunk arrives.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"AI provider circuit '{self.name}' is open")
+
+        call = BreakerCall(self)
+        try:
+            yield call
+        except (asyncio.CancelledError, *ignore):
+            if not call.settled:
+                self.release()
+            raise
+        except BaseException:
+            if not call.settled:
+                self.record_failure()
+            raise
+        if not call.settled:
+            self.record_success(time.monotonic() - call.started)
+
+    def reset(self) -> None:
+        """Utility for tests to reset state."""
+        self._close()
+        self.rejected = 0
+        self.times_opened = 0
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 2)
+        return {
+            "state": self.state,
+            "failure_rate": round(self._failure_rate(), 3),
+            "window_calls": len(self._outcomes),
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+            "retry_in_seconds": retry_in,
+        }
+
+
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_rate_threshold=AI_BREAKER_FAILURE_RATE,
+    min_calls=AI_BREAKER_MIN_CALLS,
+    window_size=AI_BREAKER_WINDOW,
+    slow_call_seconds=AI_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=AI_BREAKER_OPEN_SECONDS,
+)
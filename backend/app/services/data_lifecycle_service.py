@@ -8,7 +8,7 @@ Provides safe file operations with path traversal protection.
 import logging
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 from sqlalchemy.orm import Session
 
@@ -18,6 +18,7 @@ from app.config import (
     CHAT_RETENTION_DAYS,
     ANALYSIS_RETENTION_DAYS,
 )
+from app.services.image_preprocessing import derivatives_of
 from app.models import (
     User,
     Image,
@@ -57,19 +58,49 @@ def _is_safe_path(base: Path, target: Path) -> bool:
         return False
 
 
-def safe_delete_file(relative_path: str) -> bool:
+def media_reference_count(
+    db: Session,
+    relative_path: str,
+    exclude_image_ids: Iterable[int] = (),
+) -> int:
+    """
+    Count Image rows pointing at a media file. Content-addressed blobs are
+    shared between identical uploads, so a file is only garbage once no
+    image (other than those being deleted) references it.
+    """
+    query = db.query(Image).filter(Image.image_url == relative_path)
+    exclude_image_ids = list(exclude_image_ids)
+    if exclude_image_ids:
+        query = query.filter(Image.id.notin_(exclude_image_ids))
+    return query.count()
+
+
+def safe_delete_file(
+    relative_path: str,
+    db: Optional[Session] = None,
+    exclude_image_ids: Iterable[int] = (),
+) -> bool:
     """
     Safely delete a media file with path traversal protection.
     
     Args:
         relative_path: Path relative to MEDIA_ROOT
+        db: When given, the file is kept if any other Image row still references it
+        exclude_image_ids: Image rows being deleted alongside the file
         
     Returns:
-        True if file was deleted, False if file didn't exist or was blocked
+        True if file was deleted, False if file didn't exist, was blocked or is still referenced
     """
     if not relative_path:
         return False
         
+    if db is not None and media_reference_count(db, relative_path, exclude_image_ids):
+        logger.info(
+            "Media file still referenced, keeping",
+            extra={"path": relative_path}
+        )
+        return False
+    
     target_path = MEDIA_ROOT / relative_path
     
     # Security check: ensure we're not deleting outside MEDIA_ROOT
@@ -84,6 +115,8 @@ def safe_delete_file(relative_path: str) -> bool:
         resolved_path = target_path.resolve()
         if resolved_path.exists() and resolved_path.is_file():
             resolved_path.unlink()
+            for derivative in derivatives_of(resolved_path):
+                derivative.unlink(missing_ok=True)
             logger.info(
                 "Media file deleted",
                 extra={"path": relative_path}
@@ -111,27 +144,44 @@ def delete_patient_media(db: Session, patient_id: int) -> Dict[str, int]:
         db: Database session
         patient_id: ID of the patient
         
+    Files whose content is shared with another patient's image are kept.
+    
     Returns:
-        Dict with counts of deleted and failed deletions
+        Dict with counts of deleted, failed and shared (kept) files
     """
-    images = db.query(Image).filter(Image.patient_id == patient_id).all()
+    paths = {
+        image_url
+        for (image_url,) in db.query(Image.image_url).filter(Image.patient_id == patient_id)
+        if image_url
+    }
+    # One query for every blob another patient still points at
+    shared_paths = {
+        image_url
+        for (image_url,) in db.query(Image.image_url)
+        .filter(Image.image_url.in_(paths), Image.patient_id != patient_id)
+        .distinct()
+    } if paths else set()
     
     deleted = 0
     failed = 0
     
-    for image in images:
-        if image.image_url:
-            if safe_delete_file(image.image_url):
-                deleted += 1
-            else:
-                failed += 1
+    for path in sorted(paths - shared_paths):
+        if safe_delete_file(path):
+            deleted += 1
+        else:
+            failed += 1
     
     logger.info(
         "Patient media deletion complete",
-        extra={"patient_id": patient_id, "deleted": deleted, "failed": failed}
+        extra={
+            "patient_id": patient_id,
+            "deleted": deleted,
+            "failed": failed,
+            "shared": len(shared_paths),
+        }
     )
     
-    return {"deleted": deleted, "failed": failed}
+    return {"deleted": deleted, "failed": failed, "shared": len(shared_paths)}
 
 
 def anonymize_patient_reports(db: Session, patient_id: int) -> int:
@@ -389,8 +439,12 @@ def cleanup_expired_data(db: Session) -> Dict[str, int]:
             Image.uploaded_at < media_cutoff
         ).all()
         
+        # Rows in this batch are all going, so none of them keeps a shared blob alive
+        batch_ids = [image.id for image in images]
         for image in images:
-            if image.image_url and safe_delete_file(image.image_url):
+            if image.image_url and safe_delete_file(
+                image.image_url, db=db, exclude_image_ids=batch_ids
+            ):
                 result["media_files_deleted"] += 1
             db.delete(image)
             result["images_deleted"] += 1
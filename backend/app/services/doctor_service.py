@@ -4,6 +4,7 @@ from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.models import AnalysisReport, DoctorChangeLog, DoctorProfile, PatientDoctorLink, User
+from app.services.pagination import PageParams, paginate
 
 DEFAULT_AVATAR_URL = "https://placehold.co/128x128?text=Dr"
 DEFAULT_CLINIC_NAME = "Clinic not provided"
@@ -97,13 +98,23 @@ def get_patient_doctor(db: Session, patient_id: int) -> Dict[str, object]:
     return {"doctor": _doctor_response(doctor, profile), "status": link.status}
 
 
-def get_doctor_patients(db: Session, doctor_id: int) -> List[Dict[str, object]]:
-    """Return all patients linked to the doctor."""
-    links = (
+def get_doctor_patients(
+    db: Session, doctor_id: int, page: Optional[PageParams] = None
+) -> Tuple[List[Dict[str, object]], Optional[str]]:
+    """
+    Return patients linked to the doctor, ordered by signup, and the next
+    page cursor. Without a page (or in legacy mode) all patients are returned.
+
+    Pages on User.id alone: users.created_at is a server default with only
+    second precision on SQLite, so it cannot be compared reliably in a cursor.
+    """
+    links, next_cursor = paginate(
         db.query(PatientDoctorLink, User)
         .join(User, PatientDoctorLink.patient_id == User.id)
-        .filter(PatientDoctorLink.doctor_id == doctor_id)
-        .all()
+        .filter(PatientDoctorLink.doctor_id == doctor_id),
+        page or PageParams(limit=None, cursor=None),
+        None, User.id,
+        key=lambda row: row[1],
     )
 
     results = []
@@ -115,7 +126,7 @@ def get_doctor_patients(db: Session, doctor_id: int) -> List[Dict[str, object]]:
             "status": link.status,
             "linked_at": "2023-01-01" # Placeholder or add created_at to Link model if needed
         })
-    return results
+    return results, next_cursor
 
 
 def has_active_case(db: Session, patient_id: int) -> bool:
@@ -3,12 +3,44 @@ import base64
 import logging
 from pathlib import Path
 import google.generativeai as genai
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, Optional
 import asyncio
+import copy
+from fastapi.concurrency import run_in_threadpool
 from app.config import AI_TIMEOUT_SECONDS
+from app.services.ai_admission import AdmissionTimeout, analysis_admission, chat_admission
+from app.services.chat_context import fold_history, role_label
+from app.services.circuit_breaker import CircuitOpenError, gemini_breaker
+from app.services.analysis_cache import analysis_cache, analysis_digest
+from app.services.image_preprocessing import prepare_analysis_image
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger("app.gemini")
 
+MODEL_NAME = "gemini-2.5-flash"
+PARSE_ERROR_CONDITION = "Error parsing result"
+CHAT_UNAVAILABLE_REPLY = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+
+# Part of the analysis cache key: editing the prompt invalidates cached results.
+ANALYSIS_PROMPT = """
+            You are a dermatology AI assistant. Analyze this skin lesion image and provide the output in strict JSON format.
+            Do not include markdown code blocks (like ```json ... ```) in the response, just the raw JSON string.
+            
+            The JSON object must have the following structure:
+            {
+                "condition": "Name of the condition (or 'Unknown' if unclear)",
+                "confidence": 0.0 to 100.0 (float representing confidence percentage),
+                "severity": "Low", "Moderate", or "High",
+                "characteristics": ["feature 1", "feature 2", "feature 3"],
+                "recommendation": "Brief recommendation (e.g., 'See a dermatologist soon')",
+                "disclaimer": "This is NOT a diagnosis. Professional medical evaluation is required."
+            }
+            
+            Analyze the image carefully before generating the JSON.
+            """
+
+_analysis_flight = SingleFlight()
+
 class GeminiService:
     """Service for AI-powered skin lesion analysis using Google Gemini"""
     
@@ -21,7 +53,7 @@ class GeminiService:
         
         if self.api_key:
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
+            self.model = genai.GenerativeModel(MODEL_NAME)
             self.is_ready = True
         elif is_mock:
             # In mock mode, we don't need the real API key
@@ -50,57 +82,23 @@ class GeminiService:
                     "message": "AI analysis is currently unavailable (API key not configured)."
                 }
 
-            # Read the image file
+            # Send the downscaled, EXIF-stripped derivative (encoded once, then cached on disk)
+            image_path = await run_in_threadpool(prepare_analysis_image, image_path)
             with open(image_path, 'rb') as img_file:
                 image_data = img_file.read()
             
-            # Create the prompt for skin lesion analysis
-            prompt = """
-            You are a dermatology AI assistant. Analyze this skin lesion image and provide the output in strict JSON format.
-            Do not include markdown code blocks (like ```json ... ```) in the response, just the raw JSON string.
-            
-            The JSON object must have the following structure:
-            {
-                "condition": "Name of the condition (or 'Unknown' if unclear)",
-                "confidence": 0.0 to 100.0 (float representing confidence percentage),
-                "severity": "Low", "Moderate", or "High",
-                "characteristics": ["feature 1", "feature 2", "feature 3"],
-                "recommendation": "Brief recommendation (e.g., 'See a dermatologist soon')",
-                "disclaimer": "This is NOT a diagnosis. Professional medical evaluation is required."
-            }
-            
-            Analyze the image carefully before generating the JSON.
-            """
-            
-            # Upload the image to Gemini
-            image_parts = [
-                {
-                    "mime_type": self._get_mime_type(image_path),
-                    "data": image_data
-                }
-            ]
-            
-            # Generate analysis with timeout
-            try:
-                response = await asyncio.wait_for(
-                    self.model.generate_content_async([prompt, image_parts[0]]),
-                    timeout=AI_TIMEOUT_SECONDS
-                )
-            except asyncio.TimeoutError:
-                return {
-                    "status": "error",
-                    "error": "TIMEOUT",
-                    "message": f"AI analysis timed out after {AI_TIMEOUT_SECONDS} seconds."
-                }
+            digest = analysis_digest(image_data, MODEL_NAME, ANALYSIS_PROMPT)
+            cached = analysis_cache.get(digest)
+            if cached is not None:
+                logger.info("gemini.analysis_cache_hit", extra={"digest": digest[:12]})
+                return cached
             
-            # Parse and structure the response
-            analysis_data = self._parse_json_response(response.text)
-            
-            return {
-                "status": "success",
-                "analysis": analysis_data, 
-                **analysis_data
-            }
+            # Concurrent requests for the same image share one model call
+            result = await _analysis_flight.do(
+                digest,
+                lambda: self._generate_analysis(image_path, image_data, digest),
+            )
+            return copy.deepcopy(result)
             
         except Exception as e:
             logger.exception(
@@ -116,29 +114,154 @@ class GeminiService:
                 "message": "Failed to analyze the image. Please try again or consult a healthcare professional."
             }
 
-    async def chat_about_lesion(self, analysis_context: Dict[str, Any], user_message: str, history: list = None) -> str:
+    async def _generate_analysis(self, image_path: str, image_data: bytes, digest: str) -> Dict[str, Any]:
+        """Call the model for an image that missed the cache and cache the result."""
+        # Upload the image to Gemini
+        image_parts = [
+            {
+                "mime_type": self._get_mime_type(image_path),
+                "data": image_data
+            }
+        ]
+        
+        # Generate analysis with timeout, once admitted under the analysis budget.
+        # The breaker fails fast while the provider is degraded.
+        try:
+            async with gemini_breaker.guard(ignore=(AdmissionTimeout,)) as call:
+                async with analysis_admission.slot():
+                    call.start_clock()  # Time queued for a local slot is not provider latency
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async([ANALYSIS_PROMPT, image_parts[0]]),
+                        timeout=AI_TIMEOUT_SECONDS
+                    )
+        except CircuitOpenError:
+            return {
+                "status": "error",
+                "error": "CIRCUIT_OPEN",
+                "message": "AI service is temporarily unavailable."
+            }
+        except AdmissionTimeout as exc:
+            return {
+                "status": "error",
+                "error": "TIMEOUT",
+                "message": f"AI service is busy. {exc}"
+            }
+        except asyncio.TimeoutError:
+            return {
+                "status": "error",
+                "error": "TIMEOUT",
+                "message": f"AI analysis timed out after {AI_TIMEOUT_SECONDS} seconds."
+            }
+        
+        # Parse and structure the response
+        analysis_data = self._parse_json_response(response.text)
+        
+        result = {
+            "status": "success",
+            "analysis": analysis_data, 
+            **analysis_data
+        }
+        # Don't pin an unparseable reply in the cache; a retry may succeed.
+        if analysis_data.get("condition") != PARSE_ERROR_CONDITION:
+            analysis_cache.set(digest, result)
+        return result
+
+    async def chat_about_lesion(
+        self,
+        analysis_context: Dict[str, Any],
+        user_message: str,
+        history: list = None,
+        summary: Optional[str] = None,
+    ) -> str:
         """
         Chat with the AI about a specific lesion analysis.
         
         Args:
             analysis_context: The structured analysis result from a previous run
             user_message: The user's question or comment
-            history: Optional list of ChatMessage objects for history
+            history: Optional list of recent ChatMessage objects for history
+            summary: Optional rolling summary of older messages
             
         Returns:
             String response from the AI
         """
         try:
-            # Construct history string
-            history_str = ""
-            if history:
-                for msg in history:
-                    # Map sender roles to clear labels for the AI
-                    role_label = "Patient" if msg.sender_role == "patient" else "AI Assistant"
-                    if msg.sender_role == "doctor": role_label = "Doctor (Human)"
-                    history_str += f"{role_label}: {msg.message}\n"
-
-            context_prompt = f"""
+            context_prompt = self._build_chat_prompt(analysis_context, user_message, history, summary)
+            
+            async with gemini_breaker.guard(ignore=(AdmissionTimeout,)) as call:
+                async with chat_admission.slot():
+                    call.start_clock()
+                    response = await self.model.generate_content_async(context_prompt)
+            return response.text
+        except CircuitOpenError:
+            return CHAT_UNAVAILABLE_REPLY
+        except Exception as e:
+            logger.exception(
+                "gemini.chat_failed",
+                extra={
+                    "error_type": type(e).__name__,
+                    "history_count": len(history or []),
+                },
+            )
+            return CHAT_UNAVAILABLE_REPLY
+
+    async def stream_chat_about_lesion(
+        self,
+        analysis_context: Dict[str, Any],
+        user_message: str,
+        history: list = None,
+        summary: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of chat_about_lesion that yields reply text chunks
+        as Gemini produces them.
+        
+        On failure before any text was produced, yields the usual apology
+        reply instead; a failure mid-stream just ends the stream.
+        """
+        produced = False
+        try:
+            context_prompt = self._build_chat_prompt(analysis_context, user_message, history, summary)
+            
+            async with gemini_breaker.guard(ignore=(AdmissionTimeout, GeneratorExit)) as call:
+                async with chat_admission.slot():
+                    call.start_clock()
+                    response = await self.model.generate_content_async(context_prompt, stream=True)
+                    async for chunk in response:
+                        call.responded()  # Judge latency by time to first chunk, not stream length
+                        if chunk.text:
+                            produced = True
+                            yield chunk.text
+        except CircuitOpenError:
+            if not produced:
+                yield CHAT_UNAVAILABLE_REPLY
+        except Exception as e:
+            logger.exception(
+                "gemini.chat_stream_failed",
+                extra={
+                    "error_type": type(e).__name__,
+                    "history_count": len(history or []),
+                    "partial": produced,
+                },
+            )
+            if not produced:
+                yield CHAT_UNAVAILABLE_REPLY
+
+    def _build_chat_prompt(
+        self,
+        analysis_context: Dict[str, Any],
+        user_message: str,
+        history: list = None,
+        summary: Optional[str] = None,
+    ) -> str:
+        """Build the chat prompt from the analysis context, conversation summary and recent messages."""
+        # Callers normally pass an already-bounded window; fold again so a raw
+        # history can never blow past the token budget.
+        summary, recent, _ = fold_history(summary, history or [])
+        history_str = "".join(f"{role_label(msg.sender_role)}: {msg.message}\n" for msg in recent)
+        summary_str = f"Summary of earlier conversation:\n{summary}\n" if summary else ""
+
+        return f"""
             You are a helpful medical AI assistant. You are discussing a specific skin lesion analysis with a user.
             
             Here is the analysis of the lesion in question:
@@ -148,6 +271,7 @@ class GeminiService:
             Characteristics: {', '.join(analysis_context.get('characteristics', []))}
             Recommendation: {analysis_context.get('recommendation', 'N/A')}
             
+            {summary_str}
             Previous Conversation:
             {history_str}
             
@@ -157,18 +281,6 @@ class GeminiService:
             Be helpful, empathetic, but always remind them that you are an AI and this is not a professional diagnosis if they ask for medical advice.
             Keep your answers concise and relevant to the context. Do not use markdown.
             """
-            
-            response = await self.model.generate_content_async(context_prompt)
-            return response.text
-        except Exception as e:
-            logger.exception(
-                "gemini.chat_failed",
-                extra={
-                    "error_type": type(e).__name__,
-                    "history_count": len(history or []),
-                },
-            )
-            return "I apologize, but I'm having trouble processing your request right now. Please try again later."
 
     def _parse_json_response(self, text: str) -> Dict[str, Any]:
         """
@@ -195,7 +307,7 @@ class GeminiService:
             )
             # Fallback to a basic structure if parsing fails
             return {
-                "condition": "Error parsing result",
+                "condition": PARSE_ERROR_CONDITION,
                 "confidence": 0.0,
                 "severity": "Unknown",
                 "characteristics": ["Analysis available but format was invalid"],
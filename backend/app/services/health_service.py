@@ -7,6 +7,10 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.config import DATABASE_URL, GOOGLE_API_KEY, SECRET_KEY
+from app.db import engine, pool_metrics
+from app.services.ai_admission import analysis_admission, chat_admission
+from app.services.analysis_jobs import analysis_job_queue
+from app.services.circuit_breaker import gemini_breaker
 
 logger = logging.getLogger("app.health")
 
@@ -43,6 +47,13 @@ def get_health_response(db: Session) -> Tuple[Dict[str, Any], int]:
             "env": env_checks,
         },
         "mock_ai": mock_ai,
+        "db_pool": pool_metrics.stats(engine.pool),
+        "ai_circuit": gemini_breaker.stats(),
+        "analysis_queue": analysis_job_queue.stats(),
+        "ai_admission": {
+            "analysis": analysis_admission.stats(),
+            "chat": chat_admission.stats(),
+        },
     }
     http_status = (
         status.HTTP_200_OK
@@ -0,0 +1,142 @@
+"""
+Image derivatives: the AI analysis copy and display renditions.
+
+Phone photos are often several megabytes at full resolution, far more than
+the model or a thumbnail needs. Derivatives are EXIF-stripped, rotated
+upright, downscaled and re-encoded once, then cached next to the original as
+<stem>.<kind><edge>.<format> (e.g. <sha>.ai1536.webp, <sha>.thumb160.webp).
+
+- The analysis copy (AI_IMAGE_MAX_EDGE) is encoded at upload time.
+- Renditions (MEDIA_RENDITION_SIZES) are encoded on first request.
+
+Pillow is optional: without it, originals are used unchanged.
+"""
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import (
+    AI_IMAGE_FORMAT,
+    AI_IMAGE_MAX_EDGE,
+    AI_IMAGE_QUALITY,
+    MEDIA_RENDITION_FORMAT,
+    MEDIA_RENDITION_QUALITY,
+    MEDIA_RENDITION_SIZES,
+)
+
+try:
+    from PIL import Image as PILImage, ImageOps
+except ImportError:  # pragma: no cover - depends on the environment
+    PILImage = None
+    ImageOps = None
+
+logger = logging.getLogger("app.media")
+
+ANALYSIS_KIND = "ai"
+_PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "jpg": "JPEG"}
+
+
+def derivative_path(
+    original: Path,
+    max_edge: int = AI_IMAGE_MAX_EDGE,
+    image_format: str = AI_IMAGE_FORMAT,
+    kind: str = ANALYSIS_KIND,
+) -> Path:
+    """Where a derivative of original lives; the edge is in the name so config changes re-derive."""
+    return original.with_name(f"{original.stem}.{kind}{max_edge}.{image_format}")
+
+
+def derivatives_of(original: Path) -> List[Path]:
+    """Existing derivatives of original, for removal alongside it."""
+    # Originals are <stem>.<ext>; only derivatives carry a second dotted part
+    return [path for path in original.parent.glob(f"{original.stem}.*.*") if path != original]
+
+
+def _encode_derivative(original: Path, target: Path, max_edge: int, image_format: str, quality: int) -> None:
+    with PILImage.open(original) as image:
+        image = ImageOps.exif_transpose(image)  # Applies the orientation tag, drops the rest of EXIF
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), PILImage.Resampling.LANCZOS)
+
+        # Encode beside the target, then rename, so readers never see a partial file
+        fd, raw_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as destination:
+                image.save(destination, format=_PIL_FORMATS[image_format], quality=quality)
+            os.replace(raw_path, target)
+        except BaseException:
+            Path(raw_path).unlink(missing_ok=True)
+            raise
+
+
+def _ensure_derivative(
+    original: Path,
+    max_edge: int,
+    image_format: str,
+    quality: int,
+    kind: str,
+) -> Optional[Path]:
+    """The cached derivative, encoding it if needed; None if it cannot be produced."""
+    if max_edge <= 0 or image_format not in _PIL_FORMATS:
+        return None
+
+    target = derivative_path(original, max_edge, image_format, kind)
+    if target.exists():
+        return target
+    if PILImage is None or not original.exists():
+        return None
+
+    try:
+        _encode_derivative(original, target, max_edge, image_format, quality)
+    except Exception:  # noqa: BLE001 - callers fall back to the original
+        logger.warning(
+            "media.derivative_failed",
+            extra={"image_file": original.name, "kind": kind},
+            exc_info=True,
+        )
+        return None
+
+    logger.info(
+        "media.derivative_created",
+        extra={
+            "image_file": original.name,
+            "kind": kind,
+            "original_bytes": original.stat().st_size,
+            "derivative_bytes": target.stat().st_size,
+        },
+    )
+    return target
+
+
+def prepare_analysis_image(
+    image_path: str,
+    max_edge: int = AI_IMAGE_MAX_EDGE,
+    image_format: str = AI_IMAGE_FORMAT,
+    quality: int = AI_IMAGE_QUALITY,
+) -> str:
+    """
+    Return the path of the image to send for analysis: the cached derivative,
+    a freshly encoded one, or the original if preprocessing is disabled,
+    unavailable or fails. Blocking; async callers use run_in_threadpool.
+    """
+    derivative = _ensure_derivative(Path(image_path), max_edge, image_format, quality, ANALYSIS_KIND)
+    return str(derivative) if derivative else image_path
+
+
+def media_rendition(original: Path, size: str) -> Path:
+    """
+    Return the display rendition of original for a MEDIA_RENDITION_SIZES
+    key, encoding it on first use. Falls back to the original if it cannot
+    be produced. Blocking.
+    """
+    derivative = _ensure_derivative(
+        original,
+        MEDIA_RENDITION_SIZES[size],
+        MEDIA_RENDITION_FORMAT,
+        MEDIA_RENDITION_QUALITY,
+        kind=size,
+    )
+    return derivative or original
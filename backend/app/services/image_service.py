@@ -1,46 +1,199 @@
 from uuid import uuid4
 from pathlib import Path
+from typing import BinaryIO, List, Optional
+import hashlib
 import logging
+import mimetypes
+import os
+import tempfile
 
-from fastapi import HTTPException, status
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.config import MEDIA_ROOT
+from app.config import ALLOWED_IMAGE_TYPES, MAX_UPLOAD_SIZE_MB, MEDIA_ROOT
 from app.models import Image, PatientDoctorLink
+from app.services.image_preprocessing import prepare_analysis_image
 
 logger = logging.getLogger("app.media")
 
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Staging lives under MEDIA_ROOT so the final rename never crosses filesystems
+UPLOAD_STAGING_DIR = MEDIA_ROOT / ".staging"
+# Patient images are content-addressed: blobs/<aa>/<bb>/<sha256><ext>
+MEDIA_BLOB_DIR = "blobs"
 
-def _write_media_file(file_bytes: bytes, subdir: str = "uploads") -> str:
+_MAGIC_EXTENSIONS = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+)
+_CONTENT_TYPE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+}
+
+
+class StagedUpload:
+    """An upload streamed to a temporary file under MEDIA_ROOT, with its size and SHA-256."""
+
+    def __init__(self, path: Path, size: int, sha256: str, head: bytes = b"", content_type: Optional[str] = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.head = head  # First bytes, for format detection
+        self.content_type = content_type
+
+    @property
+    def extension(self) -> str:
+        return detect_image_extension(self.head, self.content_type)
+
+    def discard(self) -> None:
+        """Remove the staged file if it was not moved into place."""
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError:
+            logger.warning("media.staging_cleanup_failed", extra={"path": str(self.path)})
+
+
+def _upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"File too large. Maximum allowed is {MAX_UPLOAD_SIZE_MB}MB.",
+    )
+
+
+def detect_image_extension(head: bytes, content_type: Optional[str] = None) -> str:
+    """File extension from the image's magic bytes, falling back to the declared type."""
+    for magic, extension in _MAGIC_EXTENSIONS:
+        if head.startswith(magic):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return _CONTENT_TYPE_EXTENSIONS.get(content_type, ".bin")
+
+
+def content_address(sha256: str, extension: str) -> str:
+    """Relative media path of the blob with this digest, sharded two levels deep."""
+    return f"{MEDIA_BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def _stage_stream(source: BinaryIO, max_bytes: Optional[int], chunk_size: int = UPLOAD_CHUNK_SIZE) -> StagedUpload:
     """
-    Persist uploaded bytes to the media directory and return a relative path.
+    Copy source to a staging file chunk by chunk, hashing as it goes and
+    aborting as soon as more than max_bytes (if given) have been read.
     """
-    file_name = f"{uuid4().hex}.png"
-    relative_path = Path(subdir) / file_name
+    UPLOAD_STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    fd, raw_path = tempfile.mkstemp(dir=UPLOAD_STAGING_DIR, suffix=".part")
+    staged = StagedUpload(Path(raw_path), 0, "")
+    try:
+        with os.fdopen(fd, "wb") as destination:
+            while chunk := source.read(chunk_size):
+                if not size:
+                    staged.head = chunk[:16]
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise _upload_too_large()
+                hasher.update(chunk)
+                destination.write(chunk)
+    except HTTPException:
+        staged.discard()
+        raise
+    except OSError as exc:
+        staged.discard()
+        logger.exception("media.staging_failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to store uploaded image",
+        ) from exc
+
+    staged.size = size
+    staged.sha256 = hasher.hexdigest()
+    return staged
+
+
+async def stage_upload(
+    file: UploadFile,
+    max_bytes: int = MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+    allowed_types: List[str] = ALLOWED_IMAGE_TYPES,
+) -> StagedUpload:
+    """
+    Validate an upload's type and stream it to a staging file off the event
+    loop. Peak memory is one chunk; callers must move or discard the result.
+    """
+    if file.content_type not in allowed_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type: {file.content_type}. Allowed types: {', '.join(allowed_types)}"
+        )
+    try:
+        staged = await run_in_threadpool(_stage_stream, file.file, max_bytes)
+    finally:
+        await file.close()
+    staged.content_type = file.content_type
+    return staged
+
+
+def _move_into_place(upload: StagedUpload, relative_path: str) -> str:
+    """Atomically rename a staged file to relative_path under MEDIA_ROOT."""
     file_path = (MEDIA_ROOT / relative_path).resolve()
     file_path.parent.mkdir(parents=True, exist_ok=True)
 
     try:
-        with open(file_path, "wb") as destination:
-            destination.write(file_bytes)
+        os.replace(upload.path, file_path)
     except OSError as exc:
+        upload.discard()
         logger.exception(
             "media.write_failed",
-            extra={"subdir": subdir, "file_name": file_name},
+            extra={"path": relative_path},
         )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to store uploaded image",
         ) from exc
 
-    return relative_path.as_posix()
+    return relative_path
+
+
+def _write_media_file(upload: StagedUpload) -> str:
+    """
+    Store a staged upload in content-addressed storage and return its relative
+    path. Identical content is stored once: a duplicate replaces the existing
+    blob with the same bytes. Readers never see a partially written file.
+    """
+    relative_path = content_address(upload.sha256, upload.extension)
+    if (MEDIA_ROOT / relative_path).exists():
+        logger.info("media.dedup_hit", extra={"path": relative_path})
+    # Rename even on a dedup hit: retention cleanup may unlink the blob before
+    # this upload's Image row is committed, and the rename puts it back
+    return _move_into_place(upload, relative_path)
+
+
+def store_existing_file(source: Path) -> str:
+    """Copy a file already on disk into content-addressed storage; the source is left in place."""
+    with open(source, "rb") as handle:
+        staged = _stage_stream(handle, max_bytes=None)
+    staged.content_type, _ = mimetypes.guess_type(source.name)
+    return _write_media_file(staged)
+
+
+def save_anonymous_image(upload: StagedUpload) -> str:
+    """
+    Move a staged anonymous (/public/try) upload into place; returns its
+    relative path. These stay outside blob storage because the session
+    reaper deletes them without consulting Image rows. The extension comes
+    from the sniffed type, never the client's filename.
+    """
+    return _move_into_place(upload, (Path("anonymous") / f"{uuid4().hex}{upload.extension}").as_posix())
 
 
-def save_patient_image(db: Session, patient_id: int, file_bytes: bytes) -> Image:
+def save_patient_image(db: Session, patient_id: int, upload: StagedUpload) -> Image:
     """
     Persist an uploaded image for a patient that is linked to a doctor.
     """
-    if not file_bytes:
+    if not upload.size:
         logger.warning("media.upload.empty", extra={"patient_id": patient_id})
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -58,7 +211,9 @@ def save_patient_image(db: Session, patient_id: int, file_bytes: bytes) -> Image
             detail="Patient must have a linked doctor before uploading images",
         )
 
-    file_name = _write_media_file(file_bytes)
+    file_name = _write_media_file(upload)
+    # Encode the downscaled analysis copy now rather than on the analysis request
+    prepare_analysis_image(str(MEDIA_ROOT / file_name))
     image = Image(
         patient_id=patient_id,
         doctor_id=link.doctor_id,
@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import base64
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+import hashlib
+import hmac
 import logging
 from pathlib import Path, PurePosixPath
-from typing import Optional
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
 from urllib.parse import unquote, urlparse
 
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
 
+from app.services.image_preprocessing import derivatives_of
 from app.config import (
     ALGORITHM,
+    MEDIA_RENDITION_SIZES,
     MEDIA_ROOT,
+    MEDIA_TOKEN_ACCEPT_JWT,
+    MEDIA_TOKEN_CACHE_SIZE,
     MEDIA_URL,
     MEDIA_URL_TTL_SECONDS,
     SECRET_KEY,
@@ -19,6 +32,11 @@ from app.config import (
 
 logger = logging.getLogger("app.media")
 
+# Media tokens are "<exp>.<sig>": a truncated HMAC-SHA256 of the path and
+# expiry under a key derived from SECRET_KEY (separate from JWT signing).
+_MEDIA_TOKEN_KEY = hmac.new(SECRET_KEY.encode(), b"dermaai-media-token", hashlib.sha256).digest()
+_MEDIA_TOKEN_SIG_BYTES = 16
+
 
 def normalize_media_path(raw_path: str) -> str:
     """
@@ -73,12 +91,16 @@ def resolve_media_path(raw_path: str) -> Path:
     candidate = Path(raw_path)
     if candidate.is_absolute():
         relative = _media_path_from_absolute(candidate)
-        candidate = MEDIA_ROOT / relative
     else:
         relative = normalize_media_path(raw_path)
-        candidate = MEDIA_ROOT / relative
+    return media_file_path(relative)
+
 
-    candidate = candidate.resolve()
+def media_file_path(relative: str) -> Path:
+    """
+    Absolute path of an already normalized media path; 404 if it is missing.
+    """
+    candidate = (MEDIA_ROOT / relative).resolve()
     if not candidate.exists():
         logger.warning(
             "media.path.not_found",
@@ -92,47 +114,218 @@ def resolve_media_path(raw_path: str) -> Path:
     return candidate
 
 
+def _media_signature(normalized: str, expires_at: int) -> str:
+    digest = hmac.new(_MEDIA_TOKEN_KEY, f"{normalized}\n{expires_at}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:_MEDIA_TOKEN_SIG_BYTES]).rstrip(b"=").decode()
+
+
+def media_token_expiry(expires_in_seconds: Optional[int] = None) -> int:
+    """
+    Expiry timestamp for tokens issued now. It is rounded up to a quarter-TTL
+    boundary, so signing the same path again within that window yields the
+    same URL and browser caches can hit.
+    """
+    ttl = expires_in_seconds or MEDIA_URL_TTL_SECONDS
+    window = max(ttl // 4, 1)
+    return ((int(time.time()) + ttl) // window + 1) * window
+
+
 def create_media_token(media_path: str, expires_in_seconds: Optional[int] = None) -> str:
     """
     Create a signed token for a media path that expires after a short TTL.
     """
     normalized = normalize_media_path(media_path)
-    ttl = expires_in_seconds or MEDIA_URL_TTL_SECONDS
-    payload = {
-        "path": normalized,
-        "scope": "media",
-        "exp": datetime.now(timezone.utc) + timedelta(seconds=ttl),
-    }
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    expires_at = media_token_expiry(expires_in_seconds)
+    return f"{expires_at}.{_media_signature(normalized, expires_at)}"
 
 
-def verify_media_token(token: str, media_path: str) -> bool:
+class VerifiedTokenCache:
     """
-    Validate that the token matches the requested media path.
+    LRU of recently verified (token, path) pairs, so a page showing many
+    images does not repeat signature checks and path parsing. Entries are
+    dropped once their token expires.
     """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str, media_path: str) -> Optional[str]:
+        """Normalized path for a still-valid cached verification, else None."""
+        key = (token, media_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            normalized, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return normalized
+
+    def put(self, token: str, media_path: str, normalized: str, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(token, media_path)] = (normalized, expires_at)
+            self._entries.move_to_end((token, media_path))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+verified_media_tokens = VerifiedTokenCache(MEDIA_TOKEN_CACHE_SIZE)
+
+
+def _verify_jwt_media_token(token: str, normalized: str) -> Optional[float]:
+    """Expiry of a legacy JWT media token for normalized, or None if invalid."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        return False
+        return None
+    if payload.get("scope") != "media" or payload.get("path") != normalized or "exp" not in payload:
+        return None
+    return float(payload["exp"])
 
-    if payload.get("scope") != "media":
-        return False
+
+def verified_media_path(token: str, media_path: str) -> Optional[str]:
+    """
+    Check a media token against the requested path. Returns the normalized
+    path if the token is valid, else None. Verified tokens are cached until
+    they expire; legacy JWT tokens are accepted while MEDIA_TOKEN_ACCEPT_JWT.
+    """
+    if not token:
+        return None
+    normalized = verified_media_tokens.get(token, media_path)
+    if normalized is not None:
+        return normalized
 
     try:
         normalized = normalize_media_path(media_path)
     except HTTPException:
-        return False
+        return None
+
+    expires_at: Optional[float] = None
+    expiry, _, signature = token.partition(".")
+    # isdigit() alone accepts digits int() rejects, and compare_digest raises on non-ASCII str
+    if expiry.isascii() and expiry.isdigit() and signature:
+        if signature.isascii() and int(expiry) > time.time() and hmac.compare_digest(
+            signature, _media_signature(normalized, int(expiry))
+        ):
+            expires_at = float(expiry)
+    elif MEDIA_TOKEN_ACCEPT_JWT:
+        expires_at = _verify_jwt_media_token(token, normalized)
 
-    return payload.get("path") == normalized
+    if expires_at is None:
+        return None
+    verified_media_tokens.put(token, media_path, normalized, expires_at)
+    return normalized
 
 
-def create_signed_media_url(media_path: str) -> str:
+def verify_media_token(token: str, media_path: str) -> bool:
+    """
+    Validate that the token matches the requested media path.
+    """
+    return verified_media_path(token, media_path) is not None
+
+
+def validate_media_size(size: Optional[str]) -> Optional[str]:
+    """Reject rendition names other than the configured MEDIA_RENDITION_SIZES."""
+    if size is not None and size not in MEDIA_RENDITION_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown media size. Use one of: {', '.join(MEDIA_RENDITION_SIZES)}",
+        )
+    return size
+
+
+def create_signed_media_url(media_path: str, size: Optional[str] = None) -> str:
     """
     Build a signed URL that can be safely shared for short-lived access.
+    With size (e.g. "thumb") the URL serves a downscaled rendition instead;
+    the token covers the image, so any of its sizes may be requested.
     """
-    normalized = normalize_media_path(media_path)
-    token = create_media_token(normalized)
-    return f"{MEDIA_URL}/{normalized}?token={token}"
+    return sign_media_paths([media_path], size)[0][media_path]
+
+
+def sign_media_paths(
+    media_paths: Iterable[str],
+    size: Optional[str] = None,
+    expires_in_seconds: Optional[int] = None,
+) -> Tuple[Dict[str, str], int]:
+    """
+    Signed URLs for many media paths at once, sharing one expiry. Each
+    distinct path is normalized and signed once. Returns ({path: url}, expires_at).
+    """
+    suffix = f"&size={size}" if validate_media_size(size) else ""
+    expires_at = media_token_expiry(expires_in_seconds)
+    urls: Dict[str, str] = {}
+    for media_path in media_paths:
+        if media_path in urls:
+            continue
+        normalized = normalize_media_path(media_path)
+        token = f"{expires_at}.{_media_signature(normalized, expires_at)}"
+        urls[media_path] = f"{MEDIA_URL}/{normalized}?token={token}{suffix}"
+    return urls, expires_at
+
+
+_SHA256_NAME = re.compile(r"[0-9a-f]{64}")
+
+
+@lru_cache(maxsize=4096)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    """SHA-256 of a file; mtime and size are part of the cache key so edits re-hash."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as handle:
+        while chunk := handle.read(64 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def media_etag(file_path: Path, stat_result=None) -> str:
+    """
+    Strong ETag from the file's content. Content-addressed blobs are named by
+    their SHA-256, so only other files (legacy uploads, derivatives) are hashed.
+    The token is not part of it, so every signed URL for a file validates alike.
+    """
+    if _SHA256_NAME.fullmatch(file_path.stem):
+        return f'"{file_path.stem}"'
+    stat_result = stat_result or file_path.stat()
+    return f'"{_file_digest(str(file_path), stat_result.st_mtime_ns, stat_result.st_size)}"'
+
+
+def is_not_modified(
+    etag: str,
+    mtime: float,
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+) -> bool:
+    """
+    Evaluate conditional GET headers (RFC 9110 13.1). If-None-Match takes
+    precedence; If-Modified-Since is only consulted without it.
+    """
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison: W/"x" matches "x"
+        return "*" in candidates or etag in (tag.removeprefix("W/") for tag in candidates)
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return int(mtime) <= since.timestamp()
+    return False
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
 
 
 def safe_remove_media_file(raw_path: str) -> bool:
@@ -161,6 +354,8 @@ def safe_remove_media_file(raw_path: str) -> bool:
 
     try:
         candidate.unlink()
+        for derivative in derivatives_of(candidate):
+            derivative.unlink(missing_ok=True)
         return True
     except OSError:
         logger.exception("media.delete_failed", extra={"path": candidate.as_posix()})
@@ -2,7 +2,14 @@
 Mock Gemini Service for E2E testing without API keys.
 Returns deterministic responses for predictable test behavior.
 """
-from typing import Dict, Any
+import asyncio
+import re
+from typing import AsyncIterator, Dict, Any, Optional
+
+from app.services.analysis_cache import analysis_cache, analysis_digest
+
+MOCK_MODEL_NAME = "mock-gemini"
+MOCK_PROMPT_VERSION = "mock-v1"
 
 
 class MockGeminiService:
@@ -11,9 +18,23 @@ class MockGeminiService:
     Activated when MOCK_AI=true environment variable is set.
     """
     
+    def _digest(self, image_path: str) -> Optional[str]:
+        """Cache key for the image, or None when the path can't be read."""
+        try:
+            with open(image_path, "rb") as img_file:
+                return analysis_digest(img_file.read(), MOCK_MODEL_NAME, MOCK_PROMPT_VERSION)
+        except OSError:
+            return None
+
     async def analyze_skin_lesion(self, image_path: str) -> Dict[str, Any]:
         """Return deterministic mock analysis response."""
-        return {
+        digest = self._digest(image_path)
+        if digest:
+            cached = analysis_cache.get(digest)
+            if cached is not None:
+                return cached
+
+        result = {
             "status": "success",
             "condition": "Mock Condition (E2E Test)",
             "confidence": 85.0,
@@ -22,12 +43,31 @@ class MockGeminiService:
             "recommendation": "Monitor for changes. This is a mock response for testing.",
             "disclaimer": "This is a MOCK response for E2E testing. Not a real diagnosis."
         }
+        if digest:
+            analysis_cache.set(digest, result)
+        return result
     
     async def chat_about_lesion(
         self, 
         analysis_context: Dict[str, Any], 
         user_message: str, 
-        history: list = None
+        history: list = None,
+        summary: Optional[str] = None,
     ) -> str:
         """Return deterministic mock chat response."""
+        return self._chat_reply(analysis_context)
+
+    async def stream_chat_about_lesion(
+        self,
+        analysis_context: Dict[str, Any],
+        user_message: str,
+        history: list = None,
+        summary: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Yield the deterministic mock chat response word by word."""
+        for chunk in re.findall(r"\S+\s*", self._chat_reply(analysis_context)):
+            await asyncio.sleep(0)
+            yield chunk
+
+    def _chat_reply(self, analysis_context: Dict[str, Any]) -> str:
         return f"Mock AI Response: I received your message about the condition. The analysis shows {analysis_context.get('condition', 'a skin condition')} with {analysis_context.get('confidence', 0)}% confidence. Please consult a dermatologist for a professional evaluation."
@@ -0,0 +1,109 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by (created_at, id) and the cursor encodes the last row's
+pair, so each page is a bounded index range scan regardless of depth and
+rows inserted meanwhile never shift or duplicate results.
+
+Requests without limit/cursor keep the legacy unpaginated list while
+LIST_PAGINATION_COMPAT is enabled.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, Query as QueryParam, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+from app.config import LIST_PAGE_SIZE_DEFAULT, LIST_PAGE_SIZE_MAX, LIST_PAGINATION_COMPAT
+
+
+class PageParams:
+    """limit/cursor query parameters shared by paginated list endpoints."""
+
+    def __init__(
+        self,
+        limit: Optional[int] = QueryParam(None, ge=1, le=LIST_PAGE_SIZE_MAX),
+        cursor: Optional[str] = QueryParam(None),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+    @property
+    def legacy(self) -> bool:
+        return LIST_PAGINATION_COMPAT and self.limit is None and self.cursor is None
+
+    @property
+    def size(self) -> int:
+        return self.limit or LIST_PAGE_SIZE_DEFAULT
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
+
+
+def paginate(
+    query: Query,
+    page: PageParams,
+    created_col,
+    id_col,
+    descending: bool = False,
+    key: Callable[[Any], Any] = lambda row: row,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Apply stable (created_at, id) ordering and, unless in legacy mode, the
+    keyset window for page. key maps a result row to the object carrying
+    created_at/id (for queries returning tuples). Pass created_col=None to
+    page on id alone, for tables whose ids already follow insertion order.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    order_cols = [id_col] if created_col is None else [created_col, id_col]
+    query = query.order_by(*(col.desc() if descending else col.asc() for col in order_cols))
+
+    if page.legacy:
+        return query.all(), None
+
+    if page.cursor:
+        created_at, row_id = decode_cursor(page.cursor)
+        if created_col is None:
+            query = query.filter(id_col < row_id if descending else id_col > row_id)
+        elif created_at is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor",
+            )
+        elif descending:
+            query = query.filter(or_(created_col < created_at, and_(created_col == created_at, id_col < row_id)))
+        else:
+            query = query.filter(or_(created_col > created_at, and_(created_col == created_at, id_col > row_id)))
+
+    rows = query.limit(page.size + 1).all()
+    if len(rows) <= page.size:
+        return rows, None
+
+    rows = rows[:page.size]
+    last = key(rows[-1])
+    return rows, encode_cursor(None if created_col is None else last.created_at, last.id)
+
+
+def page_response(items: List[Any], next_cursor: Optional[str], page: PageParams) -> Union[List[Any], dict]:
+    """Legacy mode returns the bare list; otherwise an items/next_cursor envelope."""
+    if page.legacy:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,502 @@
+"""
+Storage backends for anonymous public sessions.
+
+A backend stores one JSON-serialisable document per session and owns its
+expiry; PublicSessionStore layers the session semantics (message folding,
+media cleanup, 404s) on top. Every backend finds expired sessions through an
+expiry-ordered structure (heap, index or sorted set) rather than a scan, and
+holds at most max_sessions, evicting the least recently used. Three
+implementations:
+
+- MemorySessionBackend: per-process dict, the default for a single worker.
+- SQLiteSessionBackend: one SQLite file shared by every worker on a host
+  (place it on /dev/shm for a RAM-backed store).
+- RedisSessionBackend: any Redis-protocol server, shared across hosts. It
+  speaks RESP directly so no client library is required.
+"""
+import heapq
+import json
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+SessionDoc = Dict[str, Any]
+Mutator = Callable[[SessionDoc], None]
+
+
+class SessionBackend:
+    """Interface implemented by every session backend."""
+
+    blocking = True  # Calls do file or network I/O; async callers offload them to a thread
+
+    def create(self, session_id: str, doc: SessionDoc, ttl_seconds: float) -> List[str]:
+        """
+        Store a new session that expires ttl_seconds from now. Returns the
+        image paths of sessions evicted to stay within max_sessions.
+        """
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[SessionDoc]:
+        """Return a copy of the session (marking it recently used), or None if missing or expired."""
+        raise NotImplementedError
+
+    def update(self, session_id: str, mutate: Mutator) -> Optional[SessionDoc]:
+        """
+        Atomically apply mutate to the stored document without changing its
+        expiry. Returns the updated document, or None if missing or expired.
+        """
+        raise NotImplementedError
+
+    def purge_expired(self) -> List[str]:
+        """Drop expired sessions and return their image paths; cost scales with the number expired."""
+        raise NotImplementedError
+
+    def clear(self) -> List[str]:
+        """Drop every session and return their image paths."""
+        raise NotImplementedError
+
+
+def _encode(doc: SessionDoc) -> str:
+    return json.dumps(doc, separators=(",", ":"))
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Per-process store. Documents are kept encoded so callers never share state.
+
+    sessions is ordered least recently used first; a min-heap of
+    (expires_at, session_id) serves purge_expired. Heap entries of evicted
+    sessions are skipped lazily when they surface.
+    """
+
+    blocking = False
+
+    def __init__(self, max_sessions: int = 10000):
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _live(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.sessions.get(session_id)
+        if entry is None or entry["expires_at"] <= time.time():
+            return None
+        self.sessions.move_to_end(session_id)
+        return entry
+
+    def create(self, session_id: str, doc: SessionDoc, ttl_seconds: float) -> List[str]:
+        expires_at = time.time() + ttl_seconds
+        with self._lock:
+            self.sessions[session_id] = {
+                "doc": _encode(doc),
+                "expires_at": expires_at,
+                "image_path": doc.get("image_path"),
+            }
+            heapq.heappush(self._expiry, (expires_at, session_id))
+            evicted = []
+            while len(self.sessions) > self.max_sessions:
+                _, entry = self.sessions.popitem(last=False)
+                evicted.append(entry["image_path"])
+            return evicted
+
+    def get(self, session_id: str) -> Optional[SessionDoc]:
+        with self._lock:
+            entry = self._live(session_id)
+            return json.loads(entry["doc"]) if entry else None
+
+    def update(self, session_id: str, mutate: Mutator) -> Optional[SessionDoc]:
+        with self._lock:
+            entry = self._live(session_id)
+            if entry is None:
+                return None
+            doc = json.loads(entry["doc"])
+            mutate(doc)
+            entry["doc"] = _encode(doc)
+            return doc
+
+    def purge_expired(self) -> List[str]:
+        now = time.time()
+        paths = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self._expiry)
+                entry = self.sessions.get(session_id)
+                if entry is not None and entry["expires_at"] == expires_at:
+                    del self.sessions[session_id]
+                    paths.append(entry["image_path"])
+        return paths
+
+    def clear(self) -> List[str]:
+        with self._lock:
+            paths = [entry["image_path"] for entry in self.sessions.values()]
+            self.sessions.clear()
+            self._expiry.clear()
+            return paths
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Sessions in a SQLite file, shared by all worker processes on one host.
+    Updates run in BEGIN IMMEDIATE transactions so concurrent workers
+    serialise on the file lock instead of overwriting each other.
+
+    expires_at and last_access are indexed for purging and LRU eviction, and
+    triggers keep a row count so the max_sessions check never scans.
+    """
+
+    def __init__(self, path: str, max_sessions: int = 10000, busy_timeout_seconds: float = 5.0):
+        self.path = path
+        self.max_sessions = max_sessions
+        self._conn = sqlite3.connect(
+            path, timeout=busy_timeout_seconds, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS public_sessions (
+                    id TEXT PRIMARY KEY,
+                    doc TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    image_path TEXT
+                );
+                CREATE INDEX IF NOT EXISTS ix_public_sessions_expires_at ON public_sessions (expires_at);
+                CREATE INDEX IF NOT EXISTS ix_public_sessions_last_access ON public_sessions (last_access);
+                CREATE TABLE IF NOT EXISTS public_session_count (n INTEGER NOT NULL);
+                INSERT INTO public_session_count (n)
+                    SELECT COUNT(*) FROM public_sessions WHERE NOT EXISTS (SELECT 1 FROM public_session_count);
+                CREATE TRIGGER IF NOT EXISTS public_sessions_count_insert AFTER INSERT ON public_sessions
+                    BEGIN UPDATE public_session_count SET n = n + 1; END;
+                CREATE TRIGGER IF NOT EXISTS public_sessions_count_delete AFTER DELETE ON public_sessions
+                    BEGIN UPDATE public_session_count SET n = n - 1; END;
+                """
+            )
+
+    def create(self, session_id: str, doc: SessionDoc, ttl_seconds: float) -> List[str]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO public_sessions (id, doc, expires_at, last_access, image_path) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, _encode(doc), now + ttl_seconds, now, doc.get("image_path")),
+                )
+                excess = self._conn.execute("SELECT n FROM public_session_count").fetchone()[0] - self.max_sessions
+                evicted = []
+                if excess > 0:
+                    rows = self._conn.execute(
+                        "SELECT id, image_path FROM public_sessions ORDER BY last_access LIMIT ?", (excess,)
+                    ).fetchall()
+                    self._conn.executemany("DELETE FROM public_sessions WHERE id = ?", [(row[0],) for row in rows])
+                    evicted = [row[1] for row in rows]
+                self._conn.execute("COMMIT")
+                return evicted
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, session_id: str) -> Optional[SessionDoc]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE public_sessions SET last_access = ? WHERE id = ? AND expires_at > ? RETURNING doc",
+                (now, session_id, now),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, session_id: str, mutate: Mutator) -> Optional[SessionDoc]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT doc FROM public_sessions WHERE id = ? AND expires_at > ?",
+                    (session_id, time.time()),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                doc = json.loads(row[0])
+                mutate(doc)
+                self._conn.execute(
+                    "UPDATE public_sessions SET doc = ?, last_access = ? WHERE id = ?",
+                    (_encode(doc), time.time(), session_id),
+                )
+                self._conn.execute("COMMIT")
+                return doc
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete_where(self, clause: str, params: tuple) -> List[str]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                paths = [row[0] for row in self._conn.execute(
+                    f"SELECT image_path FROM public_sessions WHERE {clause}", params
+                )]
+                self._conn.execute(f"DELETE FROM public_sessions WHERE {clause}", params)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return paths
+
+    def purge_expired(self) -> List[str]:
+        return self._delete_where("expires_at <= ?", (time.time(),))
+
+    def clear(self) -> List[str]:
+        return self._delete_where("1 = 1", ())
+
+
+class RedisError(Exception):
+    """Error reply or protocol failure from a Redis-protocol server."""
+
+
+def parse_redis_url(url: str) -> Tuple[str, int, Optional[str], int]:
+    """Split redis://[:password@]host[:port][/db] into (host, port, password, db)."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("redis", ""):
+        raise ValueError(f"Unsupported Redis URL scheme: {parsed.scheme}")
+    return (
+        parsed.hostname or "localhost",
+        parsed.port or 6379,
+        unquote(parsed.password) if parsed.password else None,
+        int(parsed.path.lstrip("/") or 0),
+    )
+
+
+def pack_command(args) -> bytes:
+    """Encode a command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RedisClient:
+    """
+    Minimal blocking RESP2 client: one socket, commands serialised by a lock.
+    Connects lazily and reconnects once if the socket was dropped, except
+    inside WATCH/MULTI: that state lived on the lost connection, so the error
+    is raised and the caller retries the whole transaction.
+    """
+
+    def __init__(self, url: str, timeout_seconds: float = 5.0):
+        self.host, self.port, self.password, self.db = parse_redis_url(url)
+        self.timeout_seconds = timeout_seconds
+        self.lock = threading.RLock()
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._in_transaction = False
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout_seconds)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def close(self) -> None:
+        with self.lock:
+            if self._sock is not None:
+                self._reader.close()
+                self._sock.close()
+            self._sock = None
+            self._reader = None
+            self._in_transaction = False
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by Redis server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def _call(self, *args) -> Any:
+        self._sock.sendall(pack_command(args))
+        return self._read_reply()
+
+    def execute(self, *args) -> Any:
+        """Send one command and return its decoded reply."""
+        name = str(args[0]).upper()
+        with self.lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    reply = self._call(*args)
+                except (ConnectionError, OSError):
+                    in_transaction = self._in_transaction
+                    self.close()
+                    if attempt == 2 or in_transaction:
+                        raise
+                    continue
+                if name in ("WATCH", "MULTI"):
+                    self._in_transaction = True
+                elif name in ("EXEC", "DISCARD", "UNWATCH"):
+                    self._in_transaction = False
+                return reply
+
+    def transaction(self, block: Callable[[], Any]) -> Any:
+        """
+        Run block, a WATCH/MULTI/EXEC sequence, under the lock; if the
+        connection drops partway, run it again from the top on a new one.
+        """
+        with self.lock:
+            for attempt in (1, 2):
+                try:
+                    return block()
+                except (ConnectionError, OSError):
+                    if attempt == 2:
+                        raise
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Sessions as Redis strings with a server-side TTL (SET ... PX).
+
+    Redis expires keys on its own, so an expiry index (sorted set of
+    session ids by deadline) and an image-path hash let purge_expired find
+    the media files of sessions that have already disappeared. A second
+    sorted set scored by last access drives LRU eviction.
+    """
+
+    MAX_UPDATE_RETRIES = 10
+
+    def __init__(
+        self,
+        url: str,
+        max_sessions: int = 10000,
+        prefix: str = "dermaai:public_session:",
+        client: Optional[RedisClient] = None,
+    ):
+        self.client = client or RedisClient(url)
+        self.max_sessions = max_sessions
+        self.prefix = prefix
+        self.expiry_key = f"{prefix}expiry"
+        self.lru_key = f"{prefix}lru"
+        self.images_key = f"{prefix}images"
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def create(self, session_id: str, doc: SessionDoc, ttl_seconds: float) -> List[str]:
+        ttl_ms = max(1, int(ttl_seconds * 1000))
+        now_ms = int(time.time() * 1000)
+        execute = self.client.execute
+
+        def store() -> int:
+            execute("MULTI")
+            execute("SET", self._key(session_id), _encode(doc), "PX", ttl_ms)
+            execute("ZADD", self.expiry_key, now_ms + ttl_ms, session_id)
+            execute("ZADD", self.lru_key, now_ms, session_id)
+            if doc.get("image_path"):
+                execute("HSET", self.images_key, session_id, doc["image_path"])
+            execute("ZCARD", self.lru_key)
+            return execute("EXEC")[-1]
+
+        with self.client.lock:
+            count = self.client.transaction(store)
+            excess = count - self.max_sessions
+            if excess <= 0:
+                return []
+            return self._forget(execute("ZRANGE", self.lru_key, 0, excess - 1))
+
+    def get(self, session_id: str) -> Optional[SessionDoc]:
+        with self.client.lock:
+            raw = self.client.execute("GET", self._key(session_id))
+            if raw is None:
+                return None
+            self.client.execute("ZADD", self.lru_key, int(time.time() * 1000), session_id)
+        return json.loads(raw)
+
+    def update(self, session_id: str, mutate: Mutator) -> Optional[SessionDoc]:
+        key = self._key(session_id)
+        execute = self.client.execute
+        missing = object()
+
+        def attempt():
+            execute("WATCH", key)
+            raw = execute("GET", key)
+            if raw is None:
+                execute("UNWATCH")
+                return missing
+            doc = json.loads(raw)
+            try:
+                mutate(doc)
+            except BaseException:
+                execute("UNWATCH")
+                raise
+            execute("MULTI")
+            execute("SET", key, _encode(doc), "XX", "KEEPTTL")
+            execute("ZADD", self.lru_key, int(time.time() * 1000), session_id)
+            replies = execute("EXEC")
+            if replies is None:
+                return None
+            # SET XX replies nil if the key expired after the read
+            return doc if replies[0] is not None else missing
+
+        # Optimistic transaction: EXEC returns nil if another worker wrote the key first
+        for _ in range(self.MAX_UPDATE_RETRIES):
+            doc = self.client.transaction(attempt)
+            if doc is missing:
+                return None
+            if doc is not None:
+                return doc
+        raise RedisError(f"Too much contention updating session {session_id}")
+
+    def _forget(self, session_ids: List[str]) -> List[str]:
+        if not session_ids:
+            return []
+        execute = self.client.execute
+        with self.client.lock:
+            paths = [execute("HGET", self.images_key, sid) for sid in session_ids]
+            execute("DEL", *(self._key(sid) for sid in session_ids))
+            execute("ZREM", self.expiry_key, *session_ids)
+            execute("ZREM", self.lru_key, *session_ids)
+            execute("HDEL", self.images_key, *session_ids)
+        return [path for path in paths if path]
+
+    def purge_expired(self) -> List[str]:
+        now_ms = int(time.time() * 1000)
+        return self._forget(self.client.execute("ZRANGEBYSCORE", self.expiry_key, "-inf", now_ms))
+
+    def clear(self) -> List[str]:
+        return self._forget(self.client.execute("ZRANGE", self.expiry_key, 0, -1))
+
+
+def build_session_backend(name: str, sqlite_path: str, redis_url: str, max_sessions: int) -> SessionBackend:
+    """Create the backend selected by PUBLIC_SESSION_BACKEND."""
+    if name == "memory":
+        return MemorySessionBackend(max_sessions)
+    if name == "sqlite":
+        return SQLiteSessionBackend(sqlite_path, max_sessions)
+    if name == "redis":
+        return RedisSessionBackend(redis_url, max_sessions)
+    raise ValueError(f"Unknown PUBLIC_SESSION_BACKEND: {name!r} (expected memory, sqlite or redis)")
@@ -1,76 +1,208 @@
-from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
 from types import SimpleNamespace
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 from uuid import uuid4
 
 from fastapi import HTTPException, status
-
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import (
+    PUBLIC_SESSION_BACKEND,
+    PUBLIC_SESSION_MAX_MESSAGES,
+    PUBLIC_SESSION_MAX_SESSIONS,
+    PUBLIC_SESSION_REDIS_URL,
+    PUBLIC_SESSION_SQLITE_PATH,
+    PUBLIC_SESSION_TTL_MINUTES,
+)
+from app.services.chat_context import fold_history
 from app.services.media_service import safe_remove_media_file
+from app.services.public_session_backends import (
+    MemorySessionBackend,
+    SessionBackend,
+    build_session_backend,
+)
+
+logger = logging.getLogger("app.public_sessions")
+
+T = TypeVar("T")
+
+
+def _as_namespaces(messages: List[Dict[str, str]]) -> List[SimpleNamespace]:
+    return [SimpleNamespace(**message) for message in messages]
+
 
 class PublicSessionStore:
     """
-    Lightweight in-memory store for anonymous analysis sessions.
-    Sessions expire automatically after a short TTL and never touch the database.
-    """
+    Store for anonymous analysis sessions that never touch the main database.
 
-    def __init__(self, ttl_minutes: int = 20):
-        self.ttl = timedelta(minutes=ttl_minutes)
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+    Sessions expire after a short TTL enforced by the storage backend, and
+    each keeps at most max_messages chat messages: older ones are dropped
+    (after being folded into the rolling summary) so a long anonymous chat
+    cannot grow without bound. Folding for the AI context alone only moves
+    the summary cursor, so signup can still migrate the whole conversation.
 
-    def _is_expired(self, created_at: datetime) -> bool:
-        return datetime.now(timezone.utc) - created_at > self.ttl
-
-    def _prune(self) -> None:
-        """Remove expired sessions to keep memory usage predictable."""
-        expired_ids: List[str] = []
-        for session_id, data in self.sessions.items():
-            if self._is_expired(data["created_at"]):
-                expired_ids.append(session_id)
+    Expired or evicted sessions are invisible immediately, but their rows and
+    uploaded images are removed by reap(), which the background reaper runs
+    periodically so requests never pay for cleanup.
+    """
 
-        for session_id in expired_ids:
-            session = self.sessions.pop(session_id, None)
-            if session:
-                safe_remove_media_file(session.get("image_path"))
+    def __init__(
+        self,
+        ttl_minutes: int = 20,
+        backend: Optional[SessionBackend] = None,
+        max_messages: int = PUBLIC_SESSION_MAX_MESSAGES,
+    ):
+        self.ttl_seconds = ttl_minutes * 60
+        self.backend = backend or MemorySessionBackend()
+        self.max_messages = max_messages
+        self._evicted_media: deque = deque()  # Images of LRU-evicted sessions, removed by reap()
+        self._reaper: Optional[asyncio.Task] = None
+
+    def reap(self) -> int:
+        """Drop expired sessions and delete their images (and those of evicted sessions)."""
+        image_paths = self.backend.purge_expired()
+        expired = len(image_paths)
+        while self._evicted_media:
+            image_paths.append(self._evicted_media.popleft())
+        for image_path in image_paths:
+            safe_remove_media_file(image_path)
+        if image_paths:
+            logger.info(
+                "public_sessions.reaped",
+                extra={"expired": expired, "images": sum(1 for path in image_paths if path)},
+            )
+        return expired
+
+    async def _reap_forever(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await run_in_threadpool(self.reap)
+            except Exception:  # noqa: BLE001 - keep the reaper alive
+                logger.exception("public_sessions.reap_failed")
+
+    def start_reaper(self, interval_seconds: float) -> None:
+        """Start the background reaper on the running event loop."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.get_running_loop().create_task(self._reap_forever(interval_seconds))
+
+    async def stop_reaper(self) -> None:
+        if self._reaper is None:
+            return
+        self._reaper.cancel()
+        try:
+            await self._reaper
+        except asyncio.CancelledError:
+            pass
+        self._reaper = None
+
+    async def run(self, method: Callable[..., T], *args: Any) -> T:
+        """
+        Call a store method from async code: inline for the memory backend,
+        in the threadpool for backends that block on file or socket I/O.
+        """
+        if not self.backend.blocking:
+            return method(*args)
+        return await run_in_threadpool(method, *args)
+
+    @staticmethod
+    def _not_found() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session expired or not found",
+        )
 
     def create_session(self, analysis: Dict[str, Any], image_path: str = None) -> str:
         """Create a new anonymous session and return its ID."""
-        self._prune()
         session_id = uuid4().hex
-        self.sessions[session_id] = {
-            "analysis": analysis,
-            "created_at": datetime.now(timezone.utc),
-            "messages": [],  # List[SimpleNamespace] with sender_role/message for chat context
-            "image_path": image_path,
-        }
+        evicted = self.backend.create(
+            session_id,
+            {
+                "analysis": analysis,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "messages": [],  # {sender_role, message} dicts for chat context
+                "summary": None,  # Rolling summary of messages folded out of the context window
+                "summary_upto": 0,  # Number of leading messages already in the summary
+                "image_path": image_path,
+            },
+            self.ttl_seconds,
+        )
+        self._evicted_media.extend(evicted)
         return session_id
 
     def get_session(self, session_id: str) -> Dict[str, Any]:
-        """Retrieve a session or raise 404 if missing/expired."""
-        self._prune()
-        session = self.sessions.get(session_id)
-
-        if not session or self._is_expired(session["created_at"]):
-            session = self.sessions.pop(session_id, None)
-            if session:
-                safe_remove_media_file(session.get("image_path"))
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Session expired or not found",
+        """
+        Retrieve a snapshot of a session or raise 404 if missing/expired.
+        Messages are returned as objects with sender_role/message attributes.
+        """
+        doc = self.backend.get(session_id)
+        if doc is None:
+            raise self._not_found()
+
+        doc["created_at"] = datetime.fromisoformat(doc["created_at"])
+        doc["messages"] = _as_namespaces(doc["messages"])
+        return doc
+
+    def _cap_messages(self, doc: Dict[str, Any]) -> None:
+        excess = len(doc["messages"]) - self.max_messages
+        if excess <= 0:
+            return
+        # Summarize whatever is dropped that the summary does not cover yet
+        upto = doc.get("summary_upto", 0)
+        if upto < excess:
+            doc["summary"], _, _ = fold_history(
+                doc["summary"], _as_namespaces(doc["messages"][upto:excess]), max_turns=0
             )
-
-        return session
+            upto = excess
+        del doc["messages"][:excess]
+        doc["summary_upto"] = upto - excess
 
     def append_message(self, session_id: str, sender_role: str, message: str) -> None:
         """Record a chat message against a session."""
-        session = self.get_session(session_id)
-        session["messages"].append(SimpleNamespace(sender_role=sender_role, message=message))
+        def mutate(doc: Dict[str, Any]) -> None:
+            doc["messages"].append({"sender_role": sender_role, "message": message})
+            self._cap_messages(doc)
+
+        if self.backend.update(session_id, mutate) is None:
+            raise self._not_found()
+
+    def chat_context(self, session_id: str) -> Tuple[Optional[str], List[SimpleNamespace]]:
+        """
+        Return (summary, recent messages) for the AI prompt, folding messages
+        that fell out of the context window into the session summary.
+        """
+        result: Dict[str, Any] = {}
+
+        def mutate(doc: Dict[str, Any]) -> None:
+            upto = doc.get("summary_upto", 0)
+            summary, recent, folded = fold_history(doc["summary"], _as_namespaces(doc["messages"][upto:]))
+            if folded:
+                # Keep the messages (signup migrates them); only move the cursor
+                doc["summary"] = summary
+                doc["summary_upto"] = upto + folded
+            result["context"] = (summary, recent)
+
+        if self.backend.update(session_id, mutate) is None:
+            raise self._not_found()
+        summary, recent = result["context"]
+        return summary, list(recent)
 
     def clear(self) -> None:
         """Utility for tests to reset state."""
-        for session in self.sessions.values():
-            safe_remove_media_file(session.get("image_path"))
-        self.sessions.clear()
-
-
-public_session_store = PublicSessionStore(ttl_minutes=20)
-
+        self._evicted_media.clear()
+        for image_path in self.backend.clear():
+            safe_remove_media_file(image_path)
+
+
+public_session_store = PublicSessionStore(
+    ttl_minutes=PUBLIC_SESSION_TTL_MINUTES,
+    backend=build_session_backend(
+        PUBLIC_SESSION_BACKEND,
+        PUBLIC_SESSION_SQLITE_PATH,
+        PUBLIC_SESSION_REDIS_URL,
+        PUBLIC_SESSION_MAX_SESSIONS,
+    ),
+)
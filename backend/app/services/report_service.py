@@ -1,7 +1,11 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import desc, exists, false, or_
+from sqlalchemy.orm import Query, Session
 
-from app.models import AnalysisReport, Image, PatientDoctorLink, User
+from app.models import AnalysisReport, DoctorProfile, Image, PatientDoctorLink, User
 
 
 def get_report_or_404(db: Session, report_id: int) -> AnalysisReport:
@@ -14,6 +18,100 @@ def get_report_or_404(db: Session, report_id: int) -> AnalysisReport:
     return report
 
 
+def _with_doctor_profile(query: Query) -> Query:
+    """Add the assigned doctor's profile (or None) to each report row in the same query."""
+    return query.add_entity(DoctorProfile).outerjoin(
+        DoctorProfile, DoctorProfile.user_id == AnalysisReport.doctor_id
+    )
+
+
+def get_report_with_doctor_or_404(db: Session, report_id: int) -> Tuple[AnalysisReport, Optional[DoctorProfile]]:
+    row = _with_doctor_profile(
+        db.query(AnalysisReport).filter(AnalysisReport.id == report_id)
+    ).first()
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis report not found",
+        )
+    return row
+
+
+def get_latest_report_with_doctor(db: Session, image_id: int) -> Tuple[Optional[AnalysisReport], Optional[DoctorProfile]]:
+    row = _with_doctor_profile(
+        db.query(AnalysisReport)
+        .filter(AnalysisReport.image_id == image_id)
+        .order_by(desc(AnalysisReport.created_at))
+    ).first()
+    return row if row else (None, None)
+
+
+def load_doctor_profiles(db: Session, doctor_ids: Iterable[Optional[int]]) -> Dict[int, DoctorProfile]:
+    """Fetch the profiles for many doctors in one query, keyed by user_id."""
+    ids = {doctor_id for doctor_id in doctor_ids if doctor_id}
+    if not ids:
+        return {}
+    profiles: Dict[int, DoctorProfile] = {}
+    for profile in db.query(DoctorProfile).filter(DoctorProfile.user_id.in_(ids)).order_by(DoctorProfile.id):
+        profiles.setdefault(profile.user_id, profile)
+    return profiles
+
+
+def parse_report_json(raw: Any) -> Dict[str, Any]:
+    """
+    Return report_json as a fresh dict. New rows are stored natively; the
+    string branch only covers rows written before the native-JSON backfill.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError:
+            return {}
+    return dict(raw) if isinstance(raw, dict) else {}
+
+
+def analysis_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Structured column values (condition, confidence, recommendation) for an analysis payload."""
+    confidence = data.get("confidence")
+    try:
+        confidence = float(confidence) if confidence is not None else None
+    except (TypeError, ValueError):
+        confidence = None
+    return {
+        "condition": data.get("condition"),
+        "confidence": confidence,
+        "recommendation": data.get("recommendation"),
+    }
+
+
+def apply_analysis_result(report: AnalysisReport, data: Dict[str, Any]) -> None:
+    """Store an analysis payload natively and mirror its key fields into the typed columns."""
+    report.report_json = dict(data)
+    for column, value in analysis_fields(data).items():
+        setattr(report, column, value)
+
+
+def serialize_report(report: AnalysisReport) -> Dict[str, Any]:
+    """Analysis payload plus the report tracking fields shared by every report endpoint."""
+    data = parse_report_json(report.report_json)
+    data["report_id"] = report.id
+    data["image_id"] = report.image_id
+    data["review_status"] = report.review_status
+    data["doctor_active"] = report.doctor_active
+    data["patient_rating"] = report.patient_rating
+    data["patient_feedback"] = report.patient_feedback
+    data["created_at"] = report.created_at.isoformat()
+    return data
+
+
+def serialize_doctor(profile: DoctorProfile) -> Dict[str, Any]:
+    return {
+        "full_name": profile.full_name,
+        "avatar_url": profile.avatar_url,
+        "clinic_name": profile.clinic_name,
+    }
+
+
 def get_image_or_404(db: Session, image_id: int) -> Image:
     image = db.query(Image).filter(Image.id == image_id).first()
     if not image:
@@ -70,6 +168,25 @@ def ensure_image_access(db: Session, image: Image, user: User) -> None:
     )
 
 
+def accessible_images(db: Session, image_ids: Iterable[int], user: User) -> List[Image]:
+    """
+    The images among image_ids that user may view, under the same rules as
+    ensure_image_access, in one query. Missing and forbidden ids are omitted.
+    """
+    query = db.query(Image).filter(Image.id.in_(set(image_ids)))
+    if user.role == "patient":
+        query = query.filter(Image.patient_id == user.id)
+    elif user.role == "doctor":
+        linked = exists().where(
+            PatientDoctorLink.patient_id == Image.patient_id,
+            PatientDoctorLink.doctor_id == user.id,
+        )
+        query = query.filter(or_(Image.doctor_id == user.id, linked))
+    else:
+        query = query.filter(false())
+    return query.all()
+
+
 def submit_patient_rating(
     db: Session,
     report_id: int,
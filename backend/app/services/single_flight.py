@@ -0,0 +1,39 @@
+"""
+In-process single-flight helper.
+
+Concurrent callers asking for the same key share one in-flight task instead of
+each starting their own (e.g. duplicate AI analysis calls from double-clicks).
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent async calls that share a key."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key, or join the call already running for it.
+
+        The shared task is shielded so one caller being cancelled doesn't
+        cancel the work for everybody else waiting on it.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,26 @@
+"""
+Helpers for Server-Sent Events (text/event-stream) responses.
+"""
+import json
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Stop proxies (nginx) from buffering the stream so chunks reach the client immediately
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def wants_event_stream(accept_header: str | None, stream_param: bool = False) -> bool:
+    """True if the client asked for SSE via ?stream=true or the Accept header."""
+    return stream_param or SSE_MEDIA_TYPE in (accept_header or "")
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one SSE event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
@@ -0,0 +1,145 @@
+"""
+Per-connection outbound queues for WebSocket chat.
+
+A broadcast is serialized once and put on each recipient's Outbox, which
+returns immediately. Each Outbox has its own writer task that sends frames
+in order, so one slow client does not delay the others. When a client's
+queue is full, WS_SLOW_CONSUMER_POLICY decides what happens:
+
+- drop: discard the new frame. Streamed AI deltas are replaced by the final
+  message anyway, and the full history is sent on reconnect.
+- coalesce: merge the new frame into the queued one when both are deltas of
+  the same AI stream; otherwise disconnect.
+- disconnect: close the socket (1013, try again later). The client
+  reconnects and gets the full history.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from contextlib import suppress
+from typing import Any, Callable, Deque, Dict, NamedTuple, Optional
+
+from app.config import WS_OUTBOX_MAX_FRAMES, WS_SEND_TIMEOUT_SECONDS, WS_SLOW_CONSUMER_POLICY
+
+logger = logging.getLogger("app.websocket")
+
+SLOW_CONSUMER_POLICIES = ("drop", "coalesce", "disconnect")
+TRY_AGAIN_LATER = 1013  # WebSocket close code for an overloaded peer
+
+
+class Frame(NamedTuple):
+    """A message and its JSON text, shared by every recipient of a broadcast."""
+
+    text: str
+    message: Dict[str, Any]
+
+    @classmethod
+    def of(cls, message: Dict[str, Any]) -> "Frame":
+        # Same encoding as Starlette's send_json
+        return cls(json.dumps(message, separators=(",", ":"), ensure_ascii=False), message)
+
+
+def _merge_deltas(queued: Frame, frame: Frame) -> Optional[Frame]:
+    """One frame carrying both deltas, if both belong to the same AI stream."""
+    first, second = queued.message, frame.message
+    if first.get("type") != "ai_delta" or second.get("type") != "ai_delta":
+        return None
+    if first.get("stream_id") != second.get("stream_id"):
+        return None
+    return Frame.of({**first, "delta": first["delta"] + second["delta"]})
+
+
+class Outbox:
+    """Bounded send queue and writer task for one WebSocket."""
+
+    def __init__(
+        self,
+        websocket,
+        on_close: Optional[Callable[["Outbox"], None]] = None,
+        max_frames: int = WS_OUTBOX_MAX_FRAMES,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+        send_timeout: float = WS_SEND_TIMEOUT_SECONDS,
+        label: Optional[Dict[str, Any]] = None,
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown WS_SLOW_CONSUMER_POLICY: {policy!r} (expected drop, coalesce or disconnect)")
+        self.websocket = websocket
+        self.max_frames = max(1, max_frames)
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.label = label or {}
+        self.dropped = 0
+        self.closed = False
+        self._on_close = on_close
+        self._queue: Deque[Frame] = deque()
+        self._ready = asyncio.Event()
+        self._evicted = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def offer(self, frame: Frame) -> bool:
+        """Queue frame for sending without waiting; False if it was dropped."""
+        if self.closed:
+            return False
+        if len(self._queue) < self.max_frames:
+            self._queue.append(frame)
+            self._ready.set()
+            return True
+
+        if self.policy == "coalesce":
+            merged = _merge_deltas(self._queue[-1], frame)
+            if merged is not None:
+                self._queue[-1] = merged
+                return True
+        if self.policy == "drop":
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning("ws.slow_consumer_dropped", extra={**self.label, "dropped": self.dropped})
+            return False
+
+        logger.warning(
+            "ws.slow_consumer_disconnected",
+            extra={**self.label, "policy": self.policy, "queued": len(self._queue)},
+        )
+        self._evicted = True
+        self._shut_down()
+        return False
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    frame = self._queue.popleft()
+                    await asyncio.wait_for(self.websocket.send_text(frame.text), self.send_timeout)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            if self._evicted:
+                with suppress(Exception):
+                    await asyncio.wait_for(self.websocket.close(code=TRY_AGAIN_LATER), self.send_timeout)
+            raise
+        except asyncio.TimeoutError:
+            logger.warning("ws.send_timeout", extra={**self.label, "queued": len(self._queue)})
+            with suppress(Exception):
+                await asyncio.wait_for(self.websocket.close(code=TRY_AGAIN_LATER), self.send_timeout)
+            self._shut_down(cancel=False)
+        except Exception as exc:  # noqa: BLE001 - the socket is gone; the read loop will notice too
+            logger.info("ws.send_failed", extra={**self.label, "error": str(exc)})
+            self._shut_down(cancel=False)
+
+    def _shut_down(self, cancel: bool = True) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if cancel:
+            self._task.cancel()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def close(self) -> None:
+        """Stop the writer, discarding unsent frames."""
+        self._shut_down()
@@ -0,0 +1,324 @@
+"""
+Cross-worker fan-out for WebSocket broadcasts.
+
+ConnectionManager delivers a broadcast to the sockets on its own worker
+directly, then publishes it through one of these backends so every other
+worker can deliver it to theirs. Envelopes carry the publishing worker's id,
+and a worker ignores its own. Three implementations:
+
+- InProcessPubSub: a single worker; nothing leaves the process (default).
+- UnixSocketPubSub: workers on one host. Each binds a datagram socket in a
+  shared directory and sends every broadcast to all the others.
+- RedisPubSub: any Redis-protocol server, across hosts. There is one channel
+  per report, and a worker subscribes only while it holds a socket for that
+  report.
+
+Delivery is at most once: a worker that is restarting or reconnecting misses
+broadcasts. Chat messages are persisted, and clients get the full history
+when they reconnect.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from uuid import uuid4
+
+from app.config import WS_PUBSUB_PUBLISH_QUEUE
+from app.services.public_session_backends import RedisError, pack_command, parse_redis_url
+
+logger = logging.getLogger("app.websocket")
+
+Envelope = Dict[str, Any]
+Deliver = Callable[[int, Envelope], Awaitable[None]]
+
+
+def _encode(report_id: int, envelope: Envelope) -> bytes:
+    return json.dumps({"report_id": report_id, **envelope}, separators=(",", ":")).encode()
+
+
+def _decode(data: bytes) -> tuple:
+    envelope = json.loads(data)
+    return int(envelope.pop("report_id")), envelope
+
+
+async def _dispatch(deliver: Deliver, data: bytes) -> None:
+    """Decode and deliver one envelope; a bad one must not stop the listener."""
+    try:
+        report_id, envelope = _decode(data)
+        await deliver(report_id, envelope)
+    except Exception:  # noqa: BLE001 - keep receiving
+        logger.exception("ws.pubsub_deliver_failed")
+
+
+class PubSub:
+    """Interface implemented by every fan-out backend."""
+
+    async def start(self, deliver: Deliver) -> None:
+        """Begin receiving; deliver(report_id, envelope) is awaited for each broadcast from another worker."""
+
+    async def stop(self) -> None:
+        """Stop receiving and release sockets."""
+
+    def subscribe(self, report_id: int) -> None:
+        """This worker now holds a socket for report_id."""
+
+    def unsubscribe(self, report_id: int) -> None:
+        """This worker no longer holds any socket for report_id."""
+
+    async def publish(self, report_id: int, envelope: Envelope) -> None:
+        """Send envelope to the other workers."""
+
+
+class InProcessPubSub(PubSub):
+    """Single worker: every socket is local, so there is nothing to fan out."""
+
+
+class UnixSocketPubSub(PubSub):
+    """
+    Fan-out between workers on one host over Unix datagram sockets.
+
+    Each worker binds <socket_dir>/<pid>-<id>.sock. The peer list is the
+    directory listing, refreshed at most every PEER_REFRESH_SECONDS. A socket
+    file whose worker has died refuses datagrams and is removed.
+    """
+
+    PEER_REFRESH_SECONDS = 1.0
+    MAX_DATAGRAM_BYTES = 256 * 1024
+
+    def __init__(self, socket_dir: str):
+        self.socket_dir = Path(socket_dir)
+        self.path: Optional[Path] = None
+        self._sock: Optional[socket.socket] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._peers: List[str] = []
+        self._peers_at = 0.0
+
+    async def start(self, deliver: Deliver) -> None:
+        self.socket_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.path = self.socket_dir / f"{os.getpid()}-{uuid4().hex[:8]}.sock"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(self.path))
+        sock.setblocking(False)
+        self._sock = sock
+        self._peers_at = 0.0
+        self._listener = asyncio.get_running_loop().create_task(self._listen(deliver))
+
+    async def _listen(self, deliver: Deliver) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            data = await loop.sock_recv(self._sock, self.MAX_DATAGRAM_BYTES)
+            await _dispatch(deliver, data)
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
+
+    def _current_peers(self) -> List[str]:
+        now = time.monotonic()
+        if now - self._peers_at >= self.PEER_REFRESH_SECONDS:
+            own = str(self.path)
+            self._peers = [str(path) for path in self.socket_dir.glob("*.sock") if str(path) != own]
+            self._peers_at = now
+        return self._peers
+
+    async def publish(self, report_id: int, envelope: Envelope) -> None:
+        if self._sock is None:
+            return
+        data = _encode(report_id, envelope)
+        for peer in self._current_peers():
+            try:
+                self._sock.sendto(data, peer)
+            except ConnectionRefusedError:
+                # Nobody is bound there any more: a worker exited without cleaning up
+                with suppress(FileNotFoundError):
+                    os.unlink(peer)
+                self._peers_at = 0.0
+            except FileNotFoundError:
+                self._peers_at = 0.0
+            except BlockingIOError:
+                logger.warning("ws.pubsub_peer_backlogged", extra={"peer": peer, "report_id": report_id})
+            except OSError:
+                logger.warning("ws.pubsub_send_failed", extra={"peer": peer, "report_id": report_id}, exc_info=True)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP2 reply."""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by Redis server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise RedisError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        count = int(payload)
+        if count < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(count)]
+    raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class RedisPubSub(PubSub):
+    """
+    Fan-out through Redis PUBLISH/SUBSCRIBE on a channel per report.
+
+    A dedicated subscriber connection reconnects with backoff and
+    re-subscribes to every report that still has local sockets. Pub/sub
+    channels are server-wide, so the URL's database number is ignored.
+
+    publish() only queues the PUBLISH command. A publisher task sends
+    everything queued in one write over a second connection, then reads the
+    replies, so a stream of AI deltas costs one round trip per batch rather
+    than one per delta. When Redis falls behind by more than max_pending
+    commands, new publishes are dropped like a slow client's frames.
+    """
+
+    CHANNEL_PREFIX = "dermaai:ws:report:"
+    RECONNECT_DELAYS = (0.1, 0.5, 1.0, 2.0, 5.0)
+    MAX_BATCH = 256  # PUBLISH commands sent per write
+
+    def __init__(self, url: str, max_pending: int = WS_PUBSUB_PUBLISH_QUEUE):
+        self.host, self.port, self.password, _ = parse_redis_url(url)
+        self.channels: Set[str] = set()
+        self.dropped = 0
+        self._subscriber: Optional[asyncio.StreamWriter] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._publisher: Optional[tuple] = None
+        self._publish_task: Optional[asyncio.Task] = None
+        self._pending: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=max(1, max_pending))
+
+    def _channel(self, report_id: int) -> str:
+        return f"{self.CHANNEL_PREFIX}{report_id}"
+
+    async def _open(self) -> tuple:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(pack_command(["AUTH", self.password]))
+            await _read_reply(reader)
+        return reader, writer
+
+    async def start(self, deliver: Deliver) -> None:
+        loop = asyncio.get_running_loop()
+        self._listener = loop.create_task(self._listen(deliver))
+        self._publish_task = loop.create_task(self._publish_forever())
+
+    async def _listen(self, deliver: Deliver) -> None:
+        failures = 0
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                self._subscriber = writer
+                if self.channels:
+                    writer.write(pack_command(["SUBSCRIBE", *self.channels]))
+                failures = 0
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        await _dispatch(deliver, reply[2])
+            except (ConnectionError, OSError, RedisError, asyncio.IncompleteReadError) as exc:
+                logger.warning("ws.pubsub_redis_disconnected", extra={"error": str(exc)})
+            finally:
+                self._subscriber = None
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.RECONNECT_DELAYS[min(failures, len(self.RECONNECT_DELAYS) - 1)])
+            failures += 1
+
+    def subscribe(self, report_id: int) -> None:
+        channel = self._channel(report_id)
+        self.channels.add(channel)
+        if self._subscriber is not None:
+            self._subscriber.write(pack_command(["SUBSCRIBE", channel]))
+
+    def unsubscribe(self, report_id: int) -> None:
+        channel = self._channel(report_id)
+        self.channels.discard(channel)
+        if self._subscriber is not None:
+            self._subscriber.write(pack_command(["UNSUBSCRIBE", channel]))
+
+    def _close_publisher(self) -> None:
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+    async def publish(self, report_id: int, envelope: Envelope) -> None:
+        command = pack_command(["PUBLISH", self._channel(report_id), _encode(report_id, envelope)])
+        try:
+            self._pending.put_nowait(command)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning("ws.pubsub_publish_dropped", extra={"dropped": self.dropped})
+
+    async def _publish_forever(self) -> None:
+        while True:
+            batch = [await self._pending.get()]
+            while len(batch) < self.MAX_BATCH and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            try:
+                await self._send_batch(batch)
+            except (ConnectionError, OSError, RedisError, asyncio.IncompleteReadError) as exc:
+                # Replies left unread would be taken for the next batch's: start over
+                self._close_publisher()
+                logger.warning("ws.pubsub_publish_failed", extra={"error": str(exc), "messages": len(batch)})
+
+    async def _send_batch(self, batch: List[bytes]) -> None:
+        """Write the commands in one go, then read one reply per command; one retry on a new connection."""
+        for attempt in (1, 2):
+            try:
+                if self._publisher is None:
+                    self._publisher = await self._open()
+                reader, writer = self._publisher
+                writer.write(b"".join(batch))
+                await writer.drain()
+                for _ in batch:
+                    await _read_reply(reader)
+                return
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                self._close_publisher()
+                if attempt == 2:
+                    raise
+
+    async def stop(self) -> None:
+        for task in (self._listener, self._publish_task):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        self._listener = None
+        self._publish_task = None
+        self._close_publisher()
+
+
+def build_pubsub(name: str, socket_dir: str, redis_url: str) -> PubSub:
+    """Create the backend selected by WS_PUBSUB_BACKEND."""
+    if name == "memory":
+        return InProcessPubSub()
+    if name == "unix":
+        return UnixSocketPubSub(socket_dir)
+    if name == "redis":
+        return RedisPubSub(redis_url)
+    raise ValueError(f"Unknown WS_PUBSUB_BACKEND: {name!r} (expected memory, unix or redis)")
@@ -1,4 +1,5 @@
 import os
+import threading
 import pytest
 import bcrypt
 from unittest.mock import patch
@@ -27,6 +28,8 @@ load_dotenv()
 
 os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
 os.environ.setdefault("GOOGLE_API_KEY", "test-api-key")
+# Tests swap in their own engine; don't open connections to the app DB on startup
+os.environ.setdefault("DB_POOL_WARMUP", "0")
 
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -72,6 +75,23 @@ def db_session(test_db):
     return test_db
 
 
+@pytest.fixture(autouse=True)
+def reset_ai_state():
+    """
+    The analysis cache and AI circuit breaker are process-wide singletons;
+    reset them so a cached result or a tripped breaker from one test never
+    short-circuits the model mock in another.
+    """
+    from app.services.analysis_cache import analysis_cache
+    from app.services.circuit_breaker import gemini_breaker
+
+    analysis_cache.clear()
+    gemini_breaker.reset()
+    yield
+    analysis_cache.clear()
+    gemini_breaker.reset()
+
+
 # -------------------------------------------------------------------
 # FastAPI TestClient with DB override
 # -------------------------------------------------------------------
@@ -197,3 +217,37 @@ def sample_image(db_session, sample_user):
     finally:
         if image_file.exists():
             image_file.unlink()
+
+
+@pytest.fixture
+def media_root(tmp_path, monkeypatch):
+    """
+    Point MEDIA_ROOT (and the upload staging dir under it) at a temp dir so
+    uploads and blobs written by a test never land in backend/media.
+    """
+    root = tmp_path / "media"
+    root.mkdir()
+    for module in (
+        "app.config",
+        "app.services.image_service",
+        "app.services.media_service",
+        "app.services.data_lifecycle_service",
+        "app.routes.auth",
+        "app.routes.public_try",
+    ):
+        monkeypatch.setattr(f"{module}.MEDIA_ROOT", root)
+    monkeypatch.setattr("app.services.image_service.UPLOAD_STAGING_DIR", root / ".staging")
+    return root
+
+
+@pytest.fixture
+def redis_standin():
+    """In-process Redis-protocol server (see tests/redis_standin.py)."""
+    from tests.redis_standin import RedisStandIn
+
+    server = RedisStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,211 @@
+"""
+Tiny in-process Redis-protocol server for tests.
+
+Implements just the commands the app uses: strings with PX TTL, sorted sets,
+hashes, WATCH/MULTI/EXEC and PUBLISH/SUBSCRIBE. Use the redis_standin
+fixture from conftest.py.
+"""
+import socket
+import socketserver
+import threading
+import time
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """Tiny Redis-protocol server: strings with PX TTL, sorted sets, hashes, WATCH/MULTI/EXEC, pub/sub."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.lock = threading.Lock()
+        self.strings = {}  # key -> (value, expires_at or None)
+        self.zsets = {}
+        self.hashes = {}
+        self.versions = {}
+        self.subscribers = {}  # channel -> set of handlers
+        self.published = []  # (channel, payload) log for assertions
+
+    def touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def live(self, key):
+        entry = self.strings.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self.strings[key]
+            self.touch(key)
+            return None
+        return entry
+
+    def run(self, args, state, handler):
+        name, *rest = args
+        name = name.upper()
+        if name == "WATCH":
+            state["watch"].update({key: self.versions.get(key, 0) for key in rest})
+            return "+OK"
+        if name == "UNWATCH":
+            state["watch"].clear()
+            return "+OK"
+        if name == "MULTI":
+            state["queue"] = []
+            return "+OK"
+        if name == "EXEC":
+            queue, state["queue"] = state["queue"], None
+            watched, state["watch"] = state["watch"], {}
+            if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                return None
+            return [self.command(cmd) for cmd in queue]
+        if state["queue"] is not None:
+            state["queue"].append(args)
+            return "+QUEUED"
+        if name in ("SUBSCRIBE", "UNSUBSCRIBE"):
+            return self.subscription(name, rest, handler)
+        return self.command(args)
+
+    def subscription(self, name, channels, handler):
+        """Each (un)subscribe is confirmed with its own push, as Redis does."""
+        for channel in channels:
+            subscribers = self.subscribers.setdefault(channel, set())
+            if name == "SUBSCRIBE":
+                subscribers.add(handler)
+                handler.channels.add(channel)
+            else:
+                subscribers.discard(handler)
+                handler.channels.discard(channel)
+            handler.push([name.lower(), channel, len(handler.channels)])
+        return _NO_REPLY
+
+    def command(self, args):
+        name, *rest = args
+        name = name.upper()
+        if name == "PING":
+            return "+PONG"
+        if name == "PUBLISH":
+            channel, payload = rest
+            self.published.append((channel, payload))
+            receivers = list(self.subscribers.get(channel, ()))
+            for handler in receivers:
+                handler.push(["message", channel, payload])
+            return len(receivers)
+        if name == "GET":
+            entry = self.live(rest[0])
+            return entry[0] if entry else None
+        if name == "SET":
+            key, value, *opts = rest
+            opts = [opt.upper() for opt in opts]
+            existing = self.live(key)
+            if "XX" in opts and existing is None:
+                return None
+            expires_at = None
+            if "PX" in opts:
+                expires_at = time.time() + int(opts[opts.index("PX") + 1]) / 1000
+            elif "KEEPTTL" in opts and existing:
+                expires_at = existing[1]
+            self.strings[key] = (value, expires_at)
+            self.touch(key)
+            return "+OK"
+        if name == "DEL":
+            removed = sum(1 for key in rest if self.strings.pop(key, None) is not None)
+            for key in rest:
+                self.touch(key)
+            return removed
+        if name == "ZADD":
+            key, score, member = rest
+            self.zsets.setdefault(key, {})[member] = float(score)
+            return 1
+        if name in ("ZRANGE", "ZRANGEBYSCORE"):
+            members = sorted(self.zsets.get(rest[0], {}).items(), key=lambda item: item[1])
+            if name == "ZRANGEBYSCORE":
+                high = float(rest[2])
+                return [member for member, score in members if score <= high]
+            start, stop = int(rest[1]), int(rest[2])
+            return [member for member, _ in members][start:None if stop == -1 else stop + 1]
+        if name == "ZCARD":
+            return len(self.zsets.get(rest[0], {}))
+        if name == "ZREM":
+            zset = self.zsets.get(rest[0], {})
+            return sum(1 for member in rest[1:] if zset.pop(member, None) is not None)
+        if name == "HSET":
+            self.hashes.setdefault(rest[0], {})[rest[1]] = rest[2]
+            return 1
+        if name == "HGET":
+            return self.hashes.get(rest[0], {}).get(rest[1])
+        if name == "HDEL":
+            table = self.hashes.get(rest[0], {})
+            return sum(1 for field in rest[1:] if table.pop(field, None) is not None)
+        return f"-ERR unknown command '{name}'"
+
+    def drop_clients(self):
+        """Sever every subscriber connection, as a Redis restart would."""
+        with self.lock:
+            handlers = {handler for subscribers in self.subscribers.values() for handler in subscribers}
+            self.subscribers.clear()
+        for handler in handlers:
+            # shutdown() rather than close(): it also wakes the handler's blocked read
+            try:
+                handler.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+_NO_REPLY = object()
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.channels = set()
+
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def write(self, reply):
+        if reply is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(reply, int):
+            self.wfile.write(b":%d\r\n" % reply)
+        elif isinstance(reply, list):
+            self.wfile.write(b"*%d\r\n" % len(reply))
+            for item in reply:
+                self.write(item)
+        elif reply.startswith(("+", "-")):
+            self.wfile.write(reply.encode() + b"\r\n")
+        else:
+            data = reply.encode()
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(data), data))
+
+    def push(self, reply):
+        """Write a reply, possibly from another connection's thread (pub/sub)."""
+        try:
+            with self.write_lock:
+                self.write(reply)
+        except OSError:
+            pass
+
+    def handle(self):
+        state = {"watch": {}, "queue": None}
+        try:
+            while True:
+                try:
+                    args = self.read_command()
+                except (OSError, ValueError):
+                    return
+                if args is None:
+                    return
+                with self.server.lock:
+                    reply = self.server.run(args, state, self)
+                if reply is not _NO_REPLY:
+                    self.push(reply)
+        finally:
+            with self.server.lock:
+                for channel in self.channels:
+                    self.server.subscribers.get(channel, set()).discard(self)
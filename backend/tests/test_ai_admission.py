@@ -0,0 +1,93 @@
+"""
+Tests for AI admission control (concurrency cap, pacing and queue timeouts).
+"""
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from app.services.ai_admission import AdmissionController, AdmissionTimeout
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    controller = AdmissionController("test", max_concurrent=2, queue_timeout=1)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with controller.slot():
+            peak = max(peak, controller.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(6)))
+
+    assert peak == 2
+    stats = controller.stats()
+    assert stats["admitted"] == 6
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["max_wait_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_queue_wait_timeout_raises():
+    controller = AdmissionController("test", max_concurrent=1, queue_timeout=0.01)
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionTimeout):
+        async with controller.slot():
+            pass
+
+    release.set()
+    await holder
+    assert controller.stats()["rejected"] == 1
+
+    # The slot is usable again once the holder finishes
+    async with controller.slot():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_calls():
+    controller = AdmissionController("test", max_concurrent=10, rate_per_second=100, burst=1, queue_timeout=1)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    for _ in range(3):
+        async with controller.slot():
+            pass
+
+    # One burst token, then two more at 10ms intervals
+    assert loop.time() - start >= 0.015
+
+
+@pytest.mark.asyncio
+async def test_gemini_analysis_admission_timeout_uses_timeout_fallback(tmp_path):
+    from app.services.gemini_service import GeminiService
+
+    image_path = tmp_path / "lesion.jpg"
+    image_path.write_bytes(b"busy image bytes")
+    busy = AdmissionController("analysis", max_concurrent=0, queue_timeout=0.01)
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai, \
+                patch("app.services.gemini_service.analysis_admission", busy):
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(return_value=Mock(text="{}"))
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            result = await service.analyze_skin_lesion(str(image_path))
+
+    assert result["status"] == "error"
+    assert result["error"] == "TIMEOUT"
+    mock_model.generate_content_async.assert_not_called()
@@ -5,6 +5,7 @@ from app.services.gemini_service import GeminiService
 from app.main import app
 from app.models import User
 from app.auth_helpers import get_current_user
+from tests.conftest import TestingSessionLocal
 import os
 
 @pytest.mark.asyncio
@@ -88,7 +89,8 @@ def test_analysis_route_fallback(client, test_db):
             "message": "Timed out"
         })
         
-        with patch('app.routes.analysis.get_gemini_service', return_value=mock_service):
+        with patch('app.routes.analysis.get_gemini_service', return_value=mock_service), \
+                patch('app.routes.analysis.SessionLocal', TestingSessionLocal):
             url = f"/api/analysis/{image.id}"
             print(f"DEBUG: Testing URL: {url}")
             response = client.post(url)
@@ -0,0 +1,136 @@
+"""
+Tests for the content-addressed AI analysis cache.
+"""
+import os
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from app.services.analysis_cache import AnalysisCache, analysis_digest
+
+
+class TestAnalysisCache:
+    def test_digest_depends_on_bytes_model_and_prompt(self):
+        base = analysis_digest(b"image", "model-a", "prompt")
+        assert base == analysis_digest(b"image", "model-a", "prompt")
+        assert base != analysis_digest(b"other", "model-a", "prompt")
+        assert base != analysis_digest(b"image", "model-b", "prompt")
+        assert base != analysis_digest(b"image", "model-a", "prompt v2")
+
+    def test_hit_returns_independent_copy(self):
+        cache = AnalysisCache(max_entries=4, ttl_seconds=60)
+        cache.set("abc", {"status": "success", "condition": "Nevus"})
+
+        first = cache.get("abc")
+        first["report_id"] = 1
+        second = cache.get("abc")
+
+        assert "report_id" not in second
+        assert cache.stats()["hits"] == 2
+
+    def test_lru_eviction(self):
+        cache = AnalysisCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", {"n": 1})
+        cache.set("b", {"n": 2})
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", {"n": 3})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"n": 1}
+        assert cache.get("c") == {"n": 3}
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        cache = AnalysisCache(max_entries=4, ttl_seconds=60)
+        with patch("app.services.analysis_cache.time.monotonic", return_value=1000.0):
+            cache.set("a", {"n": 1})
+        with patch("app.services.analysis_cache.time.monotonic", return_value=1061.0):
+            assert cache.get("a") is None
+        assert cache.stats()["misses"] == 1
+
+    def test_disabled_cache_never_hits(self):
+        cache = AnalysisCache(max_entries=0, ttl_seconds=60)
+        cache.set("a", {"n": 1})
+        assert cache.get("a") is None
+
+    def test_disk_tier_survives_memory_clear(self, tmp_path):
+        cache = AnalysisCache(max_entries=4, ttl_seconds=60, disk_dir=tmp_path)
+        cache.set("abcdef", {"n": 1})
+        cache.clear()
+
+        assert cache.get("abcdef") == {"n": 1}
+        assert cache.stats()["disk_hits"] == 1
+        assert (tmp_path / "ab" / "abcdef.json").exists()
+
+    def test_disk_hit_keeps_the_stored_expiry(self, tmp_path):
+        import time
+
+        cache = AnalysisCache(max_entries=4, ttl_seconds=60, disk_dir=tmp_path)
+        cache.set("abcdef", {"n": 1})
+        written = time.time() - 50
+        os.utime(tmp_path / "ab" / "abcdef.json", (written, written))
+        cache.clear()
+
+        assert cache.get("abcdef") == {"n": 1}
+        expires_at, _ = cache._entries["abcdef"]
+        assert expires_at - time.monotonic() <= 10
+
+    def test_disk_tier_is_bounded_oldest_first(self, tmp_path):
+        import time
+
+        cache = AnalysisCache(max_entries=4, ttl_seconds=3600, disk_dir=tmp_path, disk_max_entries=10)
+        now = time.time()
+        for n in range(10):
+            digest = f"{n:02d}cafe"
+            cache.set(digest, {"n": n})
+            os.utime(tmp_path / digest[:2] / f"{digest}.json", (now - 100 + n, now - 100 + n))
+
+        cache.set("10cafe", {"n": 10})
+
+        remaining = sorted(path.stem for path in tmp_path.glob("*/*.json"))
+        assert remaining == [f"{n:02d}cafe" for n in range(2, 11)]
+        assert cache.stats()["disk_evictions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_gemini_service_skips_model_on_repeat_image(tmp_path):
+    from app.services.gemini_service import GeminiService
+
+    image_path = tmp_path / "lesion.jpg"
+    image_path.write_bytes(b"same image bytes")
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(
+                return_value=Mock(text='{"condition": "Nevus", "confidence": 90}')
+            )
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            first = await service.analyze_skin_lesion(str(image_path))
+            second = await service.analyze_skin_lesion(str(image_path))
+
+    assert first == second
+    assert second["condition"] == "Nevus"
+    mock_model.generate_content_async.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_gemini_service_does_not_cache_errors(tmp_path):
+    from app.services.gemini_service import GeminiService
+
+    image_path = tmp_path / "lesion.jpg"
+    image_path.write_bytes(b"flaky image bytes")
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            await service.analyze_skin_lesion(str(image_path))
+            await service.analyze_skin_lesion(str(image_path))
+
+    assert mock_model.generate_content_async.call_count == 2
@@ -0,0 +1,232 @@
+"""
+Tests for the background analysis job queue and the 202 Accepted analyze mode.
+"""
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.auth_helpers import get_current_user
+from app.config import MEDIA_ROOT
+from app.db import Base
+from app.main import app
+from app.models import AnalysisReport, ChatMessage, Image, User
+from app.services.analysis_jobs import AnalysisJobQueue, QueueFullError, analysis_job_queue
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_round_robin_across_owners():
+    queue = AnalysisJobQueue(workers=1, max_depth=10, max_per_owner=5)
+    order = []
+
+    def make_job(label):
+        async def run():
+            order.append(label)
+            return label
+        return run
+
+    jobs = [
+        queue.submit(1, make_job("p1-a")),
+        queue.submit(1, make_job("p1-b")),
+        queue.submit(1, make_job("p1-c")),
+        queue.submit(2, make_job("p2-a")),
+    ]
+    while any(job.is_active for job in jobs):
+        await asyncio.sleep(0.001)
+
+    assert order == ["p1-a", "p2-a", "p1-b", "p1-c"]
+    assert queue.stats()["completed"] == 4
+    assert jobs[0].to_dict()["result"] == "p1-a"
+
+
+@pytest.mark.asyncio
+async def test_queue_rejects_when_full():
+    queue = AnalysisJobQueue(workers=1, max_depth=2, max_per_owner=1)
+    blocker = asyncio.Event()
+
+    async def wait():
+        await blocker.wait()
+
+    queue.submit(1, wait)
+    await asyncio.sleep(0)  # worker picks up the first job
+    queue.submit(1, wait)
+
+    with pytest.raises(QueueFullError):
+        queue.submit(1, wait)  # per-owner limit
+    queue.submit(2, wait)
+    with pytest.raises(QueueFullError):
+        queue.submit(3, wait)  # total depth
+
+    assert queue.stats()["rejected"] == 2
+    blocker.set()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error():
+    queue = AnalysisJobQueue(workers=1)
+
+    async def boom():
+        raise RuntimeError("model exploded")
+
+    job = queue.submit(1, boom)
+    while job.is_active:
+        await asyncio.sleep(0.001)
+
+    assert job.status == "failed"
+    assert "model exploded" in job.error
+    assert queue.stats()["failed"] == 1
+
+
+def test_async_mode_returns_202_and_completes(client, test_db):
+    patient = User(email="queued@test.com", password="x", role="patient")
+    test_db.add(patient)
+    test_db.commit()
+
+    file_name = "queued_analysis_test.png"
+    file_path = MEDIA_ROOT / file_name
+    file_path.write_bytes(b"fake image data")
+    image = Image(patient_id=patient.id, image_url=file_name)
+    test_db.add(image)
+    test_db.commit()
+
+    mock_service = MagicMock()
+    mock_service.analyze_skin_lesion = AsyncMock(return_value={
+        "status": "success", "condition": "Nevus", "confidence": 80,
+    })
+
+    app.dependency_overrides[get_current_user] = lambda: patient
+    try:
+        with patch("app.routes.analysis.get_gemini_service", return_value=mock_service), \
+                patch("app.routes.analysis.SessionLocal", TestingSessionLocal):
+            response = client.post(f"/api/analysis/{image.id}?mode=async")
+            assert response.status_code == 202
+            payload = response.json()
+            assert payload["status"] in ("queued", "running", "completed")
+            assert payload["report_id"]
+
+            job_status = payload
+            deadline = time.monotonic() + 5
+            while job_status["status"] != "completed" and time.monotonic() < deadline:
+                time.sleep(0.01)
+                job_status = client.get(payload["status_url"]).json()
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        if file_path.exists():
+            file_path.unlink()
+
+    assert job_status["status"] == "completed"
+    assert job_status["result"]["condition"] == "Nevus"
+    assert job_status["result"]["report_id"] == payload["report_id"]
+
+    test_db.expire_all()
+    reports = test_db.query(AnalysisReport).filter(AnalysisReport.image_id == image.id).all()
+    assert len(reports) == 1
+    assert test_db.query(ChatMessage).filter(ChatMessage.report_id == reports[0].id).count() == 1
+
+
+def test_job_status_hidden_from_other_patients(client):
+    other = User(id=999, email="other@test.com", role="patient")
+    app.dependency_overrides[get_current_user] = lambda: other
+    try:
+        response = client.get("/api/analysis/jobs/does-not-exist")
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_concurrent_async_requests_queue_one_job(tmp_path):
+    from app.routes.analysis import analyze_image
+
+    # File-backed so each request session gets its own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    setup_db = Session()
+    patient = User(email="twice@test.com", password="x", role="patient")
+    setup_db.add(patient)
+    setup_db.commit()
+    file_path = MEDIA_ROOT / "queued_twice_test.png"
+    file_path.write_bytes(b"fake image data")
+    image = Image(patient_id=patient.id, image_url=file_path.name)
+    setup_db.add(image)
+    setup_db.commit()
+
+    # Hold the job open until both requests have answered
+    both_answered = asyncio.Event()
+
+    async def analyze(*args, **kwargs):
+        await both_answered.wait()
+        return {"status": "success", "condition": "Nevus", "confidence": 80}
+
+    mock_service = MagicMock()
+    mock_service.analyze_skin_lesion = AsyncMock(side_effect=analyze)
+
+    request_dbs = [Session(), Session()]
+    try:
+        with patch("app.routes.analysis.get_gemini_service", return_value=mock_service), \
+                patch("app.routes.analysis.SessionLocal", Session):
+            first, second = await asyncio.gather(*(
+                analyze_image(image.id, mode="async", db=db, current_user=patient) for db in request_dbs
+            ))
+            both_answered.set()
+            job_id = json.loads(first.body)["job_id"]
+            job = analysis_job_queue.get(job_id)
+            while job.is_active:
+                await asyncio.sleep(0.001)
+
+        assert json.loads(second.body)["job_id"] == job_id
+        assert mock_service.analyze_skin_lesion.await_count == 1
+        assert setup_db.query(AnalysisReport).filter(AnalysisReport.image_id == image.id).count() == 1
+    finally:
+        for db in request_dbs:
+            db.close()
+        setup_db.close()
+        engine.dispose()
+        file_path.unlink(missing_ok=True)
+
+
+@pytest.mark.asyncio
+async def test_failed_job_stores_and_pushes_the_fallback(test_db):
+    from app.routes.analysis import analyze_image
+
+    patient = User(email="crash@test.com", password="x", role="patient")
+    test_db.add(patient)
+    test_db.commit()
+    file_path = MEDIA_ROOT / "queued_crash_test.png"
+    file_path.write_bytes(b"fake image data")
+    image = Image(patient_id=patient.id, image_url=file_path.name)
+    test_db.add(image)
+    test_db.commit()
+
+    mock_service = MagicMock()
+    mock_service.analyze_skin_lesion = AsyncMock(side_effect=RuntimeError("model exploded"))
+    broadcast = AsyncMock()
+
+    try:
+        with patch("app.routes.analysis.get_gemini_service", return_value=mock_service), \
+                patch("app.routes.analysis.SessionLocal", TestingSessionLocal), \
+                patch("app.routes.analysis.ws_manager.broadcast_to_report", broadcast):
+            response = await analyze_image(image.id, mode="async", db=test_db, current_user=patient)
+            payload = json.loads(response.body)
+            job = analysis_job_queue.get(payload["job_id"])
+            while job.is_active:
+                await asyncio.sleep(0.001)
+    finally:
+        file_path.unlink(missing_ok=True)
+
+    assert job.status == "failed"
+    test_db.expire_all()
+    report = test_db.get(AnalysisReport, payload["report_id"])
+    assert report.condition == "Analysis Unavailable"
+    (report_id, frame), _ = broadcast.await_args
+    assert report_id == report.id
+    assert frame["type"] == "analysis_complete"
+    assert frame["analysis"]["is_fallback"] is True
@@ -0,0 +1,86 @@
+"""
+Tests for the bounded chat context window and rolling summary.
+"""
+import json
+from types import SimpleNamespace
+
+from app.models import AnalysisReport, ChatMessage, Image, User
+from app.services.chat_context import estimate_tokens, fold_history, load_chat_context
+
+
+def _msg(role, text):
+    return SimpleNamespace(sender_role=role, message=text)
+
+
+def test_fold_keeps_last_turns_verbatim():
+    messages = [_msg("patient" if i % 2 == 0 else "ai", f"Message {i}. More detail.") for i in range(6)]
+
+    summary, recent, folded = fold_history(None, messages, max_turns=4, token_budget=1000)
+
+    assert folded == 2
+    assert recent == messages[2:]
+    assert summary == "Patient: Message 0\nAI Assistant: Message 1"
+
+
+def test_fold_respects_token_budget():
+    messages = [_msg("patient", "x" * 400) for _ in range(5)]
+
+    summary, recent, folded = fold_history(None, messages, max_turns=10, token_budget=300)
+
+    assert len(recent) == 2
+    assert folded == 3
+    assert estimate_tokens(summary) <= 300 // 4
+
+
+def test_fold_extends_existing_summary():
+    summary, recent, folded = fold_history("Patient: Earlier question", [_msg("doctor", "Noted")], max_turns=0)
+
+    assert summary == "Patient: Earlier question\nDoctor (Human): Noted"
+    assert recent == [] and folded == 1
+
+
+def test_load_chat_context_updates_summary_incrementally(test_db, monkeypatch):
+    monkeypatch.setattr("app.services.chat_context.CHAT_HISTORY_MAX_TURNS", 2)
+
+    patient = User(email="ctx@test.com", password="x", role="patient")
+    test_db.add(patient)
+    test_db.commit()
+    image = Image(patient_id=patient.id, image_url="tests/ctx.png")
+    test_db.add(image)
+    test_db.commit()
+    report = AnalysisReport(image_id=image.id, patient_id=patient.id, report_json=json.dumps({}))
+    test_db.add(report)
+    test_db.commit()
+
+    for i in range(4):
+        test_db.add(ChatMessage(report_id=report.id, sender_role="patient", message=f"Question {i}"))
+    test_db.commit()
+
+    summary, recent = load_chat_context(test_db, report)
+    test_db.commit()
+    assert [m.message for m in recent] == ["Question 2", "Question 3"]
+    assert summary == "Patient: Question 0\nPatient: Question 1"
+    first_cursor = report.chat_summary_upto_id
+
+    test_db.add(ChatMessage(report_id=report.id, sender_role="ai", message="Answer"))
+    test_db.commit()
+
+    summary, recent = load_chat_context(test_db, report)
+    assert [m.message for m in recent] == ["Question 3", "Answer"]
+    assert summary.endswith("Patient: Question 2")
+    assert report.chat_summary_upto_id > first_cursor
+
+
+def test_prompt_includes_summary_and_bounded_history():
+    from unittest.mock import patch
+    from app.services.gemini_service import GeminiService
+
+    with patch("app.services.gemini_service.genai"), patch.dict("os.environ", {"GOOGLE_API_KEY": "k"}):
+        service = GeminiService()
+
+    history = [_msg("patient", f"Turn {i}") for i in range(30)]
+    prompt = service._build_chat_prompt({"condition": "Nevus"}, "Hi", history, summary="Patient: Old question")
+
+    assert "Summary of earlier conversation:\nPatient: Old question" in prompt
+    assert "Patient: Turn 29" in prompt
+    assert "Patient: Turn 0\n" not in prompt.split("Previous Conversation:")[1]
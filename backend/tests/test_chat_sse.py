@@ -0,0 +1,103 @@
+"""
+Tests for the Server-Sent Events mode of the REST chat endpoints.
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.auth_helpers import get_current_user
+from app.main import app
+from app.models import AnalysisReport, ChatMessage
+from app.services.mock_gemini_service import MockGeminiService
+from app.services.public_session_store import public_session_store
+
+
+def _parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def chat_report(db_session, sample_image, sample_user):
+    app.dependency_overrides[get_current_user] = lambda: sample_user
+    report = AnalysisReport(
+        image_id=sample_image.id,
+        patient_id=sample_user.id,
+        report_json=json.dumps({"condition": "Nevus", "confidence": 90}),
+    )
+    db_session.add(report)
+    db_session.commit()
+    yield report
+    app.dependency_overrides = {}
+
+
+def test_chat_stream_emits_deltas_then_done(client, db_session, sample_image, chat_report):
+    report_id = chat_report.id
+    with patch("app.routes.analysis.get_gemini_service", return_value=MockGeminiService()):
+        response = client.post(
+            f"/api/analysis/{sample_image.id}/chat?stream=true",
+            json={"message": "Is this serious?"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_events(response.text)
+    deltas = [data["delta"] for name, data in events if name == "delta"]
+    name, done = events[-1]
+
+    assert len(deltas) > 1
+    assert name == "done"
+    assert done["ai_response"] == "".join(deltas)
+    assert done["context_used"] is True
+
+    ai_messages = db_session.query(ChatMessage).filter(
+        ChatMessage.report_id == report_id, ChatMessage.sender_role == "ai"
+    ).all()
+    assert [m.id for m in ai_messages] == [done["message_id"]]
+
+
+def test_chat_stream_via_accept_header_when_doctor_active(client, db_session, sample_image, chat_report):
+    chat_report.doctor_active = True
+    db_session.commit()
+
+    with patch("app.routes.analysis.get_gemini_service") as factory:
+        response = client.post(
+            f"/api/analysis/{sample_image.id}/chat",
+            json={"message": "Hello doctor"},
+            headers={"Accept": "text/event-stream"},
+        )
+
+    events = _parse_events(response.text)
+    assert events == [("done", {
+        "image_id": sample_image.id,
+        "user_message": "Hello doctor",
+        "ai_response": "Message sent to doctor.",
+        "context_used": False,
+    })]
+    factory.assert_not_called()
+
+
+def test_public_chat_stream_records_reply(client):
+    public_session_store.clear()
+    session_id = public_session_store.create_session({"condition": "Benign lesion", "confidence": 70})
+
+    with patch("app.routes.public_try.get_gemini_service", return_value=MockGeminiService()):
+        response = client.post(
+            "/public/try/chat?stream=true",
+            json={"session_id": session_id, "message": "Should I worry?"},
+        )
+
+    events = _parse_events(response.text)
+    name, done = events[-1]
+    assert name == "done"
+    assert done["session_id"] == session_id
+    assert done["reply"] == "".join(data["delta"] for n, data in events if n == "delta")
+
+    messages = public_session_store.get_session(session_id)["messages"]
+    assert [m.sender_role for m in messages] == ["patient", "ai"]
+    assert messages[-1].message == done["reply"]
+    public_session_store.clear()
@@ -0,0 +1,146 @@
+"""
+Tests for streaming AI chat replies (service streaming + WebSocket ai_delta frames).
+"""
+import json
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models import AnalysisReport, ChatMessage, Image, User
+from app.services.auth import create_access_token
+
+
+class _FakeStream:
+    """Mimics the async-iterable response returned by generate_content_async(stream=True)."""
+
+    def __init__(self, chunks, error=None):
+        self._chunks = chunks
+        self._error = error
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for text in self._chunks:
+            yield MagicMock(text=text)
+        if self._error:
+            raise self._error
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+@pytest.mark.asyncio
+async def test_gemini_stream_yields_chunks():
+    from app.services.gemini_service import GeminiService
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(return_value=_FakeStream(["Hello ", "there"]))
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            chunks = await _collect(service.stream_chat_about_lesion({"condition": "Nevus"}, "Hi"))
+
+    assert chunks == ["Hello ", "there"]
+    assert mock_model.generate_content_async.call_args.kwargs["stream"] is True
+
+
+@pytest.mark.asyncio
+async def test_gemini_stream_falls_back_when_nothing_produced():
+    from app.services.gemini_service import CHAT_UNAVAILABLE_REPLY, GeminiService
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            chunks = await _collect(service.stream_chat_about_lesion({}, "Hi"))
+
+    assert chunks == [CHAT_UNAVAILABLE_REPLY]
+
+
+@pytest.mark.asyncio
+async def test_gemini_stream_keeps_partial_reply_on_midstream_error():
+    from app.services.gemini_service import GeminiService
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(
+                return_value=_FakeStream(["Partial "], error=RuntimeError("stream reset"))
+            )
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            chunks = await _collect(service.stream_chat_about_lesion({}, "Hi"))
+
+    assert chunks == ["Partial "]
+
+
+@pytest.mark.asyncio
+async def test_mock_stream_matches_full_reply():
+    from app.services.mock_gemini_service import MockGeminiService
+
+    service = MockGeminiService()
+    context = {"condition": "Test Condition", "confidence": 80}
+    chunks = await _collect(service.stream_chat_about_lesion(context, "Is this serious?"))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == await service.chat_about_lesion(context, "Is this serious?")
+
+
+def test_websocket_streams_ai_deltas_then_persists_once(client, test_db):
+    from app.services.mock_gemini_service import MockGeminiService
+
+    patient = User(email="stream@test.com", password="x", role="patient")
+    test_db.add(patient)
+    test_db.commit()
+    image = Image(patient_id=patient.id, image_url="tests/stream.png")
+    test_db.add(image)
+    test_db.commit()
+    report = AnalysisReport(
+        image_id=image.id,
+        patient_id=patient.id,
+        report_json=json.dumps({"condition": "Nevus", "confidence": 90}),
+    )
+    test_db.add(report)
+    test_db.commit()
+    report_id = report.id
+
+    def override_get_db():
+        yield test_db
+
+    token = create_access_token({"sub": str(patient.id), "role": "patient"})
+
+    with patch("app.routes.websocket.get_db", override_get_db), \
+            patch("app.services.gemini_service.get_gemini_service", return_value=MockGeminiService()):
+        with client.websocket_connect(f"/ws/chat/{report_id}") as ws:
+            ws.send_json({"token": token})
+            assert ws.receive_json()["type"] == "connected"
+
+            ws.send_json({"type": "message", "message": "Should I worry?"})
+            assert ws.receive_json()["sender_role"] == "patient"
+
+            deltas = []
+            frame = ws.receive_json()
+            while frame["type"] == "ai_delta":
+                deltas.append(frame)
+                frame = ws.receive_json()
+
+    assert len(deltas) > 1
+    assert len({d["stream_id"] for d in deltas}) == 1
+    assert frame["type"] == "new_message"
+    assert frame["stream_id"] == deltas[0]["stream_id"]
+    assert frame["message"] == "".join(d["delta"] for d in deltas)
+
+    ai_messages = test_db.query(ChatMessage).filter(
+        ChatMessage.report_id == report_id, ChatMessage.sender_role == "ai"
+    ).all()
+    assert len(ai_messages) == 1
+    assert ai_messages[0].message == frame["message"]
@@ -0,0 +1,142 @@
+"""
+Tests for the AI provider circuit breaker.
+"""
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    gemini_breaker,
+)
+
+
+def _breaker(**overrides):
+    options = dict(failure_rate_threshold=0.5, min_calls=4, window_size=10, slow_call_seconds=5, open_seconds=30)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+class TestCircuitBreaker:
+    def test_opens_after_error_rate_threshold(self):
+        breaker = _breaker()
+        breaker.record_success(0.1)
+        breaker.record_success(0.1)
+        breaker.record_failure()
+        assert breaker.state == CLOSED  # below min_calls
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.allow_request() is False
+        assert breaker.stats()["rejected"] == 1
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = _breaker(min_calls=2)
+        breaker.record_success(6)
+        breaker.record_success(7)
+        assert breaker.state == OPEN
+
+    def test_half_open_probe_closes_on_success(self):
+        breaker = _breaker(min_calls=1)
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+        assert breaker.state == OPEN
+
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=131.0):
+            assert breaker.allow_request() is True
+            assert breaker.state == HALF_OPEN
+            assert breaker.allow_request() is False  # only one probe at a time
+            breaker.record_success(0.1)
+
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe_failure_reopens(self):
+        breaker = _breaker(min_calls=1)
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=131.0):
+            assert breaker.allow_request() is True
+            breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.stats()["times_opened"] == 2
+
+    @pytest.mark.asyncio
+    async def test_guard_fails_fast_while_open(self):
+        breaker = _breaker(min_calls=1)
+        with pytest.raises(RuntimeError):
+            async with breaker.guard():
+                raise RuntimeError("upstream 503")
+
+        with pytest.raises(CircuitOpenError):
+            async with breaker.guard():
+                pytest.fail("call should not run while the circuit is open")
+
+    @pytest.mark.asyncio
+    async def test_guard_ignores_listed_exceptions(self):
+        breaker = _breaker(min_calls=1)
+        with pytest.raises(KeyError):
+            async with breaker.guard(ignore=(KeyError,)):
+                raise KeyError("local problem")
+        assert breaker.state == CLOSED
+
+
+    @pytest.mark.asyncio
+    async def test_time_waiting_before_start_clock_is_not_slow(self):
+        breaker = _breaker(min_calls=1)
+        with patch("app.services.circuit_breaker.time.monotonic", side_effect=[0.0, 9.0, 10.0]):
+            async with breaker.guard() as call:
+                call.start_clock()  # Admitted after 9s queued locally; the call took 1s
+        assert breaker.state == CLOSED
+        assert breaker.stats()["failure_rate"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_is_judged_by_time_to_first_chunk(self):
+        breaker = _breaker(min_calls=1)
+        with patch("app.services.circuit_breaker.time.monotonic", side_effect=[0.0, 1.0]):
+            async with breaker.guard() as call:
+                call.responded()  # First chunk after 1s; the stream then runs long
+        assert breaker.state == CLOSED
+        assert breaker.stats()["window_calls"] == 1
+
+        with pytest.raises(RuntimeError):
+            async with breaker.guard() as call:
+                call.responded()
+                raise RuntimeError("stream cut off mid-reply")
+        assert breaker.state == CLOSED
+
+@pytest.mark.asyncio
+async def test_open_circuit_skips_model_call(tmp_path):
+    from app.services.gemini_service import GeminiService
+
+    image_path = tmp_path / "lesion.jpg"
+    image_path.write_bytes(b"degraded provider bytes")
+
+    for _ in range(gemini_breaker.min_calls):
+        gemini_breaker.record_failure()
+    assert gemini_breaker.state == OPEN
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock()
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            result = await service.analyze_skin_lesion(str(image_path))
+            reply = await service.chat_about_lesion({"condition": "Nevus"}, "Hello?")
+
+    assert result["status"] == "error"
+    assert result["error"] == "CIRCUIT_OPEN"
+    assert "trouble" in reply
+    mock_model.generate_content_async.assert_not_called()
+
+
+def test_health_reports_circuit_state(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["ai_circuit"]["state"] == CLOSED
@@ -38,6 +38,7 @@ from app.services.data_lifecycle_service import (
     anonymize_patient_chat_messages,
     cleanup_expired_data,
     delete_patient_images,
+    media_reference_count,
 )
 
 
@@ -365,6 +366,65 @@ class TestAccountDeletion:
         assert report.condition == "Eczema"  # Stats preserved
 
 
+# ============================================================================
+# Shared (Content-Addressed) Media Tests
+# ============================================================================
+
+def _store_blob(content):
+    from app.config import MEDIA_ROOT
+    from app.services.image_service import store_existing_file
+
+    source = MEDIA_ROOT / "shared_source.png"
+    source.parent.mkdir(parents=True, exist_ok=True)
+    source.write_bytes(content)
+    try:
+        return store_existing_file(source)
+    finally:
+        source.unlink()
+
+
+class TestSharedMedia:
+    """Blobs shared by identical uploads are only removed with their last reference."""
+
+    def test_deletion_keeps_blob_referenced_by_another_patient(self, db_session, patient_user, doctor_user):
+        from app.config import MEDIA_ROOT
+
+        blob = _store_blob(b"\x89PNG\r\n\x1a\nshared-lesion")
+        other = User(email="other@test.com", password="x", role="patient")
+        db_session.add(other)
+        db_session.commit()
+        db_session.add_all([
+            Image(patient_id=patient_user.id, image_url=blob),
+            Image(patient_id=patient_user.id, image_url=blob),
+            Image(patient_id=other.id, image_url=blob),
+        ])
+        db_session.commit()
+
+        result = delete_patient_account(db_session, patient_user.id)
+
+        assert result["media_deleted"] == 0
+        assert (MEDIA_ROOT / blob).exists()
+        assert media_reference_count(db_session, blob) == 1
+
+        result = delete_patient_account(db_session, other.id)
+
+        assert result["media_deleted"] == 1
+        assert not (MEDIA_ROOT / blob).exists()
+
+    def test_safe_delete_file_checks_references(self, db_session, patient_user):
+        from app.config import MEDIA_ROOT
+
+        blob = _store_blob(b"\x89PNG\r\n\x1a\nreferenced")
+        image = Image(patient_id=patient_user.id, image_url=blob)
+        db_session.add(image)
+        db_session.commit()
+
+        assert safe_delete_file(blob, db=db_session) is False
+        assert (MEDIA_ROOT / blob).exists()
+        assert safe_delete_file(blob, db=db_session, exclude_image_ids=[image.id]) is True
+        assert not (MEDIA_ROOT / blob).exists()
+
+
 # ============================================================================
 # Retention Cleanup Tests
 # ============================================================================
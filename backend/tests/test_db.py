@@ -2,6 +2,10 @@
 B2 Tests: Database configuration and session management
 Tests for app/db.py
 """
+import asyncio
+import threading
+import time
+
 import pytest
 from sqlalchemy.orm import Session
 
@@ -90,3 +94,97 @@ def test_database_connection_string():
     # Check that the URL is accessible
     engine_url = str(engine.url)
     assert len(engine_url) > 0
+
+
+@pytest.mark.asyncio
+async def test_run_db_runs_off_the_event_loop_thread(test_db):
+    """Test that run_db executes Session work in a worker thread"""
+    from app.db import run_db
+
+    loop_thread = threading.get_ident()
+
+    def work(db, value):
+        assert db is test_db
+        return threading.get_ident(), value
+
+    worker_thread, value = await run_db(test_db, work, 42)
+
+    assert value == 42
+    assert worker_thread != loop_thread
+
+
+@pytest.mark.asyncio
+async def test_run_db_serialises_calls_for_one_session(test_db):
+    """Test that concurrent run_db calls never share a Session across threads at once"""
+    from app.db import run_db
+
+    active = 0
+    peak = 0
+
+    def work(db):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        time.sleep(0.01)
+        active -= 1
+
+    await asyncio.gather(*(run_db(test_db, work) for _ in range(4)))
+
+    assert peak == 1
+
+
+def test_engine_options_configure_server_pool(monkeypatch):
+    """Test that pool settings are applied for server databases only"""
+    from app import db
+
+    monkeypatch.setattr(db, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = db.engine_options("postgresql://u:p@localhost/db")
+
+    assert options["poolclass"] is db.InstrumentedQueuePool
+    assert options["pool_size"] == db.DB_POOL_SIZE
+    assert options["max_overflow"] == db.DB_MAX_OVERFLOW
+    assert options["pool_pre_ping"] is db.DB_POOL_PRE_PING
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+    sqlite_options = db.engine_options("sqlite:///./app.db")
+    assert "pool_size" not in sqlite_options
+    assert "connect_args" not in sqlite_options
+
+
+def test_warm_up_pool_opens_connections_and_records_metrics(tmp_path):
+    """Test that warm-up pre-opens pooled connections and checkouts are measured"""
+    from sqlalchemy import create_engine
+    from app.db import InstrumentedQueuePool, pool_metrics, warm_up_pool
+
+    warm_engine = create_engine(
+        f"sqlite:///{tmp_path / 'warm.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=3,
+        max_overflow=0,
+    )
+    pool_metrics.reset()
+    try:
+        assert warm_up_pool(3, bind=warm_engine) == 3
+        assert warm_engine.pool.checkedin() == 3
+
+        stats = pool_metrics.stats(warm_engine.pool)
+        assert stats["checkouts"] == 3
+        assert stats["size"] == 3
+        assert stats["checked_out"] == 0
+        assert stats["saturation"] == 0.0
+    finally:
+        warm_engine.dispose()
+        pool_metrics.reset()
+
+
+def test_warm_up_pool_skips_sqlite_pools():
+    """Test that warm-up is a no-op for SQLite's own pool classes"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from app.db import warm_up_pool
+
+    memory_engine = create_engine("sqlite://", poolclass=StaticPool)
+    try:
+        assert warm_up_pool(3, bind=memory_engine) == 0
+    finally:
+        memory_engine.dispose()
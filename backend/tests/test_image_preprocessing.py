@@ -0,0 +1,95 @@
+"""
+Tests for the downscaled, EXIF-stripped analysis derivative.
+"""
+import os
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from app.config import MEDIA_ROOT
+from app.services import image_preprocessing
+from app.services.image_preprocessing import derivative_path, prepare_analysis_image
+from app.services.media_service import safe_remove_media_file
+
+
+def test_cached_derivative_is_reused(tmp_path):
+    original = tmp_path / "lesion.png"
+    original.write_bytes(b"original")
+    cached = derivative_path(original, 1536, "webp")
+    cached.write_bytes(b"derivative")
+
+    assert cached.name == "lesion.ai1536.webp"
+    assert prepare_analysis_image(str(original), 1536, "webp") == str(cached)
+
+
+def test_original_is_sent_when_disabled_or_pillow_missing(tmp_path, monkeypatch):
+    original = tmp_path / "lesion.png"
+    original.write_bytes(b"original")
+
+    assert prepare_analysis_image(str(original), max_edge=0) == str(original)
+    monkeypatch.setattr(image_preprocessing, "PILImage", None)
+    assert prepare_analysis_image(str(original), 1536, "webp") == str(original)
+    assert not derivative_path(original, 1536, "webp").exists()
+
+
+def test_derivative_is_upright_downscaled_and_exif_free(tmp_path):
+    PILImage = pytest.importorskip("PIL.Image")
+
+    original = tmp_path / "phone.jpg"
+    exif = PILImage.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+    exif[0x010F] = "PhoneMaker"
+    PILImage.new("RGB", (4000, 3000), "red").save(original, format="JPEG", exif=exif)
+
+    result = prepare_analysis_image(str(original), max_edge=1000, image_format="webp", quality=80)
+
+    assert result == str(derivative_path(original, 1000, "webp"))
+    with PILImage.open(result) as derived:
+        assert derived.format == "WEBP"
+        assert derived.size == (750, 1000)  # Rotated to portrait, then capped
+        assert not derived.getexif()
+    assert os.path.getsize(result) < os.path.getsize(original)
+
+
+def test_undecodable_upload_falls_back_to_original(tmp_path):
+    pytest.importorskip("PIL.Image")
+    original = tmp_path / "broken.png"
+    original.write_bytes(b"not really a png")
+
+    assert prepare_analysis_image(str(original), 1536, "webp") == str(original)
+    assert list(tmp_path.iterdir()) == [original]
+
+
+def test_removing_media_removes_its_derivatives():
+    original = MEDIA_ROOT / "anonymous" / "derived_cleanup.png"
+    original.parent.mkdir(parents=True, exist_ok=True)
+    original.write_bytes(b"original")
+    derived = derivative_path(original, 1536, "webp")
+    derived.write_bytes(b"derivative")
+
+    assert safe_remove_media_file("anonymous/derived_cleanup.png")
+    assert not original.exists()
+    assert not derived.exists()
+
+
+@pytest.mark.asyncio
+async def test_gemini_receives_the_derivative(tmp_path):
+    from app.services.gemini_service import GeminiService
+
+    original = tmp_path / "lesion.png"
+    original.write_bytes(b"full resolution bytes")
+    derivative_path(original).write_bytes(b"small bytes")
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(
+                return_value=Mock(text='{"condition": "Nevus", "confidence": 90}')
+            )
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            await GeminiService().analyze_skin_lesion(str(original))
+
+    _, image_part = mock_model.generate_content_async.call_args.args[0]
+    assert image_part["data"] == b"small bytes"
+    assert image_part["mime_type"] == "image/webp"
@@ -4,6 +4,8 @@ Tests for the image upload endpoint.
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
+import pytest
+
 from app.config import MEDIA_ROOT, MEDIA_URL
 from app.models import Image, User
 from app.auth_helpers import get_current_user
@@ -91,3 +93,249 @@ class TestImageUpload:
         finally:
             if file_path.exists():
                 file_path.unlink()
+
+
+class TestMediaRenditions:
+    def test_size_param_is_signed_and_validated(self, client):
+        from app.services.media_service import create_signed_media_url
+
+        file_path = MEDIA_ROOT / "uploads" / "rendition_check.png"
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(b"fake-image")
+        try:
+            thumb_url = create_signed_media_url("uploads/rendition_check.png", size="thumb")
+            assert parse_qs(urlparse(thumb_url).query)["size"] == ["thumb"]
+
+            # Without Pillow (or for undecodable bytes) the original is served
+            assert client.get(thumb_url).status_code == 200
+            bad = client.get(thumb_url.replace("size=thumb", "size=huge"))
+            assert bad.status_code == 400
+            assert "Unknown media size" in bad.json()["detail"]
+        finally:
+            file_path.unlink()
+
+    def test_thumbnail_is_generated_once_and_cached(self, client):
+        PILImage = pytest.importorskip("PIL.Image")
+        from app.services.image_preprocessing import derivative_path
+        from app.services.media_service import create_signed_media_url, safe_remove_media_file
+
+        file_path = MEDIA_ROOT / "uploads" / "rendition_photo.png"
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        PILImage.new("RGB", (2000, 1000), "blue").save(file_path, format="PNG")
+        thumb_path = derivative_path(file_path, 160, "webp", kind="thumb")
+        try:
+            response = client.get(create_signed_media_url("uploads/rendition_photo.png", size="thumb"))
+
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "image/webp"
+            assert thumb_path.exists()
+            assert len(response.content) < file_path.stat().st_size
+            with PILImage.open(thumb_path) as thumb:
+                assert thumb.size == (160, 80)
+
+            cached_mtime = thumb_path.stat().st_mtime_ns
+            client.get(create_signed_media_url("uploads/rendition_photo.png", size="thumb"))
+            assert thumb_path.stat().st_mtime_ns == cached_mtime
+        finally:
+            safe_remove_media_file("uploads/rendition_photo.png")
+        assert not thumb_path.exists()
+
+
+class TestMediaCaching:
+    @pytest.fixture
+    def blob(self):
+        import hashlib
+
+        content = b"0123456789" * 100
+        digest = hashlib.sha256(content).hexdigest()
+        relative = f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.png"
+        file_path = MEDIA_ROOT / relative
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+        yield relative, digest, content
+        file_path.unlink()
+
+    def test_signing_twice_gives_the_same_url(self, blob):
+        from app.services.media_service import create_signed_media_url
+
+        relative, _, _ = blob
+        assert create_signed_media_url(relative) == create_signed_media_url(relative)
+
+    def test_etag_ignores_token_and_yields_304(self, client, blob):
+        from app.services.media_service import create_media_token
+
+        relative, digest, _ = blob
+        first = client.get(f"{MEDIA_URL}/{relative}?token={create_media_token(relative, 300)}")
+        assert first.status_code == 200
+        assert first.headers["etag"] == f'"{digest}"'
+
+        # A different token for the same file still revalidates
+        other_url = f"{MEDIA_URL}/{relative}?token={create_media_token(relative, 600)}"
+        cached = client.get(other_url, headers={"If-None-Match": f'W/"x", "{digest}"'})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == f'"{digest}"'
+
+        by_date = client.get(other_url, headers={"If-Modified-Since": first.headers["last-modified"]})
+        assert by_date.status_code == 304
+        assert client.get(other_url, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    def test_range_requests(self, client, blob):
+        from app.services.media_service import create_signed_media_url
+
+        relative, digest, content = blob
+        url = create_signed_media_url(relative)
+
+        partial = client.get(url, headers={"Range": "bytes=10-19"})
+        assert partial.status_code == 206
+        assert partial.content == content[10:20]
+        assert partial.headers["content-range"] == f"bytes 10-19/{len(content)}"
+
+        matching = client.get(url, headers={"Range": "bytes=0-4", "If-Range": f'"{digest}"'})
+        assert matching.status_code == 206
+        stale = client.get(url, headers={"Range": "bytes=0-4", "If-Range": '"stale"'})
+        assert stale.status_code == 200
+        assert stale.content == content
+
+    def test_etag_of_non_blob_files_hashes_content(self, client):
+        import hashlib
+        from app.services.media_service import create_signed_media_url
+
+        file_path = MEDIA_ROOT / "uploads" / "legacy_etag.png"
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(b"legacy-bytes")
+        try:
+            response = client.get(create_signed_media_url("uploads/legacy_etag.png"))
+            assert response.headers["etag"] == f'"{hashlib.sha256(b"legacy-bytes").hexdigest()}"'
+        finally:
+            file_path.unlink()
+
+
+class TestMediaTokens:
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self):
+        from app.services.media_service import verified_media_tokens
+
+        verified_media_tokens.clear()
+        yield
+        verified_media_tokens.clear()
+
+    def test_token_is_compact_and_bound_to_path_and_expiry(self):
+        import re
+        import time
+        from app.services import media_service
+        from app.services.media_service import create_media_token, verify_media_token
+
+        token = create_media_token("uploads/a.png")
+        assert re.fullmatch(r"\d+\.[A-Za-z0-9_-]{22}", token)
+        assert verify_media_token(token, "uploads/a.png")
+        assert verify_media_token(token, "/uploads/a.png")  # Same normalized path
+        assert not verify_media_token(token, "uploads/b.png")
+        assert not verify_media_token(token[:-1] + ("A" if token[-1] != "A" else "B"), "uploads/a.png")
+
+        past = int(time.time()) - 1
+        expired = f"{past}.{media_service._media_signature('uploads/a.png', past)}"
+        assert not verify_media_token(expired, "uploads/a.png")
+
+    @pytest.mark.parametrize("token", ["\u00b23.abc", "9999999999.\u00e9\u00e9"])
+    def test_non_ascii_tokens_are_rejected(self, client, token):
+        from app.services.media_service import verify_media_token
+
+        assert not verify_media_token(token, "uploads/a.png")
+        response = client.get(f"{MEDIA_URL}/uploads/a.png", params={"token": token})
+        assert response.status_code == 403
+
+    def test_verified_tokens_are_cached_until_expiry(self, monkeypatch):
+        from app.services import media_service
+        from app.services.media_service import create_media_token, verified_media_tokens, verify_media_token
+
+        token = create_media_token("uploads/a.png")
+        calls = []
+        sign = media_service._media_signature
+        monkeypatch.setattr(media_service, "_media_signature", lambda *args: calls.append(args) or sign(*args))
+
+        for _ in range(20):
+            assert verify_media_token(token, "uploads/a.png")
+        assert len(calls) == 1
+
+        verified_media_tokens.put("stale", "uploads/a.png", "uploads/a.png", expires_at=0)
+        assert verified_media_tokens.get("stale", "uploads/a.png") is None
+
+    def test_legacy_jwt_tokens_during_transition(self, monkeypatch):
+        from datetime import datetime, timedelta, timezone
+        from jose import jwt
+        from app.config import ALGORITHM, SECRET_KEY
+        from app.services import media_service
+
+        legacy = jwt.encode(
+            {
+                "path": "uploads/a.png",
+                "scope": "media",
+                "exp": datetime.now(timezone.utc) + timedelta(minutes=5),
+            },
+            SECRET_KEY,
+            algorithm=ALGORITHM,
+        )
+        assert media_service.verify_media_token(legacy, "uploads/a.png")
+        assert not media_service.verify_media_token(legacy, "uploads/b.png")
+
+        media_service.verified_media_tokens.clear()
+        monkeypatch.setattr(media_service, "MEDIA_TOKEN_ACCEPT_JWT", False)
+        assert not media_service.verify_media_token(legacy, "uploads/a.png")
+
+
+class TestBatchSignedUrls:
+    def _request(self, client, user, **body):
+        app.dependency_overrides[get_current_user] = lambda: user
+        try:
+            return client.post("/images/signed-urls", json=body)
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+    def test_signs_accessible_images_with_one_expiry(self, client, test_db):
+        from app.models import PatientDoctorLink
+        from app.services.media_service import verify_media_token
+
+        patient = User(email="batch_patient@test.com", password="x", role="patient")
+        other = User(email="batch_other@test.com", password="x", role="patient")
+        doctor = User(email="batch_doctor@test.com", password="x", role="doctor")
+        test_db.add_all([patient, other, doctor])
+        test_db.commit()
+        test_db.add(PatientDoctorLink(patient_id=patient.id, doctor_id=doctor.id))
+        images = [
+            Image(patient_id=patient.id, image_url="blobs/aa/bb/shared.png"),
+            Image(patient_id=patient.id, image_url="blobs/aa/bb/shared.png"),
+            Image(patient_id=other.id, image_url="uploads/other.png"),
+        ]
+        test_db.add_all(images)
+        test_db.commit()
+        own, duplicate, foreign = (image.id for image in images)
+
+        response = self._request(client, patient, image_ids=[own, duplicate, foreign, 999999], size="thumb")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert sorted(body["urls"]) == sorted([str(own), str(duplicate)])
+        assert body["denied"] == [foreign, 999999]
+        for url in body["urls"].values():
+            path, relative, token = _parse_media_url(url)
+            assert token.startswith(f"{body['expires_at']}.")
+            assert parse_qs(urlparse(url).query)["size"] == ["thumb"]
+            assert verify_media_token(token, relative)
+
+        # A linked doctor sees the patient's images, but not unrelated ones
+        doctor_view = self._request(client, doctor, image_ids=[own, foreign]).json()
+        assert list(doctor_view["urls"]) == [str(own)]
+        assert doctor_view["denied"] == [foreign]
+
+    def test_rejects_unknown_size_and_oversized_batches(self, client, test_db):
+        from app.config import MEDIA_SIGN_BATCH_MAX
+
+        patient = User(email="batch_limits@test.com", password="x", role="patient")
+        test_db.add(patient)
+        test_db.commit()
+
+        assert self._request(client, patient, image_ids=[1], size="huge").status_code == 400
+        too_many = list(range(1, MEDIA_SIGN_BATCH_MAX + 2))
+        assert self._request(client, patient, image_ids=too_many).status_code == 422
+        assert self._request(client, patient, image_ids=[]).status_code == 422
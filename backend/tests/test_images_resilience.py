@@ -1,9 +1,13 @@
+import io
 import pytest
 from app.main import app
 from app.models import User
 from app.auth_helpers import get_current_user
 from app.config import MAX_UPLOAD_SIZE_MB
 
+# Uploads and blobs go to a temp MEDIA_ROOT, not backend/media
+pytestmark = pytest.mark.usefixtures("media_root")
+
 def create_user(client, email: str, role: str) -> int:
     response = client.post(
         "/auth/signup",
@@ -80,3 +84,79 @@ class TestImageUploadResilience:
 
         assert response.status_code == 201
         assert "image_id" in response.json()
+
+
+class _CountingStream:
+    """File-like source that records how many bytes were pulled from it."""
+
+    def __init__(self, total: int):
+        self.remaining = total
+        self.read_bytes = 0
+
+    def read(self, size: int) -> bytes:
+        chunk = b"x" * min(size, self.remaining)
+        self.remaining -= len(chunk)
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+class TestStreamingUploads:
+    def test_stage_stream_aborts_at_limit_and_cleans_up(self):
+        from fastapi import HTTPException
+        from app.services.image_service import UPLOAD_CHUNK_SIZE, UPLOAD_STAGING_DIR, _stage_stream
+
+        before = set(UPLOAD_STAGING_DIR.glob("*")) if UPLOAD_STAGING_DIR.exists() else set()
+        source = _CountingStream(total=50 * 1024 * 1024)
+
+        with pytest.raises(HTTPException) as exc:
+            _stage_stream(source, max_bytes=3 * UPLOAD_CHUNK_SIZE)
+
+        assert "File too large" in exc.value.detail
+        # Stopped one chunk past the limit instead of reading all 50MB
+        assert source.read_bytes == 4 * UPLOAD_CHUNK_SIZE
+        assert set(UPLOAD_STAGING_DIR.glob("*")) == before
+
+    def test_stage_stream_hashes_and_moves_atomically(self, media_root):
+        import hashlib
+        from app.services.image_service import _stage_stream, _write_media_file
+
+        content = b"lesion-bytes" * 10000
+        source = io.BytesIO(content)
+
+        staged = _stage_stream(source, max_bytes=len(content))
+        assert staged.size == len(content)
+        assert staged.sha256 == hashlib.sha256(content).hexdigest()
+
+        relative = _write_media_file(staged)
+        assert not staged.path.exists()
+        assert (media_root / relative).read_bytes() == content
+
+    def test_identical_uploads_share_one_sharded_blob(self, media_root):
+        import hashlib
+        from app.services.image_service import _stage_stream, _write_media_file
+
+        content = b"\xff\xd8\xff\xe0" + b"jpeg-lesion" * 100
+        digest = hashlib.sha256(content).hexdigest()
+
+        first = _write_media_file(_stage_stream(io.BytesIO(content), max_bytes=None))
+        duplicate = _stage_stream(io.BytesIO(content), max_bytes=None)
+        second = _write_media_file(duplicate)
+
+        assert first == second == f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        assert not duplicate.path.exists()  # Renamed over the blob, not stored twice
+        assert (media_root / first).read_bytes() == content
+
+    def test_public_analyze_enforces_type_and_size(self, client):
+        wrong_type = client.post(
+            "/public/try/analyze",
+            files={"file": ("notes.txt", b"text", "text/plain")},
+        )
+        too_large = client.post(
+            "/public/try/analyze",
+            files={"file": ("big.png", b"a" * (MAX_UPLOAD_SIZE_MB * 1024 * 1024 + 1), "image/png")},
+        )
+
+        assert wrong_type.status_code == 400
+        assert "Invalid file type" in wrong_type.json()["detail"]
+        assert too_large.status_code == 400
+        assert "File too large" in too_large.json()["detail"]
@@ -0,0 +1,48 @@
+"""
+Tests for the legacy media -> content-addressed storage migration.
+"""
+import hashlib
+
+from app.config import MEDIA_ROOT
+from app.migrate_media import migrate_media
+from app.models import Image, User
+
+
+def _legacy_file(name, content):
+    path = MEDIA_ROOT / "uploads" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+def test_migrate_media_rehomes_and_dedupes(db_session):
+    patient = User(email="migrate@test.com", password="x", role="patient")
+    db_session.add(patient)
+    db_session.commit()
+
+    content = b"\x89PNG\r\n\x1a\nlegacy-lesion"
+    digest = hashlib.sha256(content).hexdigest()
+    first = _legacy_file("legacy_a.png", content)
+    copy = _legacy_file("legacy_b.png", content)
+    images = [
+        Image(patient_id=patient.id, image_url="uploads/legacy_a.png"),
+        Image(patient_id=patient.id, image_url="/uploads/legacy_a.png"),
+        Image(patient_id=patient.id, image_url="uploads/legacy_b.png"),
+        Image(patient_id=patient.id, image_url="uploads/legacy_gone.png"),
+    ]
+    db_session.add_all(images)
+    db_session.commit()
+
+    assert migrate_media(db_session, dry_run=True) == {"rows": 3, "files": 3, "deduped": 0, "missing": 1}
+    assert first.exists() and images[0].image_url == "uploads/legacy_a.png"
+
+    result = migrate_media(db_session, batch_size=2)
+
+    blob = f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.png"
+    assert result == {"rows": 3, "files": 3, "deduped": 2, "missing": 1}
+    assert [image.image_url for image in images] == [blob, blob, blob, "uploads/legacy_gone.png"]
+    assert (MEDIA_ROOT / blob).read_bytes() == content
+    assert not first.exists() and not copy.exists()
+    # Re-running is a no-op for rows already in blob storage
+    assert migrate_media(db_session)["rows"] == 0
+    (MEDIA_ROOT / blob).unlink()
@@ -296,3 +296,16 @@ def test_foreign_key_relationships():
     ar_patient_id = ar_mapper.columns['patient_id']
     assert len(ar_image_id.foreign_keys) > 0
     assert len(ar_patient_id.foreign_keys) > 0
+
+
+def test_hot_path_indexes_created(test_db):
+    """Test that the composite and partial indexes for hot queries exist"""
+    from sqlalchemy import inspect as sa_inspect
+
+    inspector = sa_inspect(test_db.get_bind())
+    report_indexes = {ix["name"]: ix["column_names"] for ix in inspector.get_indexes("analysis_reports")}
+    chat_indexes = {ix["name"]: ix["column_names"] for ix in inspector.get_indexes("chat_messages")}
+
+    assert report_indexes["ix_analysis_reports_image_id_created_at"] == ["image_id", "created_at"]
+    assert report_indexes["ix_analysis_reports_active_cases"] == ["patient_id", "review_status"]
+    assert chat_indexes["ix_chat_messages_report_id_created_at"] == ["report_id", "created_at"]
@@ -0,0 +1,154 @@
+"""
+Tests for keyset pagination on list endpoints.
+"""
+import json
+from datetime import datetime, timedelta
+
+from app.auth_helpers import get_current_doctor, get_current_patient, get_current_user
+from app.main import app
+from app.models import AnalysisReport, ChatMessage, Image, PatientDoctorLink, User
+from app.services import pagination
+from app.services.pagination import decode_cursor, encode_cursor
+
+
+def _seed_reports(db_session, count, same_timestamp=False):
+    patient = User(email="pages@reports.test", password="x", role="patient")
+    db_session.add(patient)
+    db_session.commit()
+    base = datetime(2024, 1, 1)
+    for i in range(count):
+        image = Image(patient_id=patient.id, image_url=f"tests/page_{i}.png")
+        db_session.add(image)
+        db_session.flush()
+        db_session.add(AnalysisReport(
+            image_id=image.id,
+            patient_id=patient.id,
+            report_json=json.dumps({"condition": f"Condition {i}"}),
+            created_at=base if same_timestamp else base + timedelta(minutes=i),
+        ))
+    db_session.commit()
+    return patient
+
+
+def _walk(client, url, limit):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get(url, params=params).json()
+        seen.extend(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_patient_reports_pages_newest_first_without_duplicates(client, db_session):
+    patient = _seed_reports(db_session, 7)
+    app.dependency_overrides[get_current_patient] = lambda: patient
+    try:
+        items = _walk(client, "/api/analysis/patient/reports", limit=3)
+    finally:
+        app.dependency_overrides.clear()
+
+    ids = [item["report_id"] for item in items]
+    assert len(ids) == 7
+    assert len(set(ids)) == 7
+    created = [item["created_at"] for item in items]
+    assert created == sorted(created, reverse=True)
+
+
+def test_pages_are_stable_when_timestamps_tie(client, db_session):
+    patient = _seed_reports(db_session, 5, same_timestamp=True)
+    app.dependency_overrides[get_current_patient] = lambda: patient
+    try:
+        items = _walk(client, "/api/analysis/patient/reports", limit=2)
+    finally:
+        app.dependency_overrides.clear()
+
+    ids = [item["report_id"] for item in items]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 5
+
+
+def test_legacy_list_without_pagination_params(client, db_session, monkeypatch):
+    patient = _seed_reports(db_session, 3)
+    app.dependency_overrides[get_current_patient] = lambda: patient
+    try:
+        legacy = client.get("/api/analysis/patient/reports").json()
+        monkeypatch.setattr(pagination, "LIST_PAGINATION_COMPAT", False)
+        paged = client.get("/api/analysis/patient/reports").json()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert isinstance(legacy, list)
+    assert len(legacy) == 3
+    assert set(paged) == {"items", "next_cursor"}
+
+
+def test_invalid_cursor_is_rejected(client, db_session):
+    patient = _seed_reports(db_session, 1)
+    app.dependency_overrides[get_current_patient] = lambda: patient
+    try:
+        response = client.get("/api/analysis/patient/reports", params={"cursor": "not-a-cursor"})
+        too_large = client.get("/api/analysis/patient/reports", params={"limit": 10_000})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
+    assert too_large.status_code == 422
+
+
+def test_chat_history_pages_oldest_first(client, db_session):
+    patient = _seed_reports(db_session, 1)
+    report = db_session.query(AnalysisReport).first()
+    base = datetime(2024, 2, 1)
+    db_session.add_all([
+        ChatMessage(report_id=report.id, sender_role="patient", message=f"msg {i}", created_at=base + timedelta(seconds=i))
+        for i in range(5)
+    ])
+    db_session.commit()
+
+    app.dependency_overrides[get_current_user] = lambda: patient
+    try:
+        items = _walk(client, f"/api/analysis/{report.image_id}/chat", limit=2)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [item["message"] for item in items] == [f"msg {i}" for i in range(5)]
+
+
+def test_pending_cases_and_doctor_patients_paginate(client, db_session):
+    doctor = User(email="pager@doctor.test", password="x", role="doctor")
+    patients = [User(email=f"p{i}@pager.test", password="x", role="patient") for i in range(3)]
+    db_session.add_all([doctor, *patients])
+    db_session.commit()
+    for i, patient in enumerate(patients):
+        db_session.add(PatientDoctorLink(patient_id=patient.id, doctor_id=doctor.id))
+        image = Image(patient_id=patient.id, image_url=f"tests/pending_{i}.png")
+        db_session.add(image)
+        db_session.flush()
+        db_session.add(AnalysisReport(
+            image_id=image.id,
+            patient_id=patient.id,
+            report_json="{}",
+            review_status="pending",
+            created_at=datetime(2024, 3, 1) + timedelta(minutes=i),
+        ))
+    db_session.commit()
+
+    app.dependency_overrides[get_current_doctor] = lambda: doctor
+    try:
+        cases = _walk(client, "/cases/pending", limit=2)
+        linked = _walk(client, "/doctor/patients", limit=2)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [case["patient_id"] for case in cases] == [p.id for p in patients]
+    assert sorted(p["id"] for p in linked) == sorted(p.id for p in patients)
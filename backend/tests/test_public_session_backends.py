@@ -0,0 +1,225 @@
+"""
+Tests for the pluggable public session backends.
+
+The Redis backend runs against the in-process RESP stand-in in
+tests/redis_standin.py, so no Redis install is needed.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import MEDIA_ROOT
+from app.services.public_session_backends import (
+    MemorySessionBackend,
+    RedisClient,
+    RedisSessionBackend,
+    SQLiteSessionBackend,
+)
+from app.services.public_session_store import PublicSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_backend(request, tmp_path):
+    created = []
+
+    def make(max_sessions=10000):
+        if request.param == "memory":
+            backend = MemorySessionBackend(max_sessions)
+        elif request.param == "sqlite":
+            backend = SQLiteSessionBackend(str(tmp_path / f"sessions_{len(created)}.db"), max_sessions)
+        else:
+            host, port = request.getfixturevalue("redis_standin").server_address
+            backend = RedisSessionBackend(f"redis://{host}:{port}/0", max_sessions)
+        created.append(backend)
+        return backend
+
+    yield make
+    for backend in created:
+        if isinstance(backend, RedisSessionBackend):
+            backend.client.close()
+
+
+@pytest.fixture
+def backend(make_backend):
+    return make_backend()
+
+
+def test_backend_round_trip_and_update(backend):
+    backend.create("s1", {"messages": [], "image_path": "anonymous/a.png"}, ttl_seconds=60)
+
+    updated = backend.update("s1", lambda doc: doc["messages"].append("hi"))
+
+    assert updated == {"messages": ["hi"], "image_path": "anonymous/a.png"}
+    assert backend.get("s1") == updated
+    assert backend.get("missing") is None
+    assert backend.update("missing", lambda doc: None) is None
+
+
+def test_backend_expires_sessions_and_reports_their_media(backend):
+    backend.create("short", {"image_path": "anonymous/short.png"}, ttl_seconds=0.05)
+    backend.create("long", {"image_path": "anonymous/long.png"}, ttl_seconds=60)
+    time.sleep(0.1)
+
+    assert backend.get("short") is None
+    assert backend.update("short", lambda doc: None) is None
+    assert backend.purge_expired() == ["anonymous/short.png"]
+    assert backend.purge_expired() == []
+    assert backend.get("long") is not None
+    assert backend.clear() == ["anonymous/long.png"]
+    assert backend.get("long") is None
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    worker_a = SQLiteSessionBackend(path)
+    worker_b = SQLiteSessionBackend(path)
+
+    worker_a.create("s1", {"n": 0}, ttl_seconds=60)
+    for _ in range(5):
+        worker_a.update("s1", lambda doc: doc.update(n=doc["n"] + 1))
+        worker_b.update("s1", lambda doc: doc.update(n=doc["n"] + 1))
+
+    assert worker_b.get("s1") == {"n": 10}
+
+
+def test_redis_update_retries_after_concurrent_write(redis_standin):
+    host, port = redis_standin.server_address
+    url = f"redis://{host}:{port}/0"
+    backend = RedisSessionBackend(url)
+    other = RedisClient(url)
+    backend.create("s1", {"n": 0}, ttl_seconds=60)
+    attempts = []
+
+    def mutate(doc):
+        attempts.append(doc["n"])
+        if len(attempts) == 1:
+            # Another worker writes between our read and EXEC
+            other.execute("SET", "dermaai:public_session:s1", '{"n":5}', "XX", "KEEPTTL")
+        doc["n"] += 1
+
+    assert backend.update("s1", mutate) == {"n": 6}
+    assert attempts == [0, 5]
+    backend.client.close()
+    other.close()
+
+
+def test_redis_transaction_is_replayed_after_connection_drop(redis_standin, monkeypatch):
+    host, port = redis_standin.server_address
+    backend = RedisSessionBackend(f"redis://{host}:{port}/0")
+    backend.create("s1", {"n": 0}, ttl_seconds=60)
+    client = backend.client
+    real_call = client._call
+    dropped = []
+
+    def flaky_call(*args):
+        if args[0] == "SET" and not dropped:
+            # The connection dies after WATCH/MULTI went out on it
+            dropped.append(args)
+            client._sock.close()
+            raise ConnectionError("Connection reset")
+        return real_call(*args)
+
+    monkeypatch.setattr(client, "_call", flaky_call)
+
+    assert backend.update("s1", lambda doc: doc.update(n=doc["n"] + 1)) == {"n": 1}
+    assert dropped
+    assert backend.get("s1") == {"n": 1}
+    client.close()
+
+
+def test_store_caps_messages_per_session(backend):
+    store = PublicSessionStore(ttl_minutes=20, backend=backend, max_messages=4)
+    session_id = store.create_session({"condition": "Benign lesion"})
+
+    for i in range(10):
+        store.append_message(session_id, "patient", f"Message {i}.")
+
+    session = store.get_session(session_id)
+    assert [m.message for m in session["messages"]] == [f"Message {i}." for i in range(6, 10)]
+    assert "Patient: Message 5" in session["summary"]
+
+
+def test_backend_evicts_least_recently_used(make_backend):
+    backend = make_backend(max_sessions=2)
+    assert backend.create("a", {"image_path": "anonymous/a.png"}, ttl_seconds=60) == []
+    time.sleep(0.01)
+    backend.create("b", {"image_path": "anonymous/b.png"}, ttl_seconds=60)
+    time.sleep(0.01)
+    assert backend.get("a") is not None  # a is now more recent than b
+    time.sleep(0.01)
+
+    assert backend.create("c", {"image_path": None}, ttl_seconds=60) == ["anonymous/b.png"]
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    assert backend.get("c") is not None
+
+
+def test_memory_purge_pops_only_expired_heap_entries():
+    backend = MemorySessionBackend(max_sessions=1)
+    backend.create("old", {"image_path": "anonymous/old.png"}, ttl_seconds=0.01)
+    backend.create("new", {"image_path": "anonymous/new.png"}, ttl_seconds=60)  # evicts "old"
+    time.sleep(0.02)
+
+    # The evicted session's heap entry is skipped rather than reported twice
+    assert backend.purge_expired() == []
+    assert len(backend._expiry) == 1
+    assert backend.get("new") is not None
+
+
+def _media_file(name):
+    anon_dir = MEDIA_ROOT / "anonymous"
+    anon_dir.mkdir(parents=True, exist_ok=True)
+    file_path = anon_dir / name
+    file_path.write_bytes(b"fake-bytes")
+    return file_path
+
+
+def test_store_reaps_media_of_evicted_sessions(backend):
+    backend.max_sessions = 1
+    store = PublicSessionStore(ttl_minutes=20, backend=backend)
+    file_path = _media_file("evicted_test.png")
+
+    store.create_session({"status": "success"}, image_path=f"anonymous/{file_path.name}")
+    store.create_session({"status": "success"})
+
+    assert file_path.exists()
+    store.reap()
+    assert not file_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_background_reaper_removes_expired_sessions(tmp_path):
+    store = PublicSessionStore(ttl_minutes=0, backend=SQLiteSessionBackend(str(tmp_path / "s.db")))
+    file_path = _media_file("sqlite_cleanup_test.png")
+    session_id = store.create_session({"status": "success"}, image_path=f"anonymous/{file_path.name}")
+
+    with pytest.raises(HTTPException):
+        store.get_session(session_id)
+
+    store.start_reaper(0.01)
+    try:
+        for _ in range(100):
+            if not file_path.exists():
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await store.stop_reaper()
+    assert not file_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_store_keeps_blocking_backends_off_the_event_loop(tmp_path):
+    loop_thread = threading.get_ident()
+    memory_store = PublicSessionStore(backend=MemorySessionBackend())
+    sqlite_store = PublicSessionStore(backend=SQLiteSessionBackend(str(tmp_path / "sessions.db")))
+
+    assert await memory_store.run(threading.get_ident) == loop_thread
+    assert await sqlite_store.run(threading.get_ident) != loop_thread
+
+    session_id = await sqlite_store.run(sqlite_store.create_session, {"condition": "Nevus"}, None)
+    await sqlite_store.run(sqlite_store.append_message, session_id, "patient", "hello")
+    summary, history = await sqlite_store.run(sqlite_store.chat_context, session_id)
+    assert [m.message for m in history] == ["hello"]
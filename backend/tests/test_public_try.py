@@ -1,4 +1,3 @@
-from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -56,7 +55,7 @@ def test_public_analyze_returns_session_and_analysis(client):
 def test_public_chat_uses_session_history(client):
     mock_service = get_mock_gemini_service()
     
-    async def _fake_chat(context, message, history=None):
+    async def _fake_chat(context, message, history=None, summary=None):
         assert context["condition"] == "Benign lesion"
         assert history and len(history) == 1
         assert history[0].message == "Hi"
@@ -93,7 +92,7 @@ def test_public_chat_rejects_missing_session(client):
 
 
 def test_public_session_cleanup_removes_file():
-    store = PublicSessionStore(ttl_minutes=20)
+    store = PublicSessionStore(ttl_minutes=0)
     anon_dir = MEDIA_ROOT / "anonymous"
     anon_dir.mkdir(parents=True, exist_ok=True)
     file_path = anon_dir / "cleanup_test.png"
@@ -103,9 +102,66 @@ def test_public_session_cleanup_removes_file():
         {"status": "success"},
         image_path=f"anonymous/{file_path.name}",
     )
-    store.sessions[session_id]["created_at"] = datetime.now(timezone.utc) - timedelta(minutes=30)
 
     with pytest.raises(HTTPException):
         store.get_session(session_id)
 
+    # Files are removed by the reaper, not on the request path
+    assert file_path.exists()
+    assert store.reap() == 1
     assert not file_path.exists()
+
+
+def test_public_upload_extension_comes_from_content_not_filename(client):
+    with patch("app.routes.public_try.get_gemini_service", return_value=get_mock_gemini_service()):
+        response = client.post(
+            "/public/try/analyze",
+            files={"file": ("lesion.html", b"\x89PNG\r\n\x1a\nlesion", "image/png")},
+        )
+
+    assert response.status_code == 200
+    image_path = public_session_store.get_session(response.json()["session_id"])["image_path"]
+    assert image_path.startswith("anonymous/")
+    assert image_path.endswith(".png")
+    assert (MEDIA_ROOT / image_path).exists()
+
+
+def test_signup_migrates_messages_folded_out_of_the_ai_context(client, test_db, media_root):
+    from app.config import CHAT_HISTORY_MAX_TURNS
+    from app.models import ChatMessage, User
+
+    (media_root / "anonymous").mkdir()
+    (media_root / "anonymous" / "long_chat.png").write_bytes(b"\x89PNG\r\n\x1a\nlesion")
+    session_id = public_session_store.create_session(
+        {"condition": "Benign lesion", "confidence": 70}, image_path="anonymous/long_chat.png"
+    )
+    sent = [f"Message {i}." for i in range(CHAT_HISTORY_MAX_TURNS + 5)]
+    for i, text in enumerate(sent):
+        public_session_store.append_message(session_id, "patient" if i % 2 == 0 else "ai", text)
+        public_session_store.chat_context(session_id)
+
+    summary, recent = public_session_store.chat_context(session_id)
+    assert "Message 0" in summary
+    assert len(recent) == CHAT_HISTORY_MAX_TURNS
+
+    response = client.post(
+        "/auth/signup",
+        json={
+            "email": "long-chat@test.com",
+            "password": "password123",
+            "role": "patient",
+            "public_session_id": session_id,
+        },
+    )
+
+    assert response.status_code == 201
+    user = test_db.query(User).filter(User.email == "long-chat@test.com").one()
+    migrated = (
+        test_db.query(ChatMessage)
+        .filter(ChatMessage.sender_id == user.id)
+        .order_by(ChatMessage.id)
+        .all()
+    )
+    assert [m.message for m in migrated] == sent[::2]
+    ai_messages = test_db.query(ChatMessage).filter(ChatMessage.sender_role == "ai").count()
+    assert ai_messages == 1 + len(sent[1::2])  # Seeded greeting plus the AI replies
@@ -0,0 +1,117 @@
+"""
+Tests for report listings: batched doctor lookups and the shared serializer.
+"""
+import json
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.auth_helpers import get_current_patient, get_current_user
+from app.main import app
+from app.models import AnalysisReport, DoctorProfile, Image, User
+from app.services.report_service import parse_report_json
+
+
+@contextmanager
+def _count_queries(db_session):
+    statements = []
+    engine = db_session.get_bind()
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_execute)
+
+
+def _seed_reports(db_session, count):
+    patient = User(email="many@reports.test", password="x", role="patient")
+    doctors = [User(email=f"doc{i}@reports.test", password="x", role="doctor") for i in range(3)]
+    db_session.add_all([patient, *doctors])
+    db_session.commit()
+    db_session.add_all([
+        DoctorProfile(user_id=d.id, full_name=f"Dr {i}", clinic_name="Clinic", bio="Bio", avatar_url="/a.png")
+        for i, d in enumerate(doctors)
+    ])
+    for i in range(count):
+        image = Image(patient_id=patient.id, image_url=f"tests/many_{i}.png")
+        db_session.add(image)
+        db_session.flush()
+        db_session.add(AnalysisReport(
+            image_id=image.id,
+            patient_id=patient.id,
+            doctor_id=doctors[i % 3].id if i % 2 else None,
+            report_json=json.dumps({"condition": f"Condition {i}"}),
+        ))
+    db_session.commit()
+    return patient, doctors
+
+
+def test_patient_reports_use_constant_queries(client, db_session):
+    patient, _ = _seed_reports(db_session, 30)
+    app.dependency_overrides[get_current_patient] = lambda: patient
+    try:
+        with _count_queries(db_session) as statements:
+            response = client.get("/api/analysis/patient/reports")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    reports = response.json()
+    assert len(reports) == 30
+    assert sum("FROM analysis_reports" in s for s in statements) == 1
+    assert sum("FROM doctor_profiles" in s for s in statements) == 1
+    named = [r for r in reports if r["doctor_id"]]
+    assert named and all(r["doctor_name"].startswith("Dr ") for r in named)
+    assert all(r["doctor_name"] is None for r in reports if not r["doctor_id"])
+
+
+def test_report_detail_includes_doctor_in_one_query(client, db_session):
+    patient, doctors = _seed_reports(db_session, 2)
+    report = db_session.query(AnalysisReport).filter(AnalysisReport.doctor_id.isnot(None)).first()
+    app.dependency_overrides[get_current_user] = lambda: patient
+    try:
+        response = client.get(f"/api/analysis/report/{report.id}")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["report_id"] == report.id
+    assert body["condition"] == "Condition 1"
+    assert body["doctor"] == {"full_name": "Dr 1", "avatar_url": "/a.png", "clinic_name": "Clinic"}
+
+
+def test_parse_report_json_returns_copy():
+    stored = {"condition": "Nevus"}
+
+    parsed = parse_report_json(stored)
+    parsed["report_id"] = 1
+
+    assert stored == {"condition": "Nevus"}
+    assert parse_report_json('{"a": 1}') == {"a": 1}
+    assert parse_report_json("not json") == {}
+    assert parse_report_json(None) == {}
+
+
+def test_store_analysis_result_writes_native_json_and_typed_columns(db_session):
+    from app.services.analysis_service import store_analysis_result
+
+    patient = User(email="typed@reports.test", password="x", role="patient")
+    db_session.add(patient)
+    db_session.commit()
+    image = Image(patient_id=patient.id, image_url="tests/typed.png")
+    db_session.add(image)
+    db_session.commit()
+
+    result = {"status": "success", "condition": "Nevus", "confidence": 92, "recommendation": "Monitor"}
+    body = store_analysis_result(db_session, image.id, patient.id, result)
+
+    report = db_session.query(AnalysisReport).filter(AnalysisReport.condition == "Nevus").one()
+    assert report.id == body["report_id"]
+    assert report.report_json == {"status": "success", "condition": "Nevus", "confidence": 92, "recommendation": "Monitor"}
+    assert report.confidence == 92.0
+    assert report.recommendation == "Monitor"
@@ -0,0 +1,179 @@
+"""
+Tests for single-flight coalescing of concurrent AI analysis calls.
+"""
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from app.config import MEDIA_ROOT
+from app.models import AnalysisReport, Image, User
+from app.services.single_flight import SingleFlight
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_task():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": calls}
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert calls == 1
+    assert all(result == {"value": 1} for result in results)
+    assert flight.coalesced == 4
+    assert flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_are_not_coalesced():
+    flight = SingleFlight()
+    work = AsyncMock(return_value="done")
+
+    await flight.do("key", work)
+    await flight.do("key", work)
+
+    assert work.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_every_waiter():
+    flight = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    results = await asyncio.gather(
+        flight.do("key", boom), flight.do("key", boom), return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_gemini_service_coalesces_identical_images(tmp_path):
+    from app.services.gemini_service import GeminiService
+
+    image_path = tmp_path / "lesion.jpg"
+    image_path.write_bytes(b"double click bytes")
+
+    async def slow_generate(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return Mock(text='{"condition": "Nevus", "confidence": 90}')
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test_key"}):
+        with patch("app.services.gemini_service.genai") as mock_genai:
+            mock_model = MagicMock()
+            mock_model.generate_content_async = AsyncMock(side_effect=slow_generate)
+            mock_genai.GenerativeModel.return_value = mock_model
+
+            service = GeminiService()
+            first, second = await asyncio.gather(
+                service.analyze_skin_lesion(str(image_path)),
+                service.analyze_skin_lesion(str(image_path)),
+            )
+
+    mock_model.generate_content_async.assert_called_once()
+    assert first == second
+    first["report_id"] = 1
+    assert "report_id" not in second
+
+
+@pytest.mark.asyncio
+async def test_analyze_image_route_creates_single_report(test_db):
+    from app.routes.analysis import analyze_image
+
+    patient = User(email="dup@test.com", password="x", role="patient")
+    test_db.add(patient)
+    test_db.commit()
+
+    file_name = "single_flight_test.png"
+    file_path = MEDIA_ROOT / file_name
+    file_path.write_bytes(b"fake image data")
+
+    image = Image(patient_id=patient.id, image_url=file_name)
+    test_db.add(image)
+    test_db.commit()
+
+    async def slow_analyze(_path):
+        await asyncio.sleep(0.01)
+        return {"status": "success", "condition": "Nevus", "confidence": 80}
+
+    mock_service = MagicMock()
+    mock_service.analyze_skin_lesion = AsyncMock(side_effect=slow_analyze)
+
+    try:
+        with patch("app.routes.analysis.get_gemini_service", return_value=mock_service), \
+                patch("app.routes.analysis.SessionLocal", TestingSessionLocal):
+            first, second = await asyncio.gather(
+                analyze_image(image.id, mode="sync", db=test_db, current_user=patient),
+                analyze_image(image.id, mode="sync", db=test_db, current_user=patient),
+            )
+    finally:
+        if file_path.exists():
+            file_path.unlink()
+
+    assert mock_service.analyze_skin_lesion.await_count == 1
+    assert first["report_id"] == second["report_id"]
+    assert test_db.query(AnalysisReport).filter(AnalysisReport.image_id == image.id).count() == 1
+
+
+@pytest.mark.asyncio
+async def test_coalesced_analysis_survives_first_caller_disconnecting(test_db):
+    from app.routes.analysis import analyze_image
+
+    patient = User(email="gone@test.com", password="x", role="patient")
+    test_db.add(patient)
+    test_db.commit()
+
+    file_name = "single_flight_disconnect.png"
+    file_path = MEDIA_ROOT / file_name
+    file_path.write_bytes(b"fake image data")
+    image = Image(patient_id=patient.id, image_url=file_name)
+    test_db.add(image)
+    test_db.commit()
+
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_analyze(_path):
+        started.set()
+        await release.wait()
+        return {"status": "success", "condition": "Nevus", "confidence": 80}
+
+    mock_service = MagicMock()
+    mock_service.analyze_skin_lesion = AsyncMock(side_effect=slow_analyze)
+    # Like get_db's session, it must not be used once the request has closed it
+    first_request_db = TestingSessionLocal(close_resets_only=False)
+
+    try:
+        with patch("app.routes.analysis.get_gemini_service", return_value=mock_service), \
+                patch("app.routes.analysis.SessionLocal", TestingSessionLocal):
+            first = asyncio.create_task(
+                analyze_image(image.id, mode="sync", db=first_request_db, current_user=patient)
+            )
+            await started.wait()
+            second = asyncio.create_task(
+                analyze_image(image.id, mode="sync", db=test_db, current_user=patient)
+            )
+            await asyncio.sleep(0.01)
+
+            # The first client goes away: its request session is closed
+            first.cancel()
+            first_request_db.close()
+            release.set()
+            result = await second
+    finally:
+        if file_path.exists():
+            file_path.unlink()
+
+    assert result["condition"] == "Nevus"
+    assert test_db.query(AnalysisReport).filter(AnalysisReport.id == result["report_id"]).count() == 1
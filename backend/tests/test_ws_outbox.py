@@ -0,0 +1,127 @@
+"""
+Tests for per-connection WebSocket outboxes and the slow-consumer policies.
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.routes.websocket import ConnectionManager
+from app.services.ws_outbox import TRY_AGAIN_LATER, Frame, Outbox
+
+
+class RecordingSocket:
+    """Records frames; with stalled=True every send hangs, like a client that stopped reading."""
+
+    def __init__(self, stalled=False):
+        self.texts = []
+        self.closed_with = None
+        self.stalled = stalled
+
+    async def send_text(self, text):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.texts.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+    @property
+    def messages(self):
+        return [json.loads(text) for text in self.texts]
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def _delta(text, stream_id="s1"):
+    return Frame.of({"type": "ai_delta", "stream_id": stream_id, "delta": text})
+
+
+@pytest.mark.asyncio
+async def test_stalled_client_does_not_delay_others():
+    manager = ConnectionManager()
+    stalled, healthy = RecordingSocket(stalled=True), RecordingSocket()
+    manager.register(1, 10, stalled)
+    manager.register(1, 20, healthy)
+
+    for n in range(3):
+        await asyncio.wait_for(manager.broadcast_to_report(1, {"type": "new_message", "n": n}), 1)
+    await _settle()
+
+    assert [m["n"] for m in healthy.messages] == [0, 1, 2]
+    assert stalled.texts == []
+    manager.disconnect(1, 10)
+    manager.disconnect(1, 20)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_is_serialized_once():
+    manager = ConnectionManager()
+    first, second = RecordingSocket(), RecordingSocket()
+    manager.register(1, 10, first)
+    manager.register(1, 20, second)
+
+    await manager.broadcast_to_report(1, {"type": "status_update", "status": "accepted"})
+    await _settle()
+
+    assert first.texts[0] is second.texts[0]
+    manager.disconnect(1, 10)
+    manager.disconnect(1, 20)
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_discards_frames_beyond_the_limit():
+    outbox = Outbox(RecordingSocket(stalled=True), max_frames=2, policy="drop")
+    outbox.offer(_delta("a"))
+    await _settle()  # "a" is now in flight
+
+    accepted = [outbox.offer(_delta(text)) for text in "bcde"]
+
+    assert accepted == [True, True, False, False]
+    assert outbox.dropped == 2
+    assert not outbox.closed
+    outbox.close()
+
+
+@pytest.mark.asyncio
+async def test_coalesce_policy_merges_stream_deltas_then_disconnects():
+    socket = RecordingSocket(stalled=True)
+    closed = []
+    outbox = Outbox(socket, on_close=closed.append, max_frames=1, policy="coalesce")
+    outbox.offer(_delta("in flight"))
+    await _settle()
+
+    assert outbox.offer(_delta("Hel"))
+    assert outbox.offer(_delta("lo"))
+    assert len(outbox) == 1
+    assert outbox._queue[0].message["delta"] == "Hello"
+
+    # A frame that cannot be merged means the client is too far behind
+    assert not outbox.offer(Frame.of({"type": "new_message", "message": "Hello"}))
+    await _settle()
+    assert outbox.closed
+    assert closed == [outbox]
+    assert socket.closed_with == TRY_AGAIN_LATER
+
+
+@pytest.mark.asyncio
+async def test_evicted_or_timed_out_client_is_removed_from_the_manager():
+    manager = ConnectionManager()
+    socket = RecordingSocket(stalled=True)
+    outbox = manager.register(1, 10, socket)
+    outbox.send_timeout = 0.05
+
+    outbox.offer(Frame.of({"type": "status_update"}))
+    await asyncio.sleep(0.2)
+
+    assert outbox.closed
+    assert socket.closed_with == TRY_AGAIN_LATER
+    assert manager.connections == {}
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError, match="WS_SLOW_CONSUMER_POLICY"):
+        Outbox(RecordingSocket(), policy="buffer-forever")
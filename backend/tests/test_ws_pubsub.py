@@ -0,0 +1,168 @@
+"""
+Tests for WebSocket broadcast fan-out across workers.
+
+Each "worker" is a ConnectionManager with its own pub/sub backend; they share
+a socket directory (unix) or the Redis stand-in (redis).
+"""
+import asyncio
+import json
+import socket
+
+import pytest
+
+from app.routes.websocket import ConnectionManager
+from app.services.ws_pubsub import RedisPubSub, UnixSocketPubSub
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+async def _until(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+
+@pytest.fixture(params=["unix", "redis"])
+def backend(request, tmp_path):
+    """(pubsub factory, wait until n workers are subscribed to a report)."""
+    if request.param == "unix":
+        async def no_wait(report_id, workers):
+            pass
+        return lambda: UnixSocketPubSub(str(tmp_path / "ws")), no_wait
+
+    standin = request.getfixturevalue("redis_standin")
+    host, port = standin.server_address
+
+    async def subscribed(report_id, workers):
+        channel = f"{RedisPubSub.CHANNEL_PREFIX}{report_id}"
+        await _until(lambda: len(standin.subscribers.get(channel, ())) == workers)
+
+    return lambda: RedisPubSub(f"redis://{host}:{port}/0"), subscribed
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_sockets_on_other_workers(backend):
+    make_pubsub, subscribed = backend
+    first, second = ConnectionManager(make_pubsub()), ConnectionManager(make_pubsub())
+    await first.start()
+    await second.start()
+    try:
+        patient, doctor, unrelated = FakeSocket(), FakeSocket(), FakeSocket()
+        first.register(1, 10, patient)
+        second.register(1, 20, doctor)
+        second.register(2, 30, unrelated)
+        await subscribed(1, workers=2)
+
+        await first.broadcast_to_report(1, {"type": "new_message", "message": "hello"})
+        await _until(lambda: doctor.sent)
+        await first.broadcast_to_report(1, {"type": "new_message", "message": "not for doctor"}, exclude_user=20)
+        await first.broadcast_to_report(1, {"type": "new_message", "message": "last"})
+        await _until(lambda: len(doctor.sent) == 2 and len(patient.sent) == 3)
+
+        assert [m["message"] for m in patient.sent] == ["hello", "not for doctor", "last"]
+        assert [m["message"] for m in doctor.sent] == ["hello", "last"]
+        assert unrelated.sent == []
+    finally:
+        await first.stop()
+        await second.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_subscribes_per_report_and_recovers(redis_standin):
+    host, port = redis_standin.server_address
+    manager = ConnectionManager(RedisPubSub(f"redis://{host}:{port}/0"))
+    await manager.start()
+    channel = "dermaai:ws:report:7"
+    try:
+        sock = FakeSocket()
+        manager.register(7, 1, sock)
+        await _until(lambda: redis_standin.subscribers.get(channel))
+
+        # A server restart drops the subscriber; it reconnects and re-subscribes
+        redis_standin.drop_clients()
+        await _until(lambda: redis_standin.subscribers.get(channel))
+
+        manager.disconnect(7, 1, sock)
+        await _until(lambda: not redis_standin.subscribers.get(channel))
+    finally:
+        await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_pipelines_a_burst_of_publishes_in_order(redis_standin):
+    host, port = redis_standin.server_address
+    first = ConnectionManager(RedisPubSub(f"redis://{host}:{port}/0"))
+    second = ConnectionManager(RedisPubSub(f"redis://{host}:{port}/0"))
+    await first.start()
+    await second.start()
+    try:
+        viewer = FakeSocket()
+        second.register(3, 20, viewer)
+        await _until(lambda: redis_standin.subscribers.get("dermaai:ws:report:3"))
+
+        # Each publish only queues; the burst goes out in batched writes
+        for n in range(200):
+            await asyncio.wait_for(
+                first.broadcast_to_report(3, {"type": "ai_delta", "stream_id": "s", "delta": str(n)}), 0.5
+            )
+        await _until(lambda: len(viewer.sent) == 200)
+
+        assert [m["delta"] for m in viewer.sent] == [str(n) for n in range(200)]
+    finally:
+        await first.stop()
+        await second.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_drops_publishes_beyond_the_pending_limit():
+    pubsub = RedisPubSub("redis://127.0.0.1:1/0", max_pending=2)  # Not started: nothing is sent
+
+    for n in range(3):
+        await pubsub.publish(1, {"type": "new_message", "n": n})
+
+    assert pubsub.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_unix_backend_drops_stale_worker_sockets(tmp_path):
+    socket_dir = tmp_path / "ws"
+    pubsub = UnixSocketPubSub(str(socket_dir))
+    manager = ConnectionManager(pubsub)
+    await manager.start()
+    try:
+        # A worker that died without removing its socket file
+        stale = socket_dir / "99999-dead.sock"
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dead.bind(str(stale))
+        dead.close()
+
+        await manager.broadcast_to_report(1, {"type": "new_message"})
+
+        assert not stale.exists()
+        assert pubsub.path.exists()
+    finally:
+        await manager.stop()
+    assert list(socket_dir.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_reconnect_is_not_dropped_by_old_socket_cleanup():
+    manager = ConnectionManager()
+    old, new = FakeSocket(), FakeSocket()
+    manager.register(1, 10, old)
+    manager.register(1, 10, new)  # Same user reconnected
+
+    manager.disconnect(1, 10, old)
+    await manager.broadcast_to_report(1, {"type": "status_update"})
+    await _until(lambda: new.sent)
+
+    assert new.sent == [{"type": "status_update"}]
+    assert old.sent == []
@@ -97,8 +97,26 @@ const UnifiedChat = ({
             setIsConnected(true);
             setMessages(data.messages || []);
             scrollToBottom();
+          } else if (data.type === 'ai_delta') {
+            // Streamed AI reply: grow a draft bubble until the final message arrives
+            const draftId = `stream-${data.stream_id}`;
+            setMessages(prev => {
+              const draft = prev.find(m => m.id === draftId);
+              if (draft) {
+                return prev.map(m => m.id === draftId ? { ...m, message: m.message + data.delta } : m);
+              }
+              return [...prev, {
+                id: draftId,
+                sender_role: 'ai',
+                sender_id: null,
+                message: data.delta,
+                created_at: new Date().toISOString()
+              }];
+            });
+            scrollToBottom();
           } else if (data.type === 'new_message') {
-            setMessages(prev => [...prev, {
+            const draftId = data.stream_id ? `stream-${data.stream_id}` : null;
+            setMessages(prev => [...prev.filter(m => m.id !== draftId), {
               id: data.id,
               sender_role: data.sender_role,
               sender_id: data.sender_id,